@@ -1 +1,2 @@
-from .dataprocessor import DataProcessingOrchestrator
\ No newline at end of file
+from .dataprocessor import DataProcessingOrchestrator
+from .cache import PipelineCache
@@ -0,0 +1,25 @@
+import argparse
+from pathlib import Path
+from .cache import PipelineCache, _megabytes
+
+# Inspects or clears the cache of DataProcessingOrchestrator pipelines (see dataprocessor/cache.py), e.g.
+# python -m dataprocessor ../data/cache list (from src)
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspects or clears the cache of DataProcessingOrchestrator pipelines")
+    parser.add_argument("directory", type=Path, help="directory of the cache")
+    parser.add_argument("command", choices=['info', 'list', 'clear', 'evict'], help="info: size of the cache; list: the cached results; "
+                        "clear: remove all results; evict: remove least recently used results down to --max-mb")
+    parser.add_argument("--max-mb", type=float, default=None, help="size limit for evict, in MB (default: 2048)")
+    args  = parser.parse_args()
+    cache = PipelineCache(args.directory)
+
+    if args.command == 'info':
+        print(cache)
+    elif args.command == 'list':
+        for entry in cache.entries():
+            print(f"{entry['key'][:12]}  {str(entry['name']):<24} {str(entry['shape']):<16} {_megabytes(entry['size']):>10}  last used {entry['last_used']}")
+    elif args.command == 'clear':
+        print(f"✅ {cache.clear()} cached result(s) removed")
+    else:
+        max_bytes = int(args.max_mb * 1024**2) if args.max_mb is not None else None
+        print(f"✅ {cache.evict(max_bytes)} cached result(s) removed")
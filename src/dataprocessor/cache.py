@@ -0,0 +1,190 @@
+import datetime
+import hashlib
+import json
+import os
+import pickle
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+import numpy as np
+import pandas as pd
+
+# Results of lazy pipelines (see DataProcessingOrchestrator(cache = ...)) are cached on disk, content-addressed:
+# the key is a hash of the registered steps together with a fingerprint of every file they import, so a changed
+# input or a changed step simply gives another key. Every entry is '<key>.pkl' (the resulting dataframe) with
+# '<key>.json' (what it was computed from). The modification time of the .pkl is its last use; when the cache
+# outgrows max_bytes, the least recently used entries are removed. Inspect or clear it with python -m dataprocessor.
+CACHE_FORMAT      = 1                   # part of every key; increase when the meaning of cached results changes
+DEFAULT_MAX_BYTES = 2 * 1024**3
+
+
+class PipelineCache:
+    """
+    On-disk cache of the results of DataProcessingOrchestrator pipelines (see module comment).
+
+    Parameters
+    ----------
+    directory: Union[str, Path]
+        The directory in which the results are cached.
+    max_bytes: int, optional
+        Size above which the least recently used results are removed. By default 2 GB.
+    hash_contents: bool, optional
+        Whether input files are fingerprinted by a hash of their contents, instead of by their size and
+        modification time. Safer (e.g. for files that are copied around), but every lookup reads the inputs.
+
+    Examples
+    --------
+    >>> cache = PipelineCache(directories_dict['dir_cache'])
+    >>> measles_bavaria = (
+    >>>     DataProcessingOrchestrator(name = 'measles', cache = cache)
+    >>>     .import_data(filename = 'measles.parquet', directory = os.path.join(dir_data_preprocessed, 'measles'))
+    >>>     .filter(conditions = [('kz_kreis', bavarian_counties, 'in')])
+    >>>     .groupby(groupby_columns = ['year'], aggregations = {'cases': 'sum'})
+    >>>     .collect()
+    >>> )
+    """
+    def __init__(self, directory: Union[str, Path], max_bytes: int = DEFAULT_MAX_BYTES, hash_contents: bool = False):
+        self.directory     = Path(directory)
+        self.max_bytes     = max_bytes
+        self.hash_contents = hash_contents
+
+    def __repr__(self):
+        entries = self.entries()
+        return f'PipelineCache: {self.directory}\nEntries: {len(entries)}\nSize: {_megabytes(sum(ee["size"] for ee in entries))} of {_megabytes(self.max_bytes)}'
+
+    def key(self, steps: List[Dict]) -> Optional[str]:
+        """
+        The key of the result of steps, or None if it cannot be cached: only pipelines that start with import_data
+        (i.e. not from a dataframe), whose inputs exist and whose arguments all have a canonical form are cached.
+        """
+        if not steps or next(iter(steps[0])) != 'import_data':
+            return None
+        inputs = []
+        for step in steps:
+            method, kwargs = next(iter(step.items()))
+            if method == 'import_data':
+                path = os.path.join(kwargs['directory'], kwargs['filename'])
+                if not os.path.exists(path):
+                    return None
+                inputs.append(self._fingerprint(path))
+        try:
+            content = json.dumps({'format': CACHE_FORMAT, 'steps': steps, 'inputs': inputs}, default=_canonical, sort_keys=True)
+        except TypeError:
+            return None     # a step has an argument without a canonical form (see _canonical), e.g. a function
+        return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[pd.DataFrame]:
+        """The cached result of key (marking it as used), or None."""
+        path = self._path(key, '.pkl')
+        try:
+            with open(path, 'rb') as f:
+                df = pickle.load(f)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            return None
+        os.utime(path)
+        return df
+
+    def put(self, key: str, df: pd.DataFrame, steps: List[Dict], name: Optional[str] = None):
+        """Caches df as the result of steps under key, then evicts least recently used entries if needed."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        temp_path = self._path(key, '.pkl.tmp')
+        with open(temp_path, 'wb') as f:
+            pickle.dump(df, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, self._path(key, '.pkl'))
+
+        info = {'name': name, 'shape': list(df.shape), 'created': datetime.datetime.now().isoformat(timespec='seconds'),
+                'steps': [next(iter(step)) for step in steps]}
+        with open(self._path(key, '.json'), 'w', encoding='utf-8') as f:
+            json.dump(info, f)
+        self.evict()
+
+    def entries(self) -> List[Dict]:
+        """The cached results, most recently used first: key, name, shape, size (bytes), created and last_used."""
+        entries = []
+        for path in self.directory.glob('*.pkl') if self.directory.exists() else []:
+            key  = path.stem
+            stat = path.stat()
+            try:
+                with open(self._path(key, '.json'), 'r', encoding='utf-8') as f:
+                    info = json.load(f)
+            except (FileNotFoundError, json.JSONDecodeError):
+                info = {}
+            entries.append({'key': key, 'name': info.get('name'), 'shape': info.get('shape'), 'size': stat.st_size,
+                            'created': info.get('created'), 'last_used': datetime.datetime.fromtimestamp(stat.st_mtime).isoformat(timespec='seconds'),
+                            '_mtime': stat.st_mtime})
+        return sorted(entries, key=lambda entry: entry['_mtime'], reverse=True)
+
+    def evict(self, max_bytes: Optional[int] = None) -> int:
+        """Removes the least recently used results until the cache is at most max_bytes (by default self.max_bytes). Returns the number removed."""
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        entries   = self.entries()
+        total     = sum(entry['size'] for entry in entries)
+        removed   = 0
+        while entries and total > max_bytes:
+            entry  = entries.pop()
+            total -= entry['size']
+            self.remove(entry['key'])
+            removed += 1
+        return removed
+
+    def remove(self, key: str):
+        for suffix in ('.pkl', '.json'):
+            if self._path(key, suffix).exists():
+                os.remove(self._path(key, suffix))
+
+    def clear(self) -> int:
+        """Removes all cached results. Returns the number removed."""
+        return self.evict(max_bytes=0)
+
+# Helpers - self
+    def _path(self, key: str, suffix: str) -> Path:
+        return self.directory / f"{key}{suffix}"
+
+    def _fingerprint(self, path: str) -> List:
+        """Fingerprint of an input file, or of all files in an input directory (e.g. a partitioned dataset)."""
+        if os.path.isdir(path):
+            files = sorted(os.path.join(root, ff) for root, _, names in os.walk(path) for ff in names)
+        else:
+            files = [path]
+        fingerprint = []
+        for ff in files:
+            if self.hash_contents:
+                fingerprint.append([os.path.relpath(ff, path), _sha256(ff)])
+            else:
+                stat = os.stat(ff)
+                fingerprint.append([os.path.relpath(ff, path), stat.st_size, stat.st_mtime_ns])
+        return fingerprint
+
+
+# Helpers - nonself
+def _canonical(value):
+    """
+    JSON-serializable, deterministic stand-in for the values json cannot encode, as used in a key.
+    Raises TypeError for any other value (as json.dumps expects), rather than falling back to its repr: a repr need
+    not be unique (e.g. numpy shortens long arrays in it), and two different arguments must never share a key.
+    """
+    if isinstance(value, (pd.Series, pd.DataFrame, pd.Index)):
+        return {'pandas': type(value).__name__, 'hash': hashlib.sha256(pd.util.hash_pandas_object(value, index=True).to_numpy().tobytes()).hexdigest()}
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (set, frozenset)):
+        return sorted(value, key=repr)
+    if isinstance(value, tuple):
+        return list(value)
+    if isinstance(value, (Path, datetime.date, pd.Timestamp)):
+        return str(value)
+    raise TypeError(f"{type(value).__name__} has no canonical form in a cache key")
+
+
+def _sha256(path: str, chunk_bytes: int = 1024**2) -> str:
+    """sha256 of a file, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_bytes), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _megabytes(n_bytes: int) -> str:
+    return f"{n_bytes / 1024**2:.1f} MB"
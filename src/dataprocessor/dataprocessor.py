@@ -1,11 +1,21 @@
 import pandas as pd
-import geopandas as gpd
-from typing import Optional, Dict, Union, List, Tuple
+from typing import TYPE_CHECKING, Optional, Dict, Union, List, Tuple
 import os
-from .filtering import apply_condition
-from shapely.geometry import Point, LineString
+from .filtering import apply_condition, compile_conditions, scan_columns
+from .cache import PipelineCache
+from .partitioned_store import read_partitions, write_partitions
+from .query_plan import optimize_plan, explain
+from .secondary_index import ROW_GROUP_SIZE, build_index, read_indexed
+from .streaming import run_streaming
 from pathlib import Path
 
+# geopandas is only imported to read a .shp or to make a GeoDataFrame
+if TYPE_CHECKING:
+    import geopandas as gpd
+
+# number of rows read at a time when filtering a csv while reading it
+CSV_CHUNKSIZE = 100_000
+
 class DataProcessingOrchestrator:
     """ 
     This class represents the main class used for the processing (and preprocessing) of dataframes.
@@ -22,6 +32,18 @@ class DataProcessingOrchestrator:
         The name internally used while processing. This has no further consequences on the storing of the actual data.
     category: 
         The category into which the data belongs. This defines the subdirectory into which the YAML-file is stored. If unspecified, the log is stored in the main config directory.
+    lazy:
+        If True, methods only register their step. The registered steps are optimized into a plan and executed on
+        `collect` (or `save_data`), such that e.g. filters and selections of columns are applied while importing.
+        See dataprocessor/query_plan.py.
+    chunksize:
+        If given, the orchestrator is lazy and streams: on `collect` (or `save_data`) the data is imported in chunks
+        of chunksize rows, row-local steps run per chunk, `save_data` writes chunk by chunk and `groupby` combines
+        partial aggregates, such that the whole table never has to fit in memory. See dataprocessor/streaming.py.
+    cache:
+        An optional PipelineCache. If given, the orchestrator is lazy, and `collect` loads the result of a pipeline
+        that was run before on unchanged input files from the cache instead of executing it. Pipelines that save
+        data are always executed. See dataprocessor/cache.py.
 
     Representation
     -------------
@@ -29,8 +51,26 @@ class DataProcessingOrchestrator:
     - the shape of the dataframe being processed
     - a preview of the dataframe being processed
 
+    Examples
+    --------
+    >>> measles_bavaria = (
+    >>>     DataProcessingOrchestrator(name = 'measles', lazy = True)
+    >>>     .import_data(filename = 'measles.parquet', directory = os.path.join(dir_data_preprocessed, 'measles'))
+    >>>     .select(colnames = ['kz_kreis', 'year', 'cases'])
+    >>>     .filter(conditions = [('year', ['2023', '2024'], 'in')])
+    >>>     .collect()
+    >>> )
+    >>> cases_per_year = (
+    >>>     DataProcessingOrchestrator(name = 'measles', chunksize = 100_000)
+    >>>     .import_data(filename = 'measles.parquet', directory = os.path.join(dir_data_preprocessed, 'measles'))
+    >>>     .filter(conditions = [('kz_kreis', 'Unknown', '!=')])
+    >>>     .groupby(groupby_columns = ['year'], aggregations = {'cases': 'sum'})
+    >>>     .collect()
+    >>> )
+
     """
-    def __init__(self, df: Union[pd.DataFrame, gpd.GeoDataFrame] = None, category: str = None ,name: Optional[str] = "unnamed"):
+    def __init__(self, df: Union[pd.DataFrame, 'gpd.GeoDataFrame'] = None, category: str = None ,name: Optional[str] = "unnamed", lazy: bool = False,
+                 chunksize: Optional[int] = None, cache: Optional[PipelineCache] = None):
         self.df             = df
         self.name           = name
         self.realm          = 'dataprocessing'
@@ -38,12 +78,20 @@ class DataProcessingOrchestrator:
         self.saved_path     = None
         self.status         = 0
         self.method_registry= []
+        self.lazy           = lazy or chunksize is not None or cache is not None
+        self.chunksize      = chunksize
+        self.cache          = cache
+        self._streamed      = []                    # steps that produced the data that was streamed into files only
+        self._plan_start    = 0                     # steps in method_registry from here on are not executed yet (lazy)
+        self._executing     = False
 
         if self.df is not None:                         # if df is not defined, no use in loading subclasses
             self._setup_modules()
             self.status = 1
 
     def __repr__(self):
+        if self._pending_steps():
+            return f'Lazy DataFrame: {self.name}\nPlan\n{explain(optimize_plan(self._pending_steps(), has_df = self.df is not None))}'
         if self.df is not None:
             return f'DataFrame: {self.name}\nShape: {self.df.shape}\nPreview\n{self.df.head()}'
         else:
@@ -65,6 +113,8 @@ class DataProcessingOrchestrator:
         variables: Dict
             The dictionary with parameters associated with the method just called
         """
+        if self._executing:                             # executing a lazy plan; the steps are registered already
+            return
         newstep = {method: variables}
         self.method_registry.append(newstep)
         if self.status > 2:
@@ -72,6 +122,76 @@ class DataProcessingOrchestrator:
         else:
             self.status = 2
 
+    def collect(self):
+        """
+        Executes the steps registered in lazy mode. The steps are first optimized into a plan (see dataprocessor/query_plan.py):
+        filters are moved forward, up into import_data, import_data only reads the columns that are used, and adjacent
+        filters, renames, dtype changes and selections are merged. Without pending steps, this does nothing.
+        With a chunksize, the plan is streamed as far as possible (see dataprocessor/streaming.py). If the plan ends with
+        save_data, the data is then only written, and self.df stays None; steps registered after that stream the
+        data from the source again.
+
+        Returns
+        -------
+        DataProcessingOrchestrator
+            Self with updated DataFrame
+
+        Examples
+        --------
+        >>> lazy_processor.filter(conditions = [('year', '2024', '==')]).collect()
+
+        Notes
+        -----
+        Step-registration: no
+        """
+        steps = self._pending_steps()
+        if not steps or self._executing:
+            return self
+
+        streamed = self.chunksize is not None and self.df is None
+        if streamed and next(iter(steps[0])) != 'import_data':
+            steps = self._streamed + steps
+        plan   = optimize_plan(steps, has_df = self.df is not None)
+        status = self.status
+        saved  = next(iter(plan[-1])) == 'save_data'
+        key    = self._cache_key(steps)
+        cached = self.cache.get(key) if key is not None else None
+        self._executing = True
+        try:
+            rest = plan
+            if cached is not None:
+                self.df, rest = cached, []
+            elif streamed:
+                self.df, rest = run_streaming(plan, self.chunksize, self._run_on_chunk)
+                self._streamed = [step for step in steps if next(iter(step)) != 'save_data'] if self.df is None else []
+            for step in rest:
+                method, kwargs = next(iter(step.items()))
+                getattr(self, method)(**kwargs)
+        finally:
+            self._executing = False
+        if key is not None and cached is None and type(self.df) is pd.DataFrame:
+            self.cache.put(key, self.df, steps, name = self.name)
+
+        self._plan_start = len(self.method_registry)
+        self.status      = 3 if saved else status if any(next(iter(step)) != 'import_data' for step in plan) else 1
+        return self
+
+    def explain(self):
+        """
+        Prints the optimized plan of the steps that are registered in lazy mode but not executed yet.
+
+        Returns
+        -------
+        DataProcessingOrchestrator
+            Returns self for method chaining
+
+        Notes
+        -----
+        Step-registration: no
+        """
+        print(explain(optimize_plan(self._pending_steps(), has_df = self.df is not None)) or 'no pending steps')
+        return self
+
     def status_update(self):
         """
         Prints a status update of the DataFrame processing state.
@@ -104,7 +224,8 @@ class DataProcessingOrchestrator:
         print(status_options[self.status])
         return self
     
-    def import_data(self, filename: str, directory: Union[str, Path], dtype_dict: Optional[Dict] = None, separator: str = ",", colnames_row: int = 0, encoding: str = 'utf_8'):
+    def import_data(self, filename: str, directory: Union[str, Path], dtype_dict: Optional[Dict] = None, separator: str = ",", colnames_row: int = 0, encoding: str = 'utf_8',
+                    columns: Optional[List[str]] = None, filters: Optional[List[Tuple[str, any, str]]] = None):
         """
         Reads a datafile from joining directory and filename.
         If self.df is already initialized (i.e. not None) then the dataframes get merged.
@@ -114,6 +235,7 @@ class DataProcessingOrchestrator:
         ----------
         filename: str
             The name of the file to be read. Include the extension, since anything ending on '.shp' will be read into a gpd.GeoDataFrame.
+            Files (or partitioned directories) ending on '.parquet' and files ending on '.feather' are read with their stored dtypes.
         directory: str
             The directory in which the file is saved.
         dtype_dict: dict 
@@ -124,6 +246,14 @@ class DataProcessingOrchestrator:
             Row number in which the column-names are listed. By default 0.
         encoding: 
             The encoding in which the file is encoded. The default is 'utf-8'. For German text, use 'ISO-8859-1'
+        columns: List[str], optional
+            Only these columns are read; columns that are not in the file are ignored. By default all columns.
+        filters: List[Tuple[str, any, str]], optional
+            Only rows meeting all these conditions (as in self.filter) are kept. By default all rows.
+            The filters are applied while reading, so only the selected data is held in memory: a .csv is read in
+            chunks of CSV_CHUNKSIZE rows that are filtered one by one, and for .parquet the partitions and row groups
+            that cannot match are skipped (see partitioned_store.read_partitions). A .parquet saved with index_by
+            is read through its index if the filters select few rows (see secondary_index.read_indexed).
 
         Returns
         -------
@@ -146,11 +276,17 @@ class DataProcessingOrchestrator:
         del vars['self']
         funcname        = 'import_data'
         self.register_step(funcname, vars)  
+        if self._deferred():
+            return self
 
         filepath    = os.path.join(directory, filename)
         extension   = filename.split(".", 1)[1]
+        # the filtered columns are read as well, and only dropped after filtering
+        read_columns = scan_columns(columns, filters)
+        filtered     = False                # whether the reader already dropped the rows not meeting filters
 
         if extension == 'shp':
+            import geopandas as gpd
             newdf = gpd.read_file(filepath, dtype=dtype_dict, encoding=encoding)
         elif extension == 'xlsx':
             newdf       = pd.read_excel(filepath, dtype = dtype_dict, engine = 'openpyxl')
@@ -158,8 +294,31 @@ class DataProcessingOrchestrator:
             newfilepath = os.path.join(os.path.dirname(directory), newfilename)
             newdf.to_csv(newfilepath, sep = ',', index = False)
             print(f'{self.name} loaded from .xlsx has been saved as csv: {newfilepath}')
+        elif extension == 'parquet':
+            newdf = read_indexed(filepath, filters, columns = read_columns) if filters else None
+            # the row groups read through the index hold other rows as well, the scan only returns matching rows
+            filtered = newdf is None
+            if newdf is None:
+                newdf = read_partitions(filepath, columns = read_columns, filters = filters)
+            if dtype_dict is not None:
+                newdf = newdf.astype(dtype_dict)
+        elif extension == 'feather':
+            newdf = pd.read_feather(filepath, columns = None if read_columns is None else [col for col in _feather_columns(filepath) if col in read_columns])
+            if dtype_dict is not None:
+                newdf = newdf.astype(dtype_dict)
         else:
-            newdf = pd.read_csv(filepath, dtype=dtype_dict, sep=separator, header=colnames_row, encoding=encoding, na_values=['NaN', 'NULL', 'N/A'])
+            read_kwargs = dict(sep=separator, header=colnames_row, encoding=encoding, na_values=['NaN', 'NULL', 'N/A'],
+                               usecols=(lambda col: col in read_columns) if read_columns is not None else None)
+            filtered = bool(filters)
+            if filters:
+                newdf = _read_csv_filtered(filepath, filters, dtype_dict, read_kwargs)
+            else:
+                newdf = pd.read_csv(filepath, dtype=dtype_dict, **read_kwargs)
+
+        if filters and not filtered:
+            newdf = newdf[apply_condition(newdf, filters)].reset_index(drop = True)
+        if columns is not None:
+            newdf = newdf[[col for col in newdf.columns if col in columns]]
 
         if self.df is None:
             self.df = newdf
@@ -174,16 +333,28 @@ class DataProcessingOrchestrator:
         self.status = 1
         return self
 
-    def save_data(self, filename: str, directory: str):
+    def save_data(self, filename: str, directory: str, partition_by: Optional[Union[str, List[str]]] = None, mode: str = 'overwrite',
+                  index_by: Optional[List[str]] = None):
         """
         Saves a datafile from joining directory and filename
 
         Parameters
         ----------
         filename: str
-            The name of the file to be saved. Include the extension, since the saving-methodology is inferred. Extensions are currently limited to: ['.csv', '.tsv', '.shp']
+            The name of the file to be saved. Include the extension, since the saving-methodology is inferred. Extensions are currently limited to: ['.csv', '.tsv', '.shp', '.parquet', '.feather']
         directory: str
             The directory in which the file is saved.
+        partition_by: Union[str, List[str]], optional
+            Only for '.parquet': column(s) by which the data is partitioned. The file is then a directory with one
+            subdirectory per value, e.g. 'cases.parquet/year=2024/'. See partitioned_store.write_partitions.
+        mode: str, optional
+            Only with partition_by: 'overwrite' (default) replaces the whole dataset, 'replace_partitions' only
+            replaces the partitions present in self.df, e.g. a single year. Readers keep seeing a consistent snapshot.
+            With a chunksize (streaming), .csv, .tsv and .parquet are written chunk by chunk as part of the plan.
+        index_by: List[str], optional
+            Only for '.parquet': columns (partition columns included) over which a secondary index is built, such that
+            import_data with filters on them only reads the matching row groups. The rows are sorted (clustered) by the
+            other columns of index_by before writing. See dataprocessor/secondary_index.py.
 
         Returns
         -------
@@ -215,20 +386,51 @@ class DataProcessingOrchestrator:
         vars            = locals()
         del vars['self']
         funcname        = 'save_data'
+        if self.chunksize is not None and not self._executing:
+            self.register_step(funcname, vars)
+            return self.collect()                       # streamed: the chunks are written as they pass
+        self.collect()
         self.register_step(funcname, vars)          
+        self._plan_start = len(self.method_registry)    # saving is never deferred
         
         extension = filename.split(".", 1)[1]
         extensions_separators = {'csv': ',',
                                  'tsv': '\t',
-                                 'shp': ''
+                                 'shp': '',
+                                 'parquet': '',
+                                 'feather': ''
                              }
 
         if extension not in list(extensions_separators.keys()):
             raise ValueError(f'{extension} not supported. Please provide one of the following extensions: {list(extensions_separators.keys())}')
         
-        path = os.path.join(directory, filename)
+        if partition_by is not None and extension != 'parquet':
+            raise ValueError(f'partitioning is not supported for {extension}. Please save as parquet to use partition_by')
 
-        if extension == 'shp':
+        if index_by is not None and extension != 'parquet':
+            raise ValueError(f'indexing is not supported for {extension}. Please save as parquet to use index_by')
+
+        path           = os.path.join(directory, filename)
+        partition_cols = [partition_by] if isinstance(partition_by, str) else (partition_by or [])
+        df             = self.df
+        row_group_size = None
+        if index_by is not None:
+            self._check_for_col(index_by)
+            cluster_cols   = [col for col in index_by if col not in partition_cols]
+            df             = df.sort_values(cluster_cols, kind='stable') if cluster_cols else df
+            row_group_size = ROW_GROUP_SIZE
+
+        if extension == 'parquet' and partition_by is not None:
+            write_partitions(df, path, partition_cols, mode=mode, row_group_size=row_group_size)
+
+        elif extension == 'parquet':
+            df.to_parquet(path, index=False, row_group_size=row_group_size)
+
+        elif extension == 'feather':
+            self.df.reset_index(drop=True).to_feather(path)
+
+        elif extension == 'shp':
+            import geopandas as gpd
             if not isinstance(self.df, gpd.GeoDataFrame):
                 self.df = gpd.GeoDataFrame(self.df, geometry = 'geometry')
             self.df.to_file(path, index=False)
@@ -236,6 +438,9 @@ class DataProcessingOrchestrator:
         else:
             self.df.to_csv(path, sep = extensions_separators[extension], index = False)
 
+        if index_by is not None:
+            build_index(path, index_by)
+
         self.status = 3
         return self
     
@@ -261,6 +466,7 @@ class DataProcessingOrchestrator:
         -----
         Step-registration: no
         """
+        self.collect()
         if as_instance:
             if isinstance(self, DataProcessingOrchestrator):
                 new_name = self.name + '_copy'
@@ -300,11 +506,12 @@ class DataProcessingOrchestrator:
         del vars['self']
         funcname        = 'pivot_wider'
         self.register_step(funcname, vars)    
+        if self._deferred():
+            return self
         if reset_index:
             self.df = self.df.pivot(index = index, columns = cols_from, values = values_from).reset_index()
         else:
             self.df = self.df.pivot(index = index, columns = cols_from, values = values_from)
-        self.register_step(funcname, vars) 
         return self
 
     def pivot_longer(self, index: Union[List[str], str], levels_from: Union[List[str], str], value_colname: str, levels_colname: str):
@@ -347,6 +554,8 @@ class DataProcessingOrchestrator:
         del vars['self']
         funcname        = 'pivot_longer'
         self.register_step(funcname, vars) 
+        if self._deferred():
+            return self
 
         self.df = pd.melt(self.df, id_vars = index, value_vars = levels_from, value_name=value_colname, var_name=levels_colname)
         return self
@@ -388,6 +597,8 @@ class DataProcessingOrchestrator:
         del vars['self']
         funcname        = 'change_dtype'
         self.register_step(funcname, vars)
+        if self._deferred():
+            return self
 
         for colname, dtype in dtype_dict.items():
             if dtype in ['int','Int64', 'float']:
@@ -435,6 +646,8 @@ class DataProcessingOrchestrator:
         del vars['self']
         funcname        = 'impute'
         self.register_step(funcname, vars)   
+        if self._deferred():
+            return self
 
         impute_options = ['drop','zero']
         colnames        = self._check_for_col(colnames)
@@ -487,6 +700,8 @@ class DataProcessingOrchestrator:
         del vars['self']
         funcname        = 'replace'
         self.register_step(funcname, vars) 
+        if self._deferred():
+            return self
 
         self.df[colname] = self.df[colname].replace(mapping_dict)
         return self
@@ -522,6 +737,8 @@ class DataProcessingOrchestrator:
         del vars['self']
         funcname        = 'drop'
         self.register_step(funcname, vars) 
+        if self._deferred():
+            return self
 
         if axis == 0:
             if not isinstance(labels, slice):
@@ -567,6 +784,8 @@ class DataProcessingOrchestrator:
         del vars['self']
         funcname        = 'select'
         self.register_step(funcname, vars) 
+        if self._deferred():
+            return self
 
         colnames = self._check_for_col(colnames)
         if rows is not None and colnames is not None:
@@ -612,6 +831,8 @@ class DataProcessingOrchestrator:
         del vars['self']
         funcname        = 'rename_cols'
         self.register_step(funcname, vars)   
+        if self._deferred():
+            return self
         
         self.df = self.df.rename(columns=colnames_dict)
         return self
@@ -659,6 +880,8 @@ class DataProcessingOrchestrator:
         funcname        = 'filter'
      
         self.register_step(funcname, vars) 
+        if self._deferred():
+            return self
         mask = apply_condition(self.df, conditions, logic)
         self.df = self.df[mask].reset_index(drop = True)
         return self
@@ -712,6 +935,8 @@ class DataProcessingOrchestrator:
         del vars['self']
         funcname        = 'mutate'
         self.register_step(funcname, vars)
+        if self._deferred():
+            return self
 
         if new_colname not in self.df:
             self.df[new_colname] = None
@@ -766,6 +991,9 @@ class DataProcessingOrchestrator:
         del vars['self']
         funcname        = 'convert_to_geodataframe'
         self.register_step(funcname, vars)
+        if self._deferred():
+            return self
+        import geopandas as gpd
         self.df = gpd.GeoDataFrame(self.df, geometry = 'geometry')
 
         return self
@@ -793,6 +1021,8 @@ class DataProcessingOrchestrator:
         funcname = 'groupby'
 
         self.register_step(funcname, vars)
+        if self._deferred():
+            return self
 
         # Perform groupby operation and apply aggregations
         grouped_df = self.df.groupby(groupby_columns).agg(aggregations)
@@ -810,15 +1040,47 @@ class DataProcessingOrchestrator:
         funcname = 'reset_index'
 
         self.register_step(funcname, vars)
+        if self._deferred():
+            return self
         self.df = self.df.reset_index(drop = drop)
         return self  
 
     def split_dfs(self, colname: str):
+        self.collect()
         df_dicts = {category: group for category, group in self.df.groupby(colname)}
         return df_dicts
 
  
 # Helpers - self
+    def _deferred(self) -> bool:
+        """Whether the step just registered is to be executed later, i.e. in lazy mode and not while executing the plan."""
+        return self.lazy and not self._executing
+
+    def _cache_key(self, steps: List[Dict]) -> Optional[str]:
+        """Key of the result of steps in the cache, or None if it is not to be cached: without a cache, when steps build on self.df, or when they save data."""
+        if self.cache is None or self.df is not None or any(next(iter(step)) == 'save_data' for step in steps):
+            return None
+        return self.cache.key(steps)
+
+    def _run_on_chunk(self, chunk: pd.DataFrame, steps: List[Dict]) -> pd.DataFrame:
+        """Runs row-local steps on one chunk of a stream (see dataprocessor/streaming.py) and returns the chunk."""
+        processor = DataProcessingOrchestrator(chunk, name = self.name)
+        processor._executing = True
+        for step in steps:
+            method, kwargs = next(iter(step.items()))
+            if method == 'mutate' and processor.df.empty:
+                # a row-wise operation cannot be applied to no rows; only add the column
+                processor.df[kwargs['new_colname']] = processor.df.get(kwargs['new_colname'])
+                continue
+            getattr(processor, method)(**kwargs)
+        return processor.df
+
+    def _pending_steps(self) -> List[Dict]:
+        """The registered steps that have not been executed yet (lazy mode)."""
+        if not self.lazy:
+            return []
+        return self.method_registry[self._plan_start:]
+
     def _check_for_col(self, column_names: Union[str, List[str]]):
         """
         helper function that checks for presence of column names in the dataframe.
@@ -841,8 +1103,38 @@ class DataProcessingOrchestrator:
         return column_names
 
 # Helpers - nonself
+def _read_csv_filtered(filepath: str, filters: List[Tuple[str, any, str]], dtype_dict: Optional[dict], read_kwargs: dict) -> pd.DataFrame:
+    """
+    Reads a csv in chunks of CSV_CHUNKSIZE rows and keeps only the rows meeting filters, such that at most one chunk
+    of unfiltered data is held in memory. The dtypes are inferred per chunk, so a column can come out differently than
+    when the whole file is read at once (e.g. kz_kreis as int in chunks without 'Unknown', losing the leading zero).
+    Such columns are read as str, as pandas does for the whole file, in a second pass.
+    """
+    def read(dtype):
+        pass_rates = compile_conditions(filters).initial_pass_rates()     # learned over the chunks
+        with pd.read_csv(filepath, dtype=dtype, chunksize=CSV_CHUNKSIZE, **read_kwargs) as reader:
+            chunks, dtypes = [], {}
+            for chunk in reader:
+                for col, chunk_dtype in chunk.dtypes.items():
+                    dtypes.setdefault(col, set()).add(chunk_dtype)
+                chunks.append(chunk[apply_condition(chunk, filters, pass_rates = pass_rates)])
+        if not chunks:         # no rows at all: only the header
+            return pd.read_csv(filepath, dtype=dtype, nrows=0, **read_kwargs), dtypes
+        return pd.concat(chunks, ignore_index=True), dtypes
+
+    newdf, dtypes = read(dtype_dict)
+    mixed = {col: str for col, found in dtypes.items() if len(found) > 1 and not all(pd.api.types.is_numeric_dtype(dd) for dd in found)}
+    if mixed:
+        newdf, _ = read({**mixed, **(dtype_dict or {})})
+    return newdf
+
+def _feather_columns(filepath: str) -> List[str]:
+    import pyarrow as pa
+    with pa.memory_map(filepath) as source:
+        return pa.ipc.open_file(source).schema.names
+
 def _input_to_list(input):
     """changes the input into a list of the input (only if it not already is, otherwise the input is returned)"""
     if not isinstance(input, list):
         input = [input]   
-    return input
\ No newline at end of file
+    return input
@@ -1,47 +1,254 @@
+import copy
+import numpy as np
 import pandas as pd
-from typing import List, Tuple
+from collections import OrderedDict
+from typing import Hashable, List, Optional, Tuple
+
+# Conditions are compiled once into a CompiledFilter, which is cached per set of conditions (keyed by their full values,
+# see _condition_key), such that repeated filtering (e.g. every chunk of a stream) reuses it. A compiled condition works
+# on numpy arrays: comparisons of numeric columns are plain numpy operations, '==', '!=', 'in', '!in' and 'contains' on
+# categoricals are looked up per category instead of per row, and 'contains' on strings only runs the regex once per
+# distinct value.
+# With 'and' ('or'), later conditions are only evaluated on the rows that are still in (not yet in), starting with
+# the condition that kept the fewest (most) rows. A caller that filters repeatedly keeps the pass rates learned
+# on its previous calls in a list of its own (see CompiledFilter.initial_pass_rates); the compiled filter is never changed.
+OPERATOR_OPTIONS = ['==', '!=','<', '<=', '>', '>=', 'in', '!in', 'contains']
+LOGIC_OPTIONS    = ['and', 'or']
+_CACHE_SIZE      = 128
+_SUBSET_FRACTION = 0.25     # below this fraction of undecided rows, a condition is only evaluated on those rows
 
 def apply_condition(df: pd.DataFrame, 
                      conditions: List[Tuple[str, any, str]], 
-                     logic: str = 'and'):
-    operator_options = ['==', '!=','<', '<=', '>', '>=', 'in', '!in', 'contains']
-    logic_options    = ['and', 'or']
-    
-    if logic not in logic_options:
-        raise ValueError(f'{logic} Unsupported logic. Supported operators are in {logic_options}')
-    
-    operation_dict = {
-            "==":       lambda col, val: df[col] == val,
-            "<":        lambda col, val: df[col] < val,
-            ">":        lambda col, val: df[col] > val,
-            "<=":       lambda col, val: df[col] <= val,
-            ">=":       lambda col, val: df[col] >= val,
-            "!=":       lambda col, val: df[col] != val,
-            "in":       lambda col, val: df[col].isin(_input_to_list(val)),
-            "!in":      lambda col, val: df[col].isin(_input_to_list(val)),
-            "contains": lambda col, val: df[col].str.contains(val, case=False, na=False)
-        } 
-    
-    logic_dict = {
-            'and': lambda cond1, cond2: cond1 & cond2,
-            'or':  lambda cond1, cond2: cond1 | cond2
-        }
-
-    for n, (colname, value, operator) in enumerate(conditions):
-        if operator not in operator_options:
-            raise ValueError(f'{operator} Unsupported operator. Supported operators are in {operator_options}')
-       
-        condition = operation_dict[operator](colname, value)
-
-        if n == 0:
-            combined_condition = condition
-        else:
-            combined_condition = logic_dict[logic](combined_condition, condition)
-        
-    return combined_condition
+                     logic: str = 'and',
+                     pass_rates: Optional[List[float]] = None):
+    """
+    Boolean mask (pd.Series along df.index) of the rows of df meeting the conditions, combined with logic.
+    A condition is a tuple (colname, value, operator), with operator one of OPERATOR_OPTIONS. See CompiledFilter,
+    also for pass_rates.
+    """
+    return compile_conditions(conditions, logic)(df, pass_rates)
+
+def compile_conditions(conditions: List[Tuple[str, any, str]], logic: str = 'and') -> 'CompiledFilter':
+    """
+    The CompiledFilter of conditions and logic, compiled once and reused for the same conditions. Conditions with a
+    value that has no canonical key (see _condition_key) are compiled anew every time.
+    """
+    try:
+        key = (tuple((colname, _condition_key(value), operator) for colname, value, operator in conditions), logic)
+        hash(key)
+    except TypeError:
+        return CompiledFilter(conditions, logic)
+
+    if key in _compiled:
+        _compiled.move_to_end(key)
+        return _compiled[key]
+    compiled = CompiledFilter(conditions, logic)
+    _compiled[key] = compiled
+    if len(_compiled) > _CACHE_SIZE:
+        _compiled.popitem(last=False)
+    return compiled
+
+class CompiledFilter:
+    """
+    Conditions compiled into a single evaluation (see module comment). The result equals combining one mask per
+    condition with '&' or '|', except that missing values in nullable dtypes count as not meeting a condition.
+    The values of the conditions are copied, so changing them afterwards does not change the filter.
+
+    Examples
+    --------
+    >>> recent_munich = CompiledFilter([('year', ['2023', '2024'], 'in'), ('kz_kreis', '09162', '==')])
+    >>> df[recent_munich(df)]
+    >>> pass_rates = recent_munich.initial_pass_rates()
+    >>> chunks = [chunk[recent_munich(chunk, pass_rates)] for chunk in reader]
+    """
+    def __init__(self, conditions: List[Tuple[str, any, str]], logic: str = 'and'):
+        if logic not in LOGIC_OPTIONS:
+            raise ValueError(f'{logic} Unsupported logic. Supported operators are in {LOGIC_OPTIONS}')
+        for _, _, operator in conditions:
+            if operator not in OPERATOR_OPTIONS:
+                raise ValueError(f'{operator} Unsupported operator. Supported operators are in {OPERATOR_OPTIONS}')
+
+        self.conditions = [(colname, value if pd.api.types.is_scalar(value) else copy.deepcopy(value), operator)
+                           for colname, value, operator in conditions]
+        self.logic      = logic
+
+    def initial_pass_rates(self) -> List[float]:
+        """The assumed fraction of rows meeting each condition, before any rows have been seen."""
+        return [_PRIOR_PASS_RATES[operator] for _, _, operator in self.conditions]
+
+    def __call__(self, df: pd.DataFrame, pass_rates: Optional[List[float]] = None) -> pd.Series:
+        """
+        The mask of df. pass_rates (as from initial_pass_rates) is the fraction of the evaluated rows that met each
+        condition on previous calls, and is updated with those of this call; by default the initial_pass_rates.
+        """
+        pass_rates = self.initial_pass_rates() if pass_rates is None else pass_rates
+        n_rows = len(df)
+        order  = np.argsort(pass_rates, kind='stable')
+        if self.logic == 'or':
+            order = order[::-1]
+
+        mask = None
+        for nn in order:
+            colname, value, operator = self.conditions[nn]
+            if mask is None:
+                mask = _evaluate(df[colname], value, operator)
+                mask = mask.copy() if len(order) > 1 else mask     # written to by the next conditions
+                pass_rates[nn] = np.count_nonzero(mask) / n_rows if n_rows else pass_rates[nn]
+                continue
+
+            # 'and': only rows still in are undecided; 'or': only rows not yet in
+            undecided   = mask if self.logic == 'and' else ~mask
+            n_undecided = np.count_nonzero(undecided)
+            if n_undecided == 0:
+                break
+            if n_undecided < _SUBSET_FRACTION * n_rows:
+                rows       = np.flatnonzero(undecided)
+                met        = _evaluate(df[colname], value, operator, rows)
+                mask[rows] = met
+            else:
+                met  = _evaluate(df[colname], value, operator)
+                mask = mask & met if self.logic == 'and' else mask | met
+                met  = met[undecided]
+            pass_rates[nn] = np.count_nonzero(met) / len(met)
+
+        if mask is None:
+            mask = np.ones(n_rows, dtype=bool)
+        return pd.Series(mask, index=df.index)
+
+def _evaluate(series: pd.Series, value, operator: str, rows: Optional[np.ndarray] = None) -> np.ndarray:
+    """Whether the rows (positions, or all if None) of series meet the condition, as a boolean array."""
+    if isinstance(series.dtype, pd.CategoricalDtype) and operator in _PER_CATEGORY:
+        codes = series.cat.codes.to_numpy()
+        codes = codes if rows is None else codes[rows]
+        if operator in ('==', '!=') and pd.api.types.is_scalar(value):
+            # a single category: compare the codes
+            code = series.cat.categories.get_indexer([value])[0] if not pd.isna(value) else -1
+            if code == -1:
+                return np.full(len(codes), operator == '!=')
+            return codes == code if operator == '==' else codes != code
+        # decide per category (and for missing values), then look up the codes of the rows
+        met_per_code = np.append(_PER_CATEGORY[operator](pd.Series(series.cat.categories), value), _MISSING_MEETS[operator](value))
+        return met_per_code[codes]
+
+    if isinstance(series.dtype, np.dtype) and series.dtype.kind in 'iuf' and operator in _NUMPY_OPERATIONS \
+            and isinstance(value, (int, float, np.number)) and not isinstance(value, bool):
+        array = series.to_numpy()
+        return _NUMPY_OPERATIONS[operator](array if rows is None else array[rows], value)
+
+    subset = series if rows is None else series.iloc[rows]
+    if operator == 'contains':
+        # the regex only runs on the distinct values
+        codes, uniques = pd.factorize(subset)
+        met_per_code   = np.append(_PER_CATEGORY['contains'](pd.Series(uniques, dtype=subset.dtype), value), False)
+        return met_per_code[codes]
+    return _as_bool(_PANDAS_OPERATIONS[operator](subset, value))
+
+def _as_bool(mask) -> np.ndarray:
+    if isinstance(mask, pd.Series):
+        return mask.to_numpy() if mask.dtype == bool else mask.to_numpy(dtype=bool, na_value=False)
+    return np.asarray(mask, dtype=bool)
+
+_PRIOR_PASS_RATES = {'==': 0.1, 'in': 0.3, 'contains': 0.3, '<': 0.5, '<=': 0.5, '>': 0.5, '>=': 0.5, '!in': 0.7, '!=': 0.9}
+
+_NUMPY_OPERATIONS = {
+        "==":  np.equal,
+        "!=":  np.not_equal,
+        "<":   np.less,
+        "<=":  np.less_equal,
+        ">":   np.greater,
+        ">=":  np.greater_equal,
+    }
+
+_PANDAS_OPERATIONS = {
+        "==":       lambda col, val: col == val,
+        "<":        lambda col, val: col < val,
+        ">":        lambda col, val: col > val,
+        "<=":       lambda col, val: col <= val,
+        ">=":       lambda col, val: col >= val,
+        "!=":       lambda col, val: col != val,
+        "in":       lambda col, val: col.isin(_input_to_list(val)),
+        "!in":      lambda col, val: ~col.isin(_input_to_list(val)),
+    }
+
+# operators that can be decided per category of a categorical, and whether a missing value meets them
+_PER_CATEGORY = {
+        "==":       lambda categories, val: categories.isin([val]).to_numpy(),
+        "!=":       lambda categories, val: ~categories.isin([val]).to_numpy(),
+        "in":       lambda categories, val: categories.isin(_input_to_list(val)).to_numpy(),
+        "!in":      lambda categories, val: ~categories.isin(_input_to_list(val)).to_numpy(),
+        "contains": lambda categories, val: categories.str.contains(val, case=False, na=False).to_numpy(dtype=bool),
+    }
+
+_MISSING_MEETS = {
+        "==":       lambda val: False,
+        "!=":       lambda val: True,
+        "in":       lambda val: bool(pd.isna(_input_to_list(val)).any()),
+        "!in":      lambda val: not pd.isna(_input_to_list(val)).any(),
+        "contains": lambda val: False,
+    }
+
+_compiled = OrderedDict()
+
+def _condition_key(value) -> Hashable:
+    """
+    A hashable key of a condition value, built from all of it (unlike its repr, which abbreviates long arrays), and
+    from its type, as e.g. a tuple is compared as one value but a list as values to choose from. Raises TypeError
+    for values without one, e.g. objects that are neither scalars nor collections of them.
+    """
+    if isinstance(value, (list, tuple, set, frozenset, np.ndarray, pd.Series, pd.Index)):
+        items = tuple(_condition_key(item) for item in (value.tolist() if hasattr(value, 'tolist') else value))
+        return (type(value).__name__, frozenset(items) if isinstance(value, (set, frozenset)) else items)
+    if not pd.api.types.is_scalar(value):
+        raise TypeError(f"no key for a condition value of type {type(value).__name__}")
+    if pd.isna(value):
+        return (type(value).__name__, 'NA')
+    hash(value)
+    return (type(value).__name__, value)
 
 def _input_to_list(input):
-    """changes the input into a list of the input (only if it not already is, otherwise the input is returned)"""
+    """changes the input into a list of the input (only if it not already is, otherwise the input is returned); arrays, Series and sets become lists of their values"""
+    if isinstance(input, (np.ndarray, pd.Series, pd.Index)):
+        return input.tolist()
+    if isinstance(input, (set, frozenset)):
+        return list(input)
     if not isinstance(input, list):
         input = [input]   
-    return input
\ No newline at end of file
+    return input
+
+def conditions_to_arrow(conditions: List[Tuple[str, any, str]]):
+    """
+    Translates the conditions (combined with 'and') that can be evaluated by a pyarrow dataset scan into one expression,
+    such that partitions and row groups can be skipped while reading. Returns None if none of them can.
+    Only operators that treat missing values as pandas does are translated: '!=' and '!in' keep missing values in
+    pandas but not in pyarrow, and 'contains' is case-insensitive in pandas. The remaining conditions are left to apply_condition.
+    """
+    import pyarrow.dataset as ds
+
+    expression = None
+    for colname, value, operator in conditions:
+        if operator not in _ARROW_OPERATIONS:
+            continue
+        condition  = _ARROW_OPERATIONS[operator](ds.field(colname), value)
+        expression = condition if expression is None else expression & condition
+    return expression
+
+
+def pandas_only_conditions(conditions: List[Tuple[str, any, str]]) -> List[Tuple[str, any, str]]:
+    """The conditions that conditions_to_arrow leaves to apply_condition."""
+    return [condition for condition in conditions if condition[2] not in _ARROW_OPERATIONS]
+
+_ARROW_OPERATIONS = {
+        "==":  lambda field, val: field == val,
+        "<":   lambda field, val: field < val,
+        ">":   lambda field, val: field > val,
+        "<=":  lambda field, val: field <= val,
+        ">=":  lambda field, val: field >= val,
+        "in":  lambda field, val: field.isin(_input_to_list(val)),
+    }
+
+
+def scan_columns(columns: Optional[List[str]], conditions: Optional[List[Tuple[str, any, str]]]) -> Optional[List[str]]:
+    """The columns to read for columns and the columns the conditions filter on, or None (all columns) if columns is None."""
+    if columns is None:
+        return None
+    return list(dict.fromkeys(list(columns) + [colname for colname, _, _ in conditions or []]))
@@ -0,0 +1,232 @@
+import json
+import os
+import uuid
+import pandas as pd
+from typing import Dict, Iterator, List, Optional, Tuple
+from .filtering import apply_condition, conditions_to_arrow, pandas_only_conditions
+
+# A partitioned parquet dataset is a directory with one subdirectory per partition (e.g. year=2024/) holding part-files,
+# and a manifest listing the part-files of the current version. Writers add new part-files and then atomically swap the
+# manifest, so readers that go through the manifest always get one consistent snapshot.
+MANIFEST_FILENAME = "_manifest.json"
+WRITE_MODES       = ['overwrite', 'replace_partitions']
+
+
+def write_partitions(df: pd.DataFrame, path: str, partition_cols: List[str], mode: str = 'overwrite', row_group_size: Optional[int] = None):
+    """
+    Writes df as a partitioned parquet dataset into directory path.
+
+    Parameters
+    ----------
+    df: pd.DataFrame
+        The data to write.
+    path: str
+        Directory of the dataset, e.g. 'measles/measles.parquet'.
+    partition_cols: List[str]
+        Columns by which df is partitioned. Their values become directory names and are read back as strings.
+    mode: str
+        'overwrite' makes df the whole dataset. 'replace_partitions' only replaces the partitions present in df
+        and keeps all other partitions of the dataset, e.g. to refresh a single year.
+    row_group_size: int, optional
+        Maximum number of rows per row group of the part-files. By default that of pyarrow.
+
+    Notes
+    -----
+    Part-files of the previous version are only removed by the next write, such that a reader that has just read
+    the previous manifest can still read its snapshot. Assumes a single writer at a time.
+    """
+    writer = PartitionWriter(path, partition_cols, mode=mode, row_group_size=row_group_size)
+    writer.write(df)
+    writer.close()
+
+
+class PartitionWriter:
+    """
+    Writes a partitioned parquet dataset (see write_partitions) from several dataframes, e.g. chunks of a stream.
+    Every write adds part-files; close swaps in the manifest, so readers only see the dataset once it is complete.
+
+    Examples
+    --------
+    >>> writer = PartitionWriter('measles/measles.parquet', ['year'])
+    >>> for chunk in chunks:
+    >>>     writer.write(chunk)
+    >>> writer.close()
+    """
+    def __init__(self, path: str, partition_cols: List[str], mode: str = 'overwrite', row_group_size: Optional[int] = None):
+        if mode not in WRITE_MODES:
+            raise ValueError(f"Invalid value for mode: {mode}. Please choose from {WRITE_MODES}")
+
+        os.makedirs(path, exist_ok=True)
+        self.path           = path
+        self.partition_cols = partition_cols
+        self.mode           = mode
+        self.row_group_size = row_group_size
+        self.previous       = read_manifest(path) or _manifest_from_files(path, partition_cols)
+        self.partitions     = {}
+        if mode == 'replace_partitions' and self.previous['partitions'] and self.previous['partition_cols'] != partition_cols:
+            raise ValueError(f"dataset {path} is partitioned by {self.previous['partition_cols']}, not by {partition_cols}")
+
+    def write(self, df: pd.DataFrame):
+        """Writes one part-file per partition in df."""
+        for values, partition_df in df.groupby(self.partition_cols, sort=True, observed=True):
+            values    = values if isinstance(values, tuple) else (values,)
+            partition = "/".join(f"{col}={value}" for col, value in zip(self.partition_cols, values))
+            part_file = f"{partition}/part-{uuid.uuid4().hex}.parquet"
+            os.makedirs(os.path.join(self.path, partition), exist_ok=True)
+            partition_df.drop(columns=self.partition_cols).to_parquet(os.path.join(self.path, part_file), index=False, row_group_size=self.row_group_size)
+            self.partitions.setdefault(partition, []).append(part_file)
+
+    def close(self):
+        """Makes the written partitions the current version of the dataset and removes part-files that are no longer used."""
+        partitions = dict(self.previous['partitions']) if self.mode == 'replace_partitions' else {}
+        partitions.update(self.partitions)
+        manifest = {
+            'version': self.previous['version'] + 1,
+            'partition_cols': self.partition_cols,
+            'partitions': dict(sorted(partitions.items())),
+            'previous_files': manifest_files(self.previous),
+        }
+        _write_manifest(manifest, self.path)
+        _remove_unreferenced(self.path, set(manifest_files(manifest)) | set(manifest['previous_files']))
+
+
+def read_partitions(path: str, columns: Optional[List[str]] = None, filters: Optional[List[Tuple[str, any, str]]] = None) -> pd.DataFrame:
+    """
+    Reads the current snapshot of a partitioned parquet dataset (or a single parquet file), with the partition
+    columns (as strings) last. Datasets without a manifest (e.g. written by pandas directly) are read as a plain
+    hive-partitioned directory.
+
+    Only columns are read (those that exist), and the filters that can be evaluated while scanning
+    (see filtering.conditions_to_arrow) skip whole partitions and row groups whose statistics rule them out.
+    The other filters are applied to the rows that are read, so the rows that are returned meet all filters;
+    columns has to include the columns they filter on.
+    """
+    import pyarrow as pa
+
+    dataset = _dataset(path)
+    if dataset is None:
+        return pd.DataFrame()
+    columns, expression = _scan_arguments(dataset, columns, filters)
+    remaining = pandas_only_conditions(filters or [])
+    try:
+        table = dataset.to_table(columns=columns, filter=expression)
+    except (pa.lib.ArrowException, TypeError, ValueError):
+        # e.g. a value that does not match the type of its column: leave the filtering to pandas
+        table     = dataset.to_table(columns=columns)
+        remaining = filters
+    df = table.to_pandas()
+    if remaining:
+        df = df[apply_condition(df, remaining)].reset_index(drop=True)
+    return df
+
+
+def iter_partitions(path: str, batch_size: int, columns: Optional[List[str]] = None, filters: Optional[List[Tuple[str, any, str]]] = None) -> Iterator[pd.DataFrame]:
+    """As read_partitions, but yields the data in dataframes of at most batch_size rows, reading one batch at a time."""
+    import pyarrow as pa
+
+    dataset = _dataset(path)
+    if dataset is None:
+        return
+    columns, expression = _scan_arguments(dataset, columns, filters)
+    try:
+        batches = dataset.to_batches(columns=columns, filter=expression, batch_size=batch_size)
+        first   = next(batches, None)
+    except (pa.lib.ArrowException, TypeError, ValueError):
+        batches = dataset.to_batches(columns=columns, batch_size=batch_size)
+        first   = next(batches, None)
+    if first is None:
+        return
+    yield first.to_pandas()
+    for batch in batches:
+        yield batch.to_pandas()
+
+
+def read_manifest(path: str) -> Optional[Dict]:
+    """The manifest of the dataset in path, or None if it has none."""
+    manifest_path = os.path.join(path, MANIFEST_FILENAME)
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def string_partitioning(path: str):
+    """
+    Hive-partitioning of a parquet directory, with the partition values read as strings, i.e. as in the directory names.
+    Returns 'hive' for a single file or a directory without partitions.
+    """
+    keys = []
+    while os.path.isdir(path):
+        subdirs = [dd for dd in sorted(os.listdir(path)) if '=' in dd and os.path.isdir(os.path.join(path, dd))]
+        if not subdirs:
+            break
+        keys.append(subdirs[0].split('=', 1)[0])
+        path = os.path.join(path, subdirs[0])
+
+    if not keys:
+        return 'hive'
+
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    return ds.partitioning(pa.schema([(key, pa.string()) for key in keys]), flavor='hive')
+
+
+# Helpers
+def _dataset(path: str):
+    """pyarrow dataset of the current snapshot in path (see read_partitions), or None if the manifest lists no files."""
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    manifest = read_manifest(path) if os.path.isdir(path) else None
+    if manifest is None:
+        return ds.dataset(path, format='parquet', partitioning=string_partitioning(path))
+
+    files = [os.path.join(path, ff) for ff in manifest_files(manifest)]
+    if not files:
+        return None
+    partitioning = ds.partitioning(pa.schema([(col, pa.string()) for col in manifest['partition_cols']]), flavor='hive')
+    return ds.dataset(files, format='parquet', partitioning=partitioning, partition_base_dir=path)
+
+
+def _scan_arguments(dataset, columns: Optional[List[str]], filters: Optional[List[Tuple[str, any, str]]]):
+    """The existing columns (in the order of the dataset) and the filter expression to scan dataset with."""
+    if columns is not None:
+        columns = [col for col in dataset.schema.names if col in columns]
+    return columns, conditions_to_arrow(filters) if filters else None
+
+
+def manifest_files(manifest: Dict) -> List[str]:
+    """The part-files listed in a manifest, relative to the dataset."""
+    return [ff for files in manifest['partitions'].values() for ff in files]
+
+
+def _manifest_from_files(path: str, partition_cols: List[str]) -> Dict:
+    """Manifest describing the part-files already on disk, for a dataset written before manifests were kept."""
+    partitions = {}
+    for root, _, files in os.walk(path):
+        parquet_files = sorted(ff for ff in files if ff.endswith('.parquet'))
+        if parquet_files and root != path:
+            partition = os.path.relpath(root, path).replace(os.sep, '/')
+            partitions[partition] = [f"{partition}/{ff}" for ff in parquet_files]
+    return {'version': 0, 'partition_cols': partition_cols, 'partitions': partitions, 'previous_files': []}
+
+
+def _write_manifest(manifest: Dict, path: str):
+    manifest_path = os.path.join(path, MANIFEST_FILENAME)
+    temp_path     = manifest_path + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, manifest_path)
+
+
+def _remove_unreferenced(path: str, keep: set):
+    """Removes part-files (and then empty partition directories) that neither the current nor the previous version uses."""
+    for root, _, files in os.walk(path, topdown=False):
+        for ff in files:
+            relpath = os.path.relpath(os.path.join(root, ff), path).replace(os.sep, '/')
+            if ff.endswith('.parquet') and root != path and relpath not in keep:
+                os.remove(os.path.join(root, ff))
+        if root != path and not os.listdir(root):
+            os.rmdir(root)
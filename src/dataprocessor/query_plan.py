@@ -0,0 +1,246 @@
+import re
+from typing import Dict, List, Optional, Set, Tuple
+
+# A plan is a list of steps in the format of DataProcessingOrchestrator.method_registry: [{method: kwargs}, ...].
+# optimize_plan rewrites such a list into an equivalent, cheaper one:
+#   - predicate pushdown:  filters are moved before the steps they do not depend on, up into import_data
+#   - projection pushdown: import_data only reads the columns that later steps use
+#   - fusion:              adjacent filters, renames, dtype changes and column selections are merged into one step
+
+
+def optimize_plan(steps: List[Dict], has_df: bool = False) -> List[Dict]:
+    """
+    Optimizes a plan of registered steps (see module comment).
+
+    Parameters
+    ----------
+    steps: List[Dict]
+        The steps, as in method_registry.
+    has_df: bool
+        Whether the orchestrator already holds a dataframe before the first step. If so, an import_data merges
+        into it, and nothing is pushed into that import_data.
+
+    Returns
+    -------
+    List[Dict]
+        The optimized steps.
+
+    Examples
+    --------
+    >>> optimize_plan([{'import_data': {...}}, {'select': {'rows': None, 'colnames': ['year', 'cases']}}, {'filter': {'conditions': [('year', 2020, '>=')], 'logic': 'and'}}])
+    [{'import_data': {..., 'columns': ['cases', 'year'], 'filters': [('year', 2020, '>=')]}}, {'select': {'rows': None, 'colnames': ['year', 'cases']}}]
+    """
+    steps = [{_method(step): dict(_kwargs(step))} for step in steps]
+    steps = _push_down_filters(steps)
+    steps = _fuse(steps)
+    steps = _push_into_scan(steps, has_df)
+    return steps
+
+
+def explain(steps: List[Dict]) -> str:
+    """Readable one-line-per-step representation of a plan."""
+    lines = []
+    for nn, step in enumerate(steps):
+        kwargs = ", ".join(f"{key}={value!r}" for key, value in _kwargs(step).items() if value is not None and key != 'mapping_dict')
+        lines.append(f"{nn}: {_method(step)}({kwargs})")
+    return "\n".join(lines)
+
+
+# Predicate pushdown
+def _push_down_filters(steps: List[Dict]) -> List[Dict]:
+    """Moves every filter as far to the front as the steps before it allow."""
+    steps = list(steps)
+    for ii in range(len(steps)):
+        if _method(steps[ii]) != 'filter':
+            continue
+        jj = ii
+        while jj > 0:
+            moved = _filter_before(steps[jj], steps[jj - 1])
+            if moved is None:
+                break
+            steps[jj - 1], steps[jj] = moved, steps[jj - 1]
+            jj -= 1
+    return steps
+
+
+def _filter_before(filter_step: Dict, previous: Dict) -> Optional[Dict]:
+    """
+    The filter step rewritten such that it can run before previous with the same result, or None if it cannot.
+    Filters commute with steps that neither change the number or order of rows nor write the filtered columns.
+    """
+    kwargs  = _kwargs(filter_step)
+    columns = {col for col, _, _ in kwargs['conditions']}
+    method  = _method(previous)
+    other   = _kwargs(previous)
+
+    if method == 'filter':
+        return None     # neighbouring filters are fused instead
+    if method == 'select' and other.get('rows') is None:
+        return filter_step
+    if method == 'rename_cols':
+        inverse = {new: old for old, new in other['colnames_dict'].items()}
+        return {'filter': {**kwargs, 'conditions': [(inverse.get(col, col), value, op) for col, value, op in kwargs['conditions']]}}
+    if method == 'change_dtype' and not columns & set(other['dtype_dict']):
+        return filter_step
+    if method == 'replace' and other['colname'] not in columns:
+        return filter_step
+    if method == 'impute' and (other['method'] == 'drop' or not columns & set(_as_list(other['colnames']))):
+        return filter_step
+    if method == 'drop' and other.get('axis') == 1 and not columns & set(_as_list(other['labels'])):
+        return filter_step
+    if method == 'mutate' and other['new_colname'] not in columns and _mutate_is_rowwise(other):
+        return filter_step
+    return None
+
+
+def is_row_local(step: Dict) -> bool:
+    """
+    Whether a step computes every row on its own, without looking at other rows or at the order of the rows,
+    such that it can run on chunks of the data one by one (see dataprocessor/streaming.py).
+    """
+    method, kwargs = _method(step), _kwargs(step)
+    if method in ('filter', 'rename_cols', 'change_dtype', 'replace', 'impute'):
+        return True
+    if method == 'drop':
+        return kwargs.get('axis') == 1
+    if method == 'select':
+        return kwargs.get('rows') is None
+    if method == 'mutate':
+        return _mutate_is_rowwise(kwargs)
+    return False
+
+
+def _mutate_is_rowwise(kwargs: Dict) -> bool:
+    """Whether a mutate computes every row on its own: a scalar value or a row-wise lambda (not a list, Series or column-wise operation)."""
+    operation = kwargs.get('operation')
+    if operation is not None:
+        return isinstance(operation, str) and operation.startswith('lambda')
+    return not hasattr(kwargs.get('value'), '__len__') or isinstance(kwargs.get('value'), str)
+
+
+# Fusion
+def _fuse(steps: List[Dict]) -> List[Dict]:
+    fused = []
+    for step in steps:
+        merged = _merge(fused[-1], step) if fused else None
+        if merged is None:
+            fused.append(step)
+        else:
+            fused[-1] = merged
+    return fused
+
+
+def _merge(first: Dict, second: Dict) -> Optional[Dict]:
+    """The two adjacent steps as one step, or None if they cannot be merged."""
+    method, kwargs1, kwargs2 = _method(first), _kwargs(first), _kwargs(second)
+    if method != _method(second):
+        return None
+
+    if method == 'filter':
+        conditions1, conditions2 = kwargs1['conditions'], kwargs2['conditions']
+        if (kwargs1['logic'] == 'and' or len(conditions1) == 1) and (kwargs2['logic'] == 'and' or len(conditions2) == 1):
+            return {'filter': {'conditions': list(conditions1) + list(conditions2), 'logic': 'and'}}
+
+    if method == 'rename_cols':
+        renames1, renames2 = kwargs1['colnames_dict'], kwargs2['colnames_dict']
+        composed = {old: renames2.get(new, new) for old, new in renames1.items()}
+        composed.update({old: new for old, new in renames2.items() if old not in renames1.values() and old not in renames1})
+        return {'rename_cols': {'colnames_dict': composed}}
+
+    if method == 'change_dtype' and not set(kwargs1['dtype_dict']) & set(kwargs2['dtype_dict']):
+        return {'change_dtype': {'dtype_dict': {**kwargs1['dtype_dict'], **kwargs2['dtype_dict']}}}
+
+    if method == 'select' and kwargs1.get('rows') is None and kwargs2.get('rows') is None:
+        if kwargs1.get('colnames') is not None and set(_as_list(kwargs2.get('colnames') or [])) <= set(_as_list(kwargs1['colnames'])):
+            return second
+
+    return None
+
+
+# Projection and predicate pushdown into the scan
+def _push_into_scan(steps: List[Dict], has_df: bool) -> List[Dict]:
+    """Hands the filters directly after import_data, and the columns the rest of the plan needs, to import_data itself."""
+    if has_df or not steps or _method(steps[0]) != 'import_data':
+        return steps
+
+    scan = dict(_kwargs(steps[0]))
+    rest = list(steps[1:])
+    if rest and _method(rest[0]) == 'filter' and _kwargs(rest[0])['logic'] == 'and':
+        scan['filters'] = list(scan.get('filters') or []) + list(_kwargs(rest[0])['conditions'])
+        rest = rest[1:]
+
+    # import_data reads the columns of its filters itself, and drops them after filtering unless they are needed
+    needed = _needed_columns(rest)
+    if needed is not None:
+        if scan.get('columns') is not None:
+            needed &= set(scan['columns'])
+        scan['columns'] = sorted(needed)
+
+    return [{'import_data': scan}] + rest
+
+
+def _needed_columns(steps: List[Dict]) -> Optional[Set[str]]:
+    """
+    The columns of the input that steps read, found by walking the plan backwards from the last step.
+    Returns None if all columns may be needed, e.g. when the plan does not end in a selection of columns.
+    """
+    needed = None
+    for step in reversed(steps):
+        method, kwargs = _method(step), _kwargs(step)
+
+        if method == 'select' and kwargs.get('rows') is None and kwargs.get('colnames') is not None:
+            needed = set(_as_list(kwargs['colnames']))
+        elif method == 'groupby':
+            needed = set(_as_list(kwargs['groupby_columns'])) | set(kwargs['aggregations'])
+        elif needed is None:
+            continue
+        elif method == 'rename_cols':
+            inverse = {new: old for old, new in kwargs['colnames_dict'].items()}
+            needed  = {inverse.get(col, col) for col in needed}
+        elif method == 'filter':
+            needed |= {col for col, _, _ in kwargs['conditions']}
+        elif method == 'change_dtype':
+            needed |= set(kwargs['dtype_dict'])
+        elif method == 'replace':
+            needed |= {kwargs['colname']}
+        elif method == 'impute':
+            needed |= set(_as_list(kwargs['colnames']))
+        elif method == 'drop' and kwargs.get('axis') == 1:
+            needed |= set(_as_list(kwargs['labels']))
+        elif method == 'mutate':
+            used = _mutate_columns(kwargs)
+            if used is None:
+                return None
+            if kwargs.get('conditions') is None and kwargs['new_colname'] in needed:
+                needed.discard(kwargs['new_colname'])   # (over)written entirely, so not needed from the input
+            needed |= used
+        else:
+            return None
+    return needed
+
+
+def _mutate_columns(kwargs: Dict) -> Optional[Set[str]]:
+    """Columns a mutate reads, or None if that cannot be told from its arguments."""
+    used      = {col for col, _, _ in kwargs.get('conditions') or []}
+    operation = kwargs.get('operation')
+    if isinstance(operation, str) and operation.startswith('lambda'):
+        # a row-wise lambda reads the columns it indexes, e.g. row['kz_kreis']; anything else could read any column
+        if re.search(r"row\[(?!\s*['\"][^'\"]+['\"]\s*\])", operation) or re.search(r"row\.", operation):
+            return None
+        return used | set(re.findall(r"row\[\s*['\"]([^'\"]+)['\"]\s*\]", operation))
+    if operation is not None:
+        return used | {kwargs['value']} if isinstance(kwargs.get('value'), str) else None
+    return used
+
+
+# Helpers
+def _method(step: Dict) -> str:
+    return next(iter(step))
+
+
+def _kwargs(step: Dict) -> Dict:
+    return next(iter(step.values()))
+
+
+def _as_list(value) -> list:
+    return list(value) if isinstance(value, (list, tuple, set)) else [value]
@@ -0,0 +1,279 @@
+import json
+import os
+import uuid
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+from .partitioned_store import read_manifest, manifest_files
+
+# A secondary index of a parquet dataset (a single file or a partitioned dataset with a manifest) is stored next to it,
+# in the directory '_index' inside a partitioned dataset and '<file>.index' for a single file. Every row of the snapshot
+# has a global id: its position when all part-files are read one after another. Per indexed column, the index holds
+# the values sorted, with the ids of their rows, such that the rows with a value or a range of values are found by
+# binary search. Only the row groups holding these rows are read. Rows are clustered by the indexed columns when
+# saved (see save_data), so the rows of e.g. one county lie in few row groups.
+# The arrays are .npy files that are memory-mapped, so opening an index only reads meta.json, and a lookup only the
+# pages its binary search touches. meta.json is replaced last; the arrays of the previous build are kept until the next.
+INDEX_DIRNAME     = "_index"
+INDEX_SUFFIX      = ".index"
+META_FILENAME     = "meta.json"
+INDEX_OPERATORS   = ['==', 'in', '<', '<=', '>', '>=']
+ROW_GROUP_SIZE    = 4096
+# above this fraction of the rows, reading through the index is not cheaper than scanning
+MAX_READ_FRACTION = 0.25
+
+
+class SecondaryIndex:
+    """
+    Sorted values and row ids of the indexed columns of a parquet dataset (see module comment).
+
+    Examples
+    --------
+    >>> index = read_index('measles/measles.parquet')
+    >>> index.lookup([('kz_kreis', '09162', '=='), ('year', '2020', '>=')])
+    """
+    def __init__(self, meta: Dict, arrays: Dict[str, np.ndarray]):
+        self.files        = meta['files']
+        self.row_offsets  = np.array(meta['row_offsets'], dtype=np.int64)   # global id of the first row of each file, and the total
+        self.group_starts = np.array(meta['group_starts'], dtype=np.int64)  # global id of the first row of each row group
+        self.file_groups  = np.array(meta['file_groups'], dtype=np.int64)   # index of the first row group of each file in group_starts
+        self.keys         = {col: arrays[f"{col}.keys"] for col in meta['columns']}
+        self.ids          = {col: arrays[f"{col}.ids"] for col in meta['columns']}
+
+    @property
+    def n_rows(self) -> int:
+        return int(self.row_offsets[-1])
+
+    def lookup(self, conditions: List[Tuple[str, any, str]]) -> Optional[np.ndarray]:
+        """
+        Sorted global ids of the rows that may meet all conditions, using the conditions on indexed columns with an
+        operator in INDEX_OPERATORS. Returns None if no condition can use the index. The other conditions are not
+        checked, so the rows still have to be filtered.
+        """
+        # conditions on the same column narrow one range of its sorted keys; 'in' gives a set of ids per value
+        bounds, hits = {}, []
+        for colname, value, operator in conditions:
+            if colname not in self.keys or operator not in INDEX_OPERATORS:
+                continue
+            try:
+                if operator == 'in':
+                    hits.append(self._lookup_in(colname, value))
+                else:
+                    lower, upper = self._bounds(colname, value, operator)
+                    current      = bounds.get(colname, (0, len(self.keys[colname])))
+                    bounds[colname] = (max(current[0], lower), min(current[1], upper))
+            except (TypeError, ValueError):
+                continue                                # e.g. a value of another type: left to the filter
+        hits += [self.ids[colname][lower:max(lower, upper)] for colname, (lower, upper) in bounds.items()]
+        if not hits:
+            return None
+
+        hits = sorted(hits, key=len)
+        ids  = np.sort(hits[0])
+        for other in hits[1:]:
+            ids = ids[np.isin(ids, other, assume_unique=True)]
+        return ids
+
+    def _bounds(self, colname: str, value, operator: str) -> Tuple[int, int]:
+        """Range [lower, upper) of the sorted keys of colname meeting the condition, by binary search."""
+        keys = self.keys[colname]
+        key  = _as_key(value, keys.dtype)
+        if operator == '==':
+            return np.searchsorted(keys, key, 'left'), np.searchsorted(keys, key, 'right')
+        if operator == '<':
+            return 0, np.searchsorted(keys, key, 'left')
+        if operator == '<=':
+            return 0, np.searchsorted(keys, key, 'right')
+        if operator == '>':
+            return np.searchsorted(keys, key, 'right'), len(keys)
+        return np.searchsorted(keys, key, 'left'), len(keys)
+
+    def _lookup_in(self, colname: str, value) -> np.ndarray:
+        values = value if isinstance(value, list) else [value]
+        if pd.isna(values).any():
+            raise ValueError("missing values are not indexed")
+        ranges = [self._bounds(colname, val, '==') for val in values]
+        return np.concatenate([self.ids[colname][lower:upper] for lower, upper in ranges] or [self.ids[colname][:0]])
+
+
+def build_index(path: str, columns: List[str]) -> SecondaryIndex:
+    """
+    Builds and saves the index over columns of the parquet dataset (or file) in path, for its current snapshot.
+    Partition columns can be indexed as well. Missing values are not indexed.
+    """
+    import pyarrow.parquet as pq
+
+    files        = _snapshot_files(path)
+    row_offsets  = [0]
+    group_starts = []
+    file_groups  = []
+    values       = {col: [] for col in columns}
+    for ff in files:
+        parquet_file = pq.ParquetFile(os.path.join(path, ff) if ff else path)
+        metadata     = parquet_file.metadata
+        file_groups.append(len(group_starts))
+        group_starts.extend(row_offsets[-1] + np.cumsum([0] + [metadata.row_group(gg).num_rows for gg in range(metadata.num_row_groups)])[:-1])
+
+        partition = _partition_values(ff)
+        table     = parquet_file.read(columns=[col for col in columns if col in parquet_file.schema_arrow.names])
+        for col in columns:
+            if col in partition:
+                values[col].append(np.full(metadata.num_rows, partition[col], dtype=object))
+            elif col in table.column_names:
+                values[col].append(table.column(col).to_pandas().to_numpy(dtype=object))
+            else:
+                raise ValueError(f'{col} not a valid column name of {path}')
+        row_offsets.append(row_offsets[-1] + metadata.num_rows)
+
+    meta = {
+        'token':        uuid.uuid4().hex,
+        'files':        files,
+        'source':       _source_stamp(path, files),
+        'row_offsets':  row_offsets,
+        'group_starts': [int(start) for start in group_starts],
+        'file_groups':  file_groups,
+        'columns':      columns,
+    }
+    arrays = {}
+    for col in columns:
+        column = np.concatenate(values[col]) if values[col] else np.array([], dtype=object)
+        valid  = ~pd.isna(column)
+        keys   = _as_keys(column[valid])
+        order  = np.argsort(keys, kind='stable')
+        arrays[f"{col}.keys"] = keys[order]
+        arrays[f"{col}.ids"]  = np.flatnonzero(valid)[order].astype(np.int64)
+
+    index_dir = _index_dir(path)
+    os.makedirs(index_dir, exist_ok=True)
+    previous  = _read_meta(index_dir)
+    for name, array in arrays.items():
+        np.save(os.path.join(index_dir, f"{name}.{meta['token']}.npy"), array)
+    meta['previous_token'] = previous['token'] if previous else None
+    with open(os.path.join(index_dir, META_FILENAME + ".tmp"), "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(os.path.join(index_dir, META_FILENAME + ".tmp"), os.path.join(index_dir, META_FILENAME))
+
+    for ff in os.listdir(index_dir):
+        if ff.endswith(".npy") and ff.rsplit(".", 2)[-2] not in (meta['token'], meta['previous_token']):
+            os.remove(os.path.join(index_dir, ff))
+    return SecondaryIndex(meta, arrays)
+
+
+def read_index(path: str) -> Optional[SecondaryIndex]:
+    """The index of the parquet dataset (or file) in path, or None if it has none or the data changed since it was built."""
+    index_dir = _index_dir(path)
+    meta      = _read_meta(index_dir)
+    if meta is None:
+        return None
+    files = _snapshot_files(path)
+    if meta['files'] != files or meta['source'] != _source_stamp(path, files):
+        return None
+    arrays = {f"{col}.{kind}": np.load(os.path.join(index_dir, f"{col}.{kind}.{meta['token']}.npy"), mmap_mode='r')
+              for col in meta['columns'] for kind in ('keys', 'ids')}
+    return SecondaryIndex(meta, arrays)
+
+
+def read_indexed(path: str, filters: List[Tuple[str, any, str]], columns: Optional[List[str]] = None) -> Optional[pd.DataFrame]:
+    """
+    Reads the rows of the parquet dataset (or file) in path that may meet filters, through its index: only the row
+    groups holding them are read. The rows come in the order of a full read, with the partition columns (as strings)
+    last, as in read_partitions. Returns None if there is no (up-to-date) index, the filters cannot use it, or they
+    select too large a part of the data; read_partitions is then the better choice.
+    Unlike with read_partitions, the filters still have to be applied to the result.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    index = read_index(path) if filters else None
+    ids   = index.lookup(filters) if index is not None else None
+    if ids is None or len(ids) > MAX_READ_FRACTION * index.n_rows:
+        return None
+
+    file_of_id  = np.searchsorted(index.row_offsets, ids, 'right') - 1
+    group_of_id = np.searchsorted(index.group_starts, ids, 'right') - 1
+    group_sizes = np.diff(np.append(index.group_starts, index.n_rows))
+    tables      = []
+    for nn in (np.unique(file_of_id) if len(ids) else [0]):
+        ff           = index.files[nn]
+        parquet_file = pq.ParquetFile(os.path.join(path, ff) if ff else path)
+        file_cols    = [col for col in parquet_file.schema_arrow.names if columns is None or col in columns]
+        if len(ids):
+            # read the row groups holding the rows, then take the rows by their position within those row groups
+            file_groups = group_of_id[file_of_id == nn]
+            groups      = np.unique(file_groups)
+            table       = parquet_file.read_row_groups((groups - index.file_groups[nn]).tolist(), columns=file_cols)
+            read_starts = np.cumsum(group_sizes[groups]) - group_sizes[groups]
+            positions   = ids[file_of_id == nn] - index.group_starts[file_groups] + read_starts[np.searchsorted(groups, file_groups)]
+            table       = table.take(pa.array(positions, type=pa.int64()))
+        else:
+            table = parquet_file.schema_arrow.empty_table().select(file_cols)
+
+        for col, value in _partition_values(ff).items():
+            if columns is None or col in columns:
+                table = table.append_column(col, pa.array([value] * len(table), type=pa.string()))
+        tables.append(table)
+
+    return pa.concat_tables(tables).to_pandas()
+
+
+# Helpers
+def _snapshot_files(path: str) -> List[str]:
+    """The part-files of the current snapshot, relative to path, or [''] for a single file."""
+    if not os.path.isdir(path):
+        return ['']
+    manifest = read_manifest(path)
+    if manifest is None:
+        raise ValueError(f'{path} has no manifest; only single parquet files and partitioned datasets written by save_data can be indexed')
+    return manifest_files(manifest)
+
+
+def _source_stamp(path: str, files: List[str]) -> List[str]:
+    """Size and modification time of the files, to tell whether they changed since the index was built."""
+    stamps = []
+    for ff in files:
+        stat = os.stat(os.path.join(path, ff) if ff else path)
+        stamps.append(f"{stat.st_size}:{stat.st_mtime_ns}")
+    return stamps
+
+
+def _index_dir(path: str) -> str:
+    return os.path.join(path, INDEX_DIRNAME) if os.path.isdir(path) else str(path) + INDEX_SUFFIX
+
+
+def _read_meta(index_dir: str) -> Optional[Dict]:
+    if not os.path.exists(os.path.join(index_dir, META_FILENAME)):
+        return None
+    with open(os.path.join(index_dir, META_FILENAME), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _partition_values(part_file: str) -> Dict[str, str]:
+    """Partition values from the directories of a part-file, e.g. {'year': '2024'} for 'year=2024/part-0.parquet'."""
+    return dict(segment.split('=', 1) for segment in part_file.replace(os.sep, '/').split('/')[:-1] if '=' in segment)
+
+
+def _as_keys(values: np.ndarray) -> np.ndarray:
+    """Non-missing values of a column as a sortable numpy array: dates and timestamps as datetime64, numbers as float, else str."""
+    if len(values) and (isinstance(values[0], (pd.Timestamp, np.datetime64)) or hasattr(values[0], 'isoformat')):
+        return pd.to_datetime(values).to_numpy()
+    if len(values) and pd.api.types.is_number(values[0]) and not isinstance(values[0], bool):
+        try:
+            return values.astype(np.float64)
+        except (TypeError, ValueError):
+            pass                                        # mixed with text
+    return values.astype(str)
+
+
+def _as_key(value, dtype: np.dtype):
+    """value as a key of an index with dtype, or TypeError if it cannot be compared with such keys."""
+    if dtype.kind == 'M':
+        if isinstance(value, str) or not (isinstance(value, (pd.Timestamp, np.datetime64)) or hasattr(value, 'isoformat')):
+            raise TypeError(f'{value!r} is not a date')
+        return np.datetime64(pd.Timestamp(value), 'ns').astype(dtype)
+    if dtype.kind == 'f':
+        if isinstance(value, bool) or not pd.api.types.is_number(value):
+            raise TypeError(f'{value!r} is not a number')
+        return float(value)
+    if not isinstance(value, str):
+        raise TypeError(f'{value!r} is not a str')
+    return value
@@ -0,0 +1,247 @@
+import os
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, Union
+import pandas as pd
+from .filtering import apply_condition, compile_conditions, scan_columns
+from .partitioned_store import PartitionWriter, iter_partitions
+from .query_plan import is_row_local
+from .secondary_index import ROW_GROUP_SIZE, build_index
+
+# In streaming mode (DataProcessingOrchestrator(chunksize = ...)) a plan is executed chunk by chunk:
+#   - import_data yields chunks of at most chunksize rows
+#   - the row-local steps after it (see query_plan.is_row_local) run on every chunk
+#   - save_data writes every chunk as it passes
+#   - a groupby with combinable aggregations (see PARTIAL_AGGREGATIONS) only keeps partial aggregates per group
+# Whatever comes after that runs on the (aggregated) result as usual. Memory then depends on the chunksize and the
+# number of groups instead of the size of the input.
+STREAMING_FORMATS    = ['csv', 'tsv', 'parquet']
+# aggregation: (aggregations computed per chunk, how the partial results of the chunks are combined)
+PARTIAL_AGGREGATIONS = {
+    'sum':   (['sum'], ['sum']),
+    'prod':  (['prod'], ['prod']),
+    'count': (['count'], ['sum']),
+    'size':  (['size'], ['sum']),
+    'min':   (['min'], ['min']),
+    'max':   (['max'], ['max']),
+    'first': (['first'], ['first']),
+    'last':  (['last'], ['last']),
+    'mean':  (['sum', 'count'], ['sum', 'sum']),
+}
+
+
+def run_streaming(plan: List[Dict], chunksize: int, run_steps: Callable[[pd.DataFrame, List[Dict]], pd.DataFrame]) -> Tuple[Optional[pd.DataFrame], List[Dict]]:
+    """
+    Executes the streamable beginning of plan (see module comment).
+
+    Parameters
+    ----------
+    plan: List[Dict]
+        The (optimized) steps, as in method_registry. Only a plan starting with import_data is streamed.
+    chunksize: int
+        Number of rows per chunk.
+    run_steps: Callable
+        Runs a list of row-local steps on a chunk and returns the resulting chunk.
+
+    Returns
+    -------
+    Tuple[Optional[pd.DataFrame], List[Dict]]
+        The result so far and the steps that are left to execute on it. The result is None if the streamed part
+        ends the plan with save_data, i.e. if the data only needed to be written.
+    """
+    if not plan or _method(plan[0]) != 'import_data':
+        return None, plan
+
+    end = 1
+    while end < len(plan) and (is_row_local(plan[end]) or _method(plan[end]) == 'save_data'):
+        end += 1
+    steps, rest = plan[1:end], plan[end:]
+
+    aggregate = None
+    if rest and _method(rest[0]) == 'groupby' and is_combinable(_kwargs(rest[0])['aggregations']):
+        aggregate, rest = PartialAggregate(**_kwargs(rest[0])), rest[1:]
+    keep = aggregate is None and (rest or not steps or _method(steps[-1]) != 'save_data')
+
+    # the steps in between two save_data run as one segment
+    segments, writers = [[]], []
+    for step in steps:
+        if _method(step) == 'save_data':
+            writers.append(ChunkWriter(**_kwargs(step)))
+            segments.append([])
+        else:
+            segments[-1].append(step)
+
+    kept = []
+    for chunk in iter_chunks(chunksize = chunksize, **_kwargs(plan[0])):
+        for segment, writer in zip(segments, writers + [None]):
+            chunk = run_steps(chunk, segment) if segment else chunk
+            if writer is not None:
+                writer.write(chunk)
+        if aggregate is not None:
+            aggregate.update(chunk)
+        elif keep:
+            kept.append(chunk)
+    for writer in writers:
+        writer.close()
+
+    if aggregate is not None:
+        return aggregate.result(), rest
+    if keep:
+        # a filter on a chunk numbers its rows from 0, as it does on the whole data: number them across the chunks
+        return pd.concat(kept, ignore_index=True) if kept else pd.DataFrame(), rest
+    return None, rest
+
+
+def iter_chunks(filename: str, directory: Union[str, os.PathLike], chunksize: int, dtype_dict: Optional[Dict] = None, separator: str = ",",
+                colnames_row: int = 0, encoding: str = 'utf_8', columns: Optional[List[str]] = None,
+                filters: Optional[List[Tuple[str, any, str]]] = None) -> Iterator[pd.DataFrame]:
+    """
+    Reads a datafile as import_data does, in chunks of at most chunksize rows. The rows are numbered across the
+    chunks, as if the file was read at once.
+    Note that the dtypes of a .csv are inferred per chunk: give dtype_dict for columns whose values could be read
+    differently in different chunks, e.g. codes with leading zeros next to text.
+    """
+    filepath  = os.path.join(directory, filename)
+    extension = filename.split(".", 1)[1]
+    if extension in ('shp', 'xlsx', 'feather'):
+        raise ValueError(f'{extension} cannot be read in chunks. Please provide one of the following extensions: {STREAMING_FORMATS}')
+
+    offset     = 0
+    pass_rates = compile_conditions(filters).initial_pass_rates() if filters else None     # learned over the chunks
+    # the filtered columns are read as well, and only dropped after filtering
+    for chunk in _read_chunks(filepath, extension, chunksize, dtype_dict, separator, colnames_row, encoding, scan_columns(columns, filters), filters):
+        if filters:
+            chunk = chunk[apply_condition(chunk, filters, pass_rates = pass_rates)]
+        if columns is not None:
+            chunk = chunk[[col for col in chunk.columns if col in columns]]
+        chunk.index = pd.RangeIndex(offset, offset + len(chunk))
+        offset     += len(chunk)
+        yield chunk
+
+
+def is_combinable(aggregations: Dict[str, any]) -> bool:
+    """Whether all aggregations can be computed from partial aggregates of chunks (see PARTIAL_AGGREGATIONS)."""
+    return all(isinstance(func, str) and func in PARTIAL_AGGREGATIONS for funcs in aggregations.values() for func in _as_list(funcs))
+
+
+class PartialAggregate:
+    """
+    A groupby over a stream of chunks: every chunk is aggregated on its own, and the partial results are combined
+    with those of the previous chunks, such that only one row per group is kept. The result equals
+    df.groupby(groupby_columns).agg(aggregations) over all chunks (up to rounding for 'mean').
+    """
+    def __init__(self, groupby_columns: List[str], aggregations: Dict[str, any]):
+        self.groupby_columns = groupby_columns
+        self.aggregations    = aggregations
+        self.partial         = None
+        self.empty           = None
+
+    def update(self, chunk: pd.DataFrame):
+        """Adds the aggregates of chunk."""
+        if chunk.empty:
+            self.empty = chunk
+            return
+        partial_funcs = {col: list(dict.fromkeys(pf for func in _as_list(funcs) for pf in PARTIAL_AGGREGATIONS[func][0]))
+                         for col, funcs in self.aggregations.items()}
+        partial = chunk.groupby(self.groupby_columns).agg(partial_funcs)
+        if self.partial is not None:
+            combine_funcs = {(col, pf): combine for col, funcs in self.aggregations.items() for func in _as_list(funcs)
+                             for pf, combine in zip(*PARTIAL_AGGREGATIONS[func])}
+            partial = pd.concat([self.partial, partial]).groupby(level=list(range(partial.index.nlevels))).agg(combine_funcs)
+        self.partial = partial
+
+    def result(self) -> pd.DataFrame:
+        """The aggregates over all chunks so far, as the groupby over the whole data would return them."""
+        if self.partial is None:
+            return (self.empty if self.empty is not None else pd.DataFrame(columns=list(self.aggregations))).groupby(self.groupby_columns).agg(self.aggregations)
+
+        columns = {}
+        for col, funcs in self.aggregations.items():
+            for func in _as_list(funcs):
+                if func == 'mean':
+                    columns[(col, func)] = self.partial[(col, 'sum')] / self.partial[(col, 'count')]
+                else:
+                    columns[(col, func)] = self.partial[(col, func)]
+        result = pd.DataFrame(columns, index=self.partial.index)
+        if not any(isinstance(funcs, (list, tuple)) for funcs in self.aggregations.values()):
+            result.columns = [col for col, _ in result.columns]
+        return result
+
+
+class ChunkWriter:
+    """
+    Writes chunks one after another into a single datafile, as save_data does. The file is written next to its
+    destination and only moved there by close, so an interrupted stream never leaves half a file behind.
+    """
+    def __init__(self, filename: str, directory: str, partition_by: Optional[Union[str, List[str]]] = None, mode: str = 'overwrite',
+                 index_by: Optional[List[str]] = None):
+        self.extension = filename.split(".", 1)[1]
+        if self.extension not in STREAMING_FORMATS:
+            raise ValueError(f'{self.extension} cannot be written in chunks. Please provide one of the following extensions: {STREAMING_FORMATS}')
+        if partition_by is not None and self.extension != 'parquet':
+            raise ValueError(f'partitioning is not supported for {self.extension}. Please save as parquet to use partition_by')
+        if index_by is not None and self.extension != 'parquet':
+            raise ValueError(f'indexing is not supported for {self.extension}. Please save as parquet to use index_by')
+
+        self.path      = os.path.join(directory, filename)
+        self.temp_path = self.path + ".tmp"
+        self.writer    = None
+        self.n_written = 0
+        self.index_by  = index_by
+        # the chunks are not clustered by index_by, only indexed once written
+        self.row_group_size = ROW_GROUP_SIZE if index_by is not None else None
+        if partition_by is not None:
+            self.writer = PartitionWriter(self.path, [partition_by] if isinstance(partition_by, str) else partition_by, mode=mode,
+                                          row_group_size=self.row_group_size)
+
+    def write(self, chunk: pd.DataFrame):
+        if isinstance(self.writer, PartitionWriter):
+            self.writer.write(chunk)
+        elif self.extension == 'parquet':
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            if self.writer is None:
+                table       = pa.Table.from_pandas(chunk, preserve_index=False)
+                self.writer = pq.ParquetWriter(self.temp_path, table.schema)
+            else:
+                table = pa.Table.from_pandas(chunk, schema=self.writer.schema, preserve_index=False)
+            self.writer.write_table(table, row_group_size=self.row_group_size)
+        else:
+            chunk.to_csv(self.temp_path, sep = ',' if self.extension == 'csv' else '\t', index = False,
+                         mode = 'w' if self.n_written == 0 else 'a', header = self.n_written == 0)
+        self.n_written += 1
+
+    def close(self):
+        if isinstance(self.writer, PartitionWriter):
+            self.writer.close()
+        else:
+            if self.writer is not None:
+                self.writer.close()
+            if self.n_written:
+                os.replace(self.temp_path, self.path)
+        if self.index_by is not None and self.n_written:
+            build_index(self.path, self.index_by)
+
+
+# Helpers
+def _read_chunks(filepath: str, extension: str, chunksize: int, dtype_dict: Optional[Dict], separator: str, colnames_row: int, encoding: str,
+                 columns: Optional[List[str]], filters: Optional[List[Tuple[str, any, str]]]) -> Iterator[pd.DataFrame]:
+    if extension == 'parquet':
+        for chunk in iter_partitions(filepath, chunksize, columns = columns, filters = filters):
+            yield chunk.astype(dtype_dict) if dtype_dict is not None else chunk
+        return
+
+    usecols = (lambda col: col in columns) if columns is not None else None
+    with pd.read_csv(filepath, dtype=dtype_dict, sep=separator, header=colnames_row, encoding=encoding, na_values=['NaN', 'NULL', 'N/A'],
+                     usecols=usecols, chunksize=chunksize) as reader:
+        yield from reader
+
+
+def _method(step: Dict) -> str:
+    return next(iter(step))
+
+
+def _kwargs(step: Dict) -> Dict:
+    return next(iter(step.values()))
+
+
+def _as_list(value) -> list:
+    return list(value) if isinstance(value, (list, tuple)) else [value]
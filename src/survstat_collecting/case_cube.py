@@ -0,0 +1,234 @@
+import json
+import os
+from datetime import date
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+import numpy as np
+import pandas as pd
+from utils.germany_harm import germany_lookup
+
+# number of slots on the week axis; week 53 only exists in some ISO years (see CaseCube.valid)
+N_WEEKS = 53
+
+
+class CaseCube:
+    """
+    The cases of one disease as a dense (year, week, county) array, i.e. the preprocessed data in its natural wide form.
+    The county axis follows the kreis_token of harmfile_germany.tsv (zero-padded, as kz_kreis), followed by any other
+    kz_kreis in the data such as 'Unknown'. The week axis holds ISO weeks 1-53; week 53 of years without it is 0 and
+    masked out by valid. Aggregations are reductions over the array instead of groupbys over the long table.
+
+    Parameters
+    ----------
+    cases: np.ndarray
+        Array of shape (n_years, 53, n_counties).
+    years: List[int]
+        The years along the first axis.
+    counties: List[str]
+        The kz_kreis along the last axis.
+    name: str, optional
+        The name of the disease.
+
+    Examples
+    --------
+    >>> cube = CaseCube.from_preprocessed('measles', directories_dict['dir_data_preprocessed'])
+    >>> cube.by_bundesland().by_year()
+    >>> cube.sel(years=range(2015, 2025), counties=['09162']).rolling_sum(4)
+    >>> cube.save(directories_dict['dir_data_preprocessed'] / 'measles' / 'measles.cube')
+    >>> cube = CaseCube.load(directories_dict['dir_data_preprocessed'] / 'measles' / 'measles.cube')
+
+    See also:
+    ---------
+    preprocess_survstat_data
+    """
+    def __init__(self, cases: np.ndarray, years: List[int], counties: List[str], name: Optional[str] = "unnamed"):
+        self.cases     = cases
+        self.years     = np.asarray(years, dtype=np.int64)
+        self.counties  = np.asarray(counties, dtype=str)
+        self.name      = name
+
+        if self.cases.shape != (len(self.years), N_WEEKS, len(self.counties)):
+            raise ValueError(f'cases with shape {self.cases.shape} does not match (years, weeks, counties) = {(len(self.years), N_WEEKS, len(self.counties))}')
+
+    def __repr__(self):
+        return f'CaseCube: {self.name}\nYears: {self.years.min()}–{self.years.max()}\nCounties: {len(self.counties)}\nTotal cases: {self.cases.sum()}'
+
+    @classmethod
+    def from_dataframe(cls, df: pd.DataFrame, name: Optional[str] = "unnamed", counties: Optional[List[str]] = None) -> 'CaseCube':
+        """
+        Builds the cube from the long table with columns week, kz_kreis, cases and year, as in the preprocessed data.
+        By default the county axis consists of all kreis_token of the harmfile, followed by other kz_kreis in df.
+        """
+        year_codes, year_labels = pd.factorize(df['year'], sort=True)
+        kz_codes, kz_labels     = pd.factorize(df['kz_kreis'])
+        kz_labels               = [str(kz) for kz in kz_labels]
+        if counties is None:
+            counties = harmfile_counties()
+            counties = counties + sorted(set(kz_labels) - set(counties))
+
+        # map the (few) distinct labels onto the axes, then index all rows at once
+        years      = np.array([int(yy) for yy in year_labels])
+        week_index = df['week'].to_numpy().astype(np.int64) - 1
+        positions  = {cc: ii for ii, cc in enumerate(counties)}
+        missing    = [kz for kz in kz_labels if kz not in positions]
+        if missing:
+            raise ValueError(f'kz_kreis {sorted(missing)} not in counties')
+        county_idx = np.array([positions[kz] for kz in kz_labels], dtype=np.int64)[kz_codes]
+
+        cases = np.zeros((len(years), N_WEEKS, len(counties)), dtype=np.int32)
+        np.add.at(cases, (year_codes, week_index, county_idx), df['cases'].to_numpy().astype(np.int32))
+        return cls(cases, years, counties, name=name)
+
+    @classmethod
+    def from_preprocessed(cls, bug: str, processed_data_dir: Union[str, Path]) -> 'CaseCube':
+        """Builds the cube from the preprocessed dataset of bug (see import_preprocessed_data)."""
+        from survstat_collecting.casedata_processing import import_preprocessed_data
+        return cls.from_dataframe(import_preprocessed_data(bug, processed_data_dir).df, name=bug)
+
+# Axes
+    @property
+    def weeks(self) -> np.ndarray:
+        return np.arange(1, N_WEEKS + 1)
+
+    @property
+    def valid(self) -> np.ndarray:
+        """Boolean (year, week) mask of the ISO weeks that exist, i.e. False for week 53 of years with 52 weeks."""
+        return self.weeks[None, :] <= np.array([iso_weeks_in_year(yy) for yy in self.years])[:, None]
+
+    @property
+    def dates(self) -> np.ndarray:
+        """(year, week) array with the Monday of each ISO week as datetime64[D]; NaT for weeks that do not exist."""
+        dates = np.full((len(self.years), N_WEEKS), np.datetime64('NaT'), dtype='datetime64[D]')
+        for ii, yy in enumerate(self.years):
+            n_weeks = iso_weeks_in_year(yy)
+            dates[ii, :n_weeks] = np.datetime64(date.fromisocalendar(int(yy), 1, 1)) + 7 * np.arange(n_weeks)
+        return dates
+
+# Slicing
+    def sel(self, years: Optional[Union[List[int], range, int]] = None, counties: Optional[Union[List[str], str]] = None) -> 'CaseCube':
+        """
+        Selects years and/or counties. A consecutive range of years is a view on the same data, other selections copy.
+        """
+        cases, sel_years, sel_counties = self.cases, self.years, self.counties
+
+        if years is not None:
+            years      = [years] if isinstance(years, int) else [int(yy) for yy in years]
+            year_index = self._positions(self.years, years, 'years')
+            if len(year_index) and np.array_equal(year_index, np.arange(year_index[0], year_index[0] + len(year_index))):
+                year_index = slice(year_index[0], year_index[0] + len(year_index))
+            cases, sel_years = cases[year_index], sel_years[year_index]
+
+        if counties is not None:
+            counties     = [counties] if isinstance(counties, str) else list(counties)
+            county_index = self._positions(self.counties, counties, 'counties')
+            cases, sel_counties = cases[:, :, county_index], sel_counties[county_index]
+
+        return CaseCube(cases, sel_years, sel_counties, name=self.name)
+
+    def timeline(self) -> pd.DataFrame:
+        """The existing weeks of all years one after another: a (week, county) frame indexed by the ISO-week dates."""
+        valid = self.valid
+        return pd.DataFrame(self.cases[valid], index=pd.DatetimeIndex(self.dates[valid], name='timestamp'), columns=self.counties)
+
+# Aggregation
+    def aggregate(self, mapping: Dict[str, str], name: Optional[str] = None) -> 'CaseCube':
+        """
+        Sums counties into groups, e.g. Bundeslaender. mapping maps each kz_kreis onto its group; counties that are
+        not in mapping are summed into 'Unknown'.
+        """
+        groups     = [mapping.get(cc, 'Unknown') for cc in self.counties]
+        labels     = list(dict.fromkeys(groups))
+        membership = np.zeros((len(self.counties), len(labels)), dtype=self.cases.dtype)
+        membership[np.arange(len(groups)), [labels.index(gg) for gg in groups]] = 1
+        return CaseCube(self.cases @ membership, self.years, labels, name=name or self.name)
+
+    def by_bundesland(self) -> 'CaseCube':
+        """Sums the counties per Bundesland (bundesland_name_de of the harmfile)."""
+        lookup  = germany_lookup()
+        mapping = dict(zip(lookup.kreis_token.tolist(), lookup.bundesland_name_de.tolist()))
+        return self.aggregate(mapping)
+
+    def by_year(self) -> pd.DataFrame:
+        """Total cases per year (rows) and county (columns)."""
+        return pd.DataFrame(self.cases.sum(axis=1), index=pd.Index(self.years, name='year'), columns=self.counties)
+
+    def by_week(self) -> pd.DataFrame:
+        """Total cases per year (rows) and ISO week (columns), summed over all counties."""
+        return pd.DataFrame(self.cases.sum(axis=2), index=pd.Index(self.years, name='year'), columns=pd.Index(self.weeks, name='week'))
+
+    def rolling_sum(self, window: int) -> pd.DataFrame:
+        """
+        Sum over the last window weeks, per county, along the timeline (i.e. across the turn of the year).
+        The first window-1 weeks have no complete window and are NaN.
+        """
+        timeline = self.timeline()
+        cumsum   = np.cumsum(np.vstack([np.zeros((1, timeline.shape[1]), dtype=np.int64), timeline.to_numpy(dtype=np.int64)]), axis=0)
+        rolling  = np.full(timeline.shape, np.nan)
+        rolling[window - 1:] = cumsum[window:] - cumsum[:-window]
+        return pd.DataFrame(rolling, index=timeline.index, columns=timeline.columns)
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """
+        Back to the long table with columns week, kz_kreis, cases, year and timestamp, for all existing weeks of the
+        years in the cube (weeks without any data are 0 in the cube, so e.g. the rest of the current year is included).
+        """
+        year_index, week_index = np.nonzero(self.valid)
+        n_counties = len(self.counties)
+        return pd.DataFrame({
+            'week':      np.repeat(week_index + 1, n_counties),
+            'kz_kreis':  np.tile(self.counties, len(year_index)),
+            'cases':     self.cases[year_index, week_index].ravel(),
+            'year':      np.repeat(self.years[year_index].astype(str), n_counties),
+            'timestamp': np.repeat(self.dates[year_index, week_index], n_counties),
+        })
+
+# Persistence
+    def save(self, directory: Union[str, Path]) -> 'CaseCube':
+        """
+        Saves the cube into directory as cases.npy and axes.json. The array is written to a temporary file first,
+        the axes last, such that a half-written cube is never picked up.
+        """
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        temp_path = directory / "cases.npy.tmp"
+        with open(temp_path, 'wb') as f:
+            np.save(f, np.ascontiguousarray(self.cases))
+        os.replace(temp_path, directory / "cases.npy")
+
+        axes = {'name': self.name, 'years': self.years.tolist(), 'counties': self.counties.tolist()}
+        with open(directory / "axes.json.tmp", "w", encoding="utf-8") as f:
+            json.dump(axes, f)
+        os.replace(directory / "axes.json.tmp", directory / "axes.json")
+        return self
+
+    @classmethod
+    def load(cls, directory: Union[str, Path], mmap_mode: Optional[str] = 'r') -> 'CaseCube':
+        """
+        Loads a cube saved with save. By default the array is memory-mapped read-only, so only the slices that are
+        used are read from disk. Use mmap_mode=None to read it into memory.
+        """
+        directory = Path(directory)
+        with open(directory / "axes.json", "r", encoding="utf-8") as f:
+            axes = json.load(f)
+        cases = np.load(directory / "cases.npy", mmap_mode=mmap_mode)
+        return cls(cases, axes['years'], axes['counties'], name=axes['name'])
+
+# Helpers - self
+    @staticmethod
+    def _positions(axis: np.ndarray, labels: list, axis_name: str) -> np.ndarray:
+        index   = {label: ii for ii, label in enumerate(axis.tolist())}
+        missing = [label for label in labels if label not in index]
+        if missing:
+            raise ValueError(f'{missing} not in {axis_name} of the cube')
+        return np.array([index[label] for label in labels], dtype=np.int64)
+
+
+# Helpers - nonself
+def harmfile_counties() -> List[str]:
+    """The kreis_token of harmfile_germany.tsv as kz_kreis, i.e. zero-padded to five digits."""
+    return list(dict.fromkeys(germany_lookup().kreis_token.tolist()))
+
+
+def iso_weeks_in_year(year: int) -> int:
+    """Number of ISO weeks (52 or 53) in year; 28 December always lies in the last week."""
+    return date(int(year), 12, 28).isocalendar()[1]
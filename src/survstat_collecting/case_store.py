@@ -0,0 +1,140 @@
+import json
+import os
+from datetime import date
+from pathlib import Path
+from typing import List, Optional, Tuple, Union
+import numpy as np
+import pandas as pd
+from .case_cube import CaseCube, N_WEEKS, harmfile_counties
+
+
+class CaseStore:
+    """
+    The cases of several diseases in one memory-mapped (disease, year, week, county) array on disk, with shared
+    year and county axes (see CaseCube). Opening the store reads nothing but the axes; cube and timeline return
+    views on the mapped file, so only the disease, years and counties that are used are ever read from disk.
+
+    A CaseStore is shared with worker processes by its path: pickling it only sends the path, and every process
+    maps the same file (the OS page cache is shared), instead of copying the data into each process.
+
+    Parameters
+    ----------
+    path: Union[str, Path]
+        Directory of the store, as written by CaseStore.build.
+    mmap_mode: str, optional
+        Mode in which cases.npy is mapped. By default read-only.
+
+    Examples
+    --------
+    >>> store = CaseStore.build(directories_dict['dir_data_preprocessed'] / 'case_store', bugs=read_log().values(),
+    >>>                         processed_data_dir=directories_dict['dir_data_preprocessed'])
+    >>> store = CaseStore(directories_dict['dir_data_preprocessed'] / 'case_store')
+    >>> store.cube('measles', years=range(2015, 2025)).by_bundesland()
+    >>> store.timeline('rsv', start='2024-10-01', end='2025-03-31', counties=['09162', '11000'])
+    """
+    def __init__(self, path: Union[str, Path], mmap_mode: Optional[str] = 'r'):
+        self.path      = Path(path)
+        self.mmap_mode = mmap_mode
+
+        with open(self.path / "axes.json", "r", encoding="utf-8") as f:
+            axes = json.load(f)
+        self.diseases = axes['diseases']
+        self.years    = np.asarray(axes['years'], dtype=np.int64)
+        self.counties = np.asarray(axes['counties'], dtype=str)
+        self.cases    = np.load(self.path / "cases.npy", mmap_mode=mmap_mode)
+
+    def __reduce__(self):
+        # reopen from the path in the receiving process, instead of pickling the data
+        return (CaseStore, (str(self.path), self.mmap_mode))
+
+    def __repr__(self):
+        return f'CaseStore: {self.path}\nDiseases: {", ".join(self.diseases)}\nYears: {self.years.min()}–{self.years.max()}\nCounties: {len(self.counties)}'
+
+    @classmethod
+    def build(cls, path: Union[str, Path], bugs: List[str], processed_data_dir: Union[str, Path]) -> 'CaseStore':
+        """
+        Builds the store at path from the preprocessed datasets of bugs, one disease at a time, and returns it opened.
+        Diseases without preprocessed data are skipped. The axes are taken from the year partitions and the kz_kreis
+        column of the datasets (see _dataset_axes), so only one disease is held in memory at a time while filling the array.
+        The array is written next to the old store and swapped in, the axes last, such that readers never see a half-written store.
+        """
+        from .casedata_processing import import_preprocessed_data, migrate_csv_data
+
+        path     = Path(path)
+        bugs     = [bug for bug in dict.fromkeys(bugs) if os.path.exists(os.path.join(str(processed_data_dir), bug, f"{bug}.parquet"))
+                    or os.path.exists(os.path.join(str(processed_data_dir), bug, f"{bug}.csv"))]
+        if not bugs:
+            raise ValueError(f"No preprocessed data found in {processed_data_dir}")
+        migrate_csv_data(processed_data_dir, bugs=[bug for bug in bugs if not os.path.exists(os.path.join(str(processed_data_dir), bug, f"{bug}.parquet"))])
+
+        axes     = [_dataset_axes(bug, processed_data_dir) for bug in bugs]
+        years    = sorted({yy for bug_years, _ in axes for yy in bug_years})
+        counties = harmfile_counties()
+        counties = counties + sorted({kz for _, bug_counties in axes for kz in bug_counties} - set(counties))
+
+        path.mkdir(parents=True, exist_ok=True)
+        temp_path = path / "cases.npy.tmp"
+        cases     = np.lib.format.open_memmap(temp_path, mode='w+', dtype=np.int32, shape=(len(bugs), len(years), N_WEEKS, len(counties)))
+        for ii, bug in enumerate(bugs):
+            cube = CaseCube.from_dataframe(import_preprocessed_data(bug, processed_data_dir).df, name=bug, counties=counties)
+            cases[ii, np.searchsorted(years, cube.years)] = cube.cases
+        cases.flush()
+        del cases
+        os.replace(temp_path, path / "cases.npy")
+
+        with open(path / "axes.json.tmp", "w", encoding="utf-8") as f:
+            json.dump({'diseases': bugs, 'years': years, 'counties': counties}, f)
+        os.replace(path / "axes.json.tmp", path / "axes.json")
+        print(f"✅ case store with {len(bugs)} diseases saved: {path}")
+        return cls(path)
+
+    def cube(self, bug: str, years: Optional[Union[List[int], range, int]] = None, counties: Optional[Union[List[str], str]] = None) -> CaseCube:
+        """
+        The CaseCube of bug, as a view on the store. A consecutive range of years stays a view; a selection of
+        counties only reads those counties.
+        """
+        if bug not in self.diseases:
+            raise ValueError(f"Invalid value for bug: {bug}. Please choose from {self.diseases}")
+        cube = CaseCube(self.cases[self.diseases.index(bug)], self.years, self.counties, name=bug)
+        if years is None and counties is None:
+            return cube
+        return cube.sel(years=years, counties=counties)
+
+    def timeline(self, bug: str, start: Optional[Union[str, date]] = None, end: Optional[Union[str, date]] = None,
+                 counties: Optional[Union[List[str], str]] = None) -> pd.DataFrame:
+        """Weekly cases of bug per county between start and end (inclusive, by ISO-week Monday); only the years in between are read."""
+        start = pd.Timestamp(start) if start is not None else None
+        end   = pd.Timestamp(end) if end is not None else None
+        # ISO years can start in the previous calendar year and end in the next
+        first = self.years.min() if start is None else max(self.years.min(), start.year)
+        last  = self.years.max() if end is None else min(self.years.max(), end.year + 1)
+        years = [yy for yy in range(first, last + 1) if yy in set(self.years.tolist())]
+
+        timeline = self.cube(bug, years=years, counties=counties).timeline()
+        if start is not None:
+            timeline = timeline[timeline.index >= start]
+        if end is not None:
+            timeline = timeline[timeline.index <= end]
+        return timeline
+
+
+# Helpers
+def _dataset_axes(bug: str, processed_data_dir: Union[str, Path]) -> Tuple[List[int], List[str]]:
+    """
+    The years and kz_kreis of the preprocessed dataset of bug, without reading its cases: the years are those of
+    its year partitions (as listed in the manifest), and only the kz_kreis column is read.
+    """
+    from dataprocessor import DataProcessingOrchestrator
+    from dataprocessor.partitioned_store import read_manifest
+
+    processed_datafolder = os.path.join(str(processed_data_dir), bug)
+    manifest = read_manifest(os.path.join(processed_datafolder, f"{bug}.parquet"))
+    from_partitions = manifest is not None and manifest['partition_cols'] == ['year']
+    df = DataProcessingOrchestrator(name=bug).import_data(filename = f"{bug}.parquet", directory = processed_datafolder,
+                                                          columns = ['kz_kreis'] if from_partitions else ['kz_kreis', 'year']).df
+
+    if from_partitions:
+        years = [int(partition.split('=', 1)[1]) for partition, files in manifest['partitions'].items() if files]
+    else:
+        years = [int(yy) for yy in df['year'].unique()]
+    return years, [str(kz) for kz in df['kz_kreis'].unique()]
@@ -1,18 +1,28 @@
 from utils.dirs import directories_dict
-from utils.mappings import map_countynames_germany_eng_de, map_countynames_tokens_germany
+from utils import mappings
 from dataprocessor import DataProcessingOrchestrator
+from survstat_collecting.raw_matrix import read_raw_matrix
 from tqdm import tqdm
 import os
 import pandas as pd
-from typing import Optional, Union, List
+import numpy as np
+from functools import lru_cache
+from typing import Optional, Union, List, Tuple, Dict
 from pathlib import Path
 import warnings
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# columns of the preprocessed data, in order
+STORAGE_COLUMNS = ['week', 'kz_kreis', 'cases', 'year', 'timestamp']
+# columns over which the preprocessed data is indexed, e.g. for the time series of one county (see save_data)
+INDEX_COLUMNS   = ['kz_kreis', 'year', 'timestamp']
 
 def preprocess_survstat_data(bugs:  Union[List[str], str], 
-                             years: Union[List[str], range, str],
+                             years: Union[List[str], range, str, Dict[str, List[str]]],
                              raw_data_dir: Union[str, Path],
                              processed_data_dir: Union[str, Path],
-                             how: str
+                             how: str,
+                             n_workers: Optional[int] = 1
                              ):
     """
     Processes downloaded survstat data. Each yearly dataset for the specific disease is merged into one dataset.
@@ -21,14 +31,17 @@ def preprocess_survstat_data(bugs:  Union[List[str], str],
     ----------
     bugs: Union[list[str], str]
         List of diseases to process.
-    years: Union[list[int], range, str]
-        List of years to process.
+    years: Union[list[int], range, str, Dict[str, list[str]]]
+        List of years to process, or a dict with the years to process per bug, e.g. those of an update.
     raw_data_dir: str or Path
         Directory containing raw yearly data files.
     processed_data_dir: str or Path
         Directory where processed data will be saved.
     how: str
-        Processing mode: 'reconstruct' (start fresh) or 'update' (append to existing).
+        Processing mode: 'reconstruct' (start fresh) or 'update' (only replace the given years in the existing dataset).
+    n_workers: int, optional
+        Number of worker processes. With more than one, all (bug, year) files are preprocessed in parallel
+        and each bug is merged and saved as soon as all its years are done. None uses all cores.
 
     Example:
     -------
@@ -36,7 +49,8 @@ def preprocess_survstat_data(bugs:  Union[List[str], str],
     >>>                          years = all_years,
     >>>                          raw_data_dir=directories_dict['dir_data_raw'], 
     >>>                          processed_data_dir=directories_dict['dir_data_preprocessed'],
-    >>>                          how='reconstruct')
+    >>>                          how='reconstruct',
+    >>>                          n_workers=None)
 
     See also:
     ---------
@@ -50,69 +64,171 @@ def preprocess_survstat_data(bugs:  Union[List[str], str],
     if isinstance(years, (str, int)):
         years = [str(years)]
 
-    if isinstance(years, (range, list)):
-        years = [str(yy) for yy in years]
+    if isinstance(years, dict):
+        years_per_bug = {bug: [str(yy) for yy in years[bug]] for bug in bugs}
+    else:
+        years_per_bug = {bug: [str(yy) for yy in years] for bug in bugs}
+
+    if how not in ['reconstruct', 'update']:
+        raise ValueError(f"Invalid value for 'how': {how}. Please choose from ['reconstruct', 'update'].")
+
+    n_workers = min(n_workers or os.cpu_count() or 1, sum(len(bug_years) for bug_years in years_per_bug.values()))
+
+    if n_workers <= 1:
+        for bug, bug_years in years_per_bug.items():
+            frames = [preprocess_raw_yearfile(raw_data_dir, bug, year) for year in tqdm(bug_years, desc=f"processing {bug}")]
+            merge_yearfiles(bug, bug_years, frames, processed_data_dir, how)
+
+    else:
+        with ProcessPoolExecutor(max_workers=n_workers) as pool:
+            futures = {pool.submit(preprocess_raw_yearfile, raw_data_dir, bug, year): (bug, year)
+                       for bug, bug_years in years_per_bug.items() for year in bug_years}
+            done    = {bug: {} for bug in bugs}
+            for future in tqdm(as_completed(futures), total=len(futures), desc=f"processing with {n_workers} workers"):
+                bug, year = futures[future]
+                done[bug][year] = future.result()
+                if len(done[bug]) == len(years_per_bug[bug]):
+                    # all years of this bug are in: merge and save it, and free its frames
+                    merge_yearfiles(bug, years_per_bug[bug], [done[bug][yy] for yy in years_per_bug[bug]], processed_data_dir, how)
+                    del done[bug]
 
-    for bug in bugs:
-        raw_datafolder      = os.path.join(str(raw_data_dir), bug)
-        processed_datafolder= os.path.join(str(processed_data_dir), bug)
-        
-        # Initialize merged_dataset based on mode
-        if how == 'update':
-            years_int = [int(yy) for yy in years]
-            merged_dataset = DataProcessingOrchestrator().import_data(filename = f"{bug}.csv", directory = processed_datafolder).filter([('year',years_int,'!in')])
-
-        elif how == 'reconstruct':  # reconstruct mode
-            merged_dataset = DataProcessingOrchestrator(name = f"{bug}_merged")
-
-        else:
-            raise ValueError(f"Invalid value for 'how': {how}. Please choose from ['reconstruct', 'update'].")
-
-        for year in tqdm(years, desc=f"processing {bug}"):
-            filename = f"{bug}_{year}.csv"
-            yearfile = DataProcessingOrchestrator().import_data(filename = filename, directory = raw_datafolder, encoding= 'utf-16', separator="\t", colnames_row=1)
-            yearfile_preprocessed = preprocess_yearfile(yearfile, year)
-
-            # Concatenate data regardless of mode
-            if merged_dataset.status == 0:
-                # First iteration - use the preprocessed data directly
-                merged_dataset = yearfile_preprocessed
-            else:
-                # Subsequent iterations - concatenate with existing data
-                # Extract DataFrames from DataProcessingOrchestrator objects
-                existing_df = merged_dataset.df
-                new_df = yearfile_preprocessed.df
-                # Type assertion to help the type checker
-                if isinstance(existing_df, pd.DataFrame) and isinstance(new_df, pd.DataFrame):
-                    with warnings.catch_warnings():
-                        warnings.filterwarnings("ignore", category=FutureWarning, message=".*DataFrame concatenation with empty or all-NA entries.*")
-                        concatenated_df = pd.concat([existing_df, new_df], ignore_index=True)                                  
-                    
-                    merged_dataset = DataProcessingOrchestrator(concatenated_df, name=f"{bug}_merged")
-                else:
-                    raise TypeError("Expected pandas DataFrames for concatenation")
-
-        if merged_dataset.status and processed_datafolder is not None:
-            os.makedirs(processed_datafolder, exist_ok=True)
-            merged_dataset.save_data(filename = f"{bug}.csv", directory = processed_datafolder)
     print("✅ all data has been (pre)processed")
 
+def preprocess_raw_yearfile(raw_data_dir: Union[str, Path], bug: str, year: str) -> pd.DataFrame:
+    """
+    Reads and preprocesses the raw yearly file of bug, returning the long dataframe (see preprocess_yearfile).
+    The compact matrix written at ingest (see raw_matrix.py) is read if it is up to date, otherwise the text file.
+    As a module-level function it can be sent to worker processes.
+    """
+    raw_datafolder = os.path.join(str(raw_data_dir), bug)
+    matrix         = read_raw_matrix(os.path.join(raw_datafolder, f"{bug}_{year}.csv"))
+
+    if matrix is not None:
+        wide_df = pd.DataFrame(matrix['cases'], columns=matrix['counties'])
+        wide_df.insert(0, "Unnamed: 0", matrix['weeks'])
+        yearfile = DataProcessingOrchestrator(wide_df)
+    else:
+        yearfile = DataProcessingOrchestrator().import_data(filename = f"{bug}_{year}.csv", directory = raw_datafolder, encoding= 'utf-16', separator="\t", colnames_row=1)
+    return preprocess_yearfile(yearfile, year).df
+
+def merge_yearfiles(bug: str, years: List[str], frames: List[pd.DataFrame], processed_data_dir: Union[str, Path], how: str):
+    """
+    Merges the preprocessed yearly frames of bug into one dataset and saves it as <bug>.parquet, partitioned by year
+    and indexed over INDEX_COLUMNS. With how='update', only the partitions of the given years are replaced; the other
+    years are left untouched.
+    """
+    processed_datafolder = os.path.join(str(processed_data_dir), bug)
+
+    if how == 'update' and os.path.exists(os.path.join(processed_datafolder, f"{bug}.csv")):
+        migrate_csv_data(processed_data_dir, bugs=bug)
+
+    # concatenate once, instead of copying the growing merged frame for each year
+    if not frames:
+        return
+    with warnings.catch_warnings():
+        warnings.filterwarnings("ignore", category=FutureWarning, message=".*DataFrame concatenation with empty or all-NA entries.*")
+        merged_dataset = DataProcessingOrchestrator(to_storage_dtypes(pd.concat(frames, ignore_index=True)), name=f"{bug}_merged")
+
+    os.makedirs(processed_datafolder, exist_ok=True)
+    merged_dataset.save_data(filename = f"{bug}.parquet", directory = processed_datafolder, partition_by = 'year',
+                             mode = 'replace_partitions' if how == 'update' else 'overwrite', index_by = INDEX_COLUMNS)
+
+def import_preprocessed_data(bug: str, processed_data_dir: Union[str, Path], filters: Optional[List[Tuple[str, any, str]]] = None) -> DataProcessingOrchestrator:
+    """
+    Reads the preprocessed dataset of bug, with the dtypes of preprocess_yearfile (kz_kreis as categorical and cases as int32).
+    A dataset that is still stored as <bug>.csv is migrated to parquet first (see migrate_csv_data).
+    With filters, only the matching rows are read, e.g. only the partitions of the requested years, or through the
+    index only the row groups of the requested counties (see import_data).
+
+    Example:
+    -------
+    >>> measles = import_preprocessed_data('measles', directories_dict['dir_data_preprocessed'])
+    >>> measles_2024 = import_preprocessed_data('measles', directories_dict['dir_data_preprocessed'], filters=[('year', '2024', '==')])
+    >>> measles_munich = import_preprocessed_data('measles', directories_dict['dir_data_preprocessed'], filters=[('kz_kreis', '09162', '==')])
+    """
+    processed_datafolder = os.path.join(str(processed_data_dir), bug)
+    if not os.path.exists(os.path.join(processed_datafolder, f"{bug}.parquet")) and os.path.exists(os.path.join(processed_datafolder, f"{bug}.csv")):
+        migrate_csv_data(processed_data_dir, bugs=bug)
+
+    dataset    = DataProcessingOrchestrator(name=bug).import_data(filename = f"{bug}.parquet", directory = processed_datafolder, filters = filters)
+    # the year partitions are read back as the last column
+    dataset.df = dataset.df[STORAGE_COLUMNS]
+    return dataset
+
+def to_storage_dtypes(df: pd.DataFrame) -> pd.DataFrame:
+    """Compact dtypes in which the preprocessed data is stored: kz_kreis as categorical and cases as int32."""
+    return df.astype({'kz_kreis': 'category', 'cases': 'int32', 'year': 'str'})[STORAGE_COLUMNS]
+
+def migrate_csv_data(processed_data_dir: Union[str, Path], bugs: Optional[Union[List[str], str]] = None):
+    """
+    Converts preprocessed datasets stored as <bug>/<bug>.csv into <bug>/<bug>.parquet (partitioned by year) and
+    removes the csv. Leading zeros of kz_kreis and the timestamps as dates are restored while converting.
+    Rows that are in the csv more than once per (year, week, kz_kreis), as left by update runs while the '!in'-filter
+    did not negate, are dropped, keeping the most recently appended one. By default all bugs in processed_data_dir are migrated.
+
+    Example:
+    -------
+    >>> migrate_csv_data(directories_dict['dir_data_preprocessed'])
+    """
+    if bugs is None:
+        bugs = sorted(os.listdir(str(processed_data_dir)))
+    if not isinstance(bugs, list):
+        bugs = [bugs]
+
+    for bug in bugs:
+        processed_datafolder = os.path.join(str(processed_data_dir), bug)
+        if not os.path.exists(os.path.join(processed_datafolder, f"{bug}.csv")):
+            continue
+
+        dataset    = DataProcessingOrchestrator(name=bug).import_data(filename = f"{bug}.csv", directory = processed_datafolder, dtype_dict = {'kz_kreis': 'str', 'year': 'str'})
+        dataset.df['kz_kreis']  = dataset.df['kz_kreis'].str.zfill(5)
+        dataset.df['timestamp'] = pd.to_datetime(dataset.df['timestamp']).dt.date
+        dataset.df = dataset.df.drop_duplicates(subset=['year', 'week', 'kz_kreis'], keep='last')
+        dataset.df = to_storage_dtypes(dataset.df)
+        dataset.save_data(filename = f"{bug}.parquet", directory = processed_datafolder, partition_by = 'year', index_by = INDEX_COLUMNS)
+        os.remove(os.path.join(processed_datafolder, f"{bug}.csv"))
+        print(f"✅ {bug}.csv migrated to {bug}.parquet")
+
 def preprocess_yearfile(yearfile: DataProcessingOrchestrator, year: str) -> DataProcessingOrchestrator:
     """
     preprocesses a single yearfile which is properly returned.
+    The wide table (weeks x counties) is reshaped into a long table with plain array operations:
+    county names are mapped onto kz_kreis with one precomputed lookup (see county_token) and
+    timestamps are taken from a cached (year, week) table (see iso_week_dates).
     """
-    yearfile = (
-        yearfile
-        .rename_cols({"Unnamed: 0": 'week'})
-        .pivot_longer(index = 'week', levels_from= list(map_countynames_germany_eng_de.keys()).remove('City of Berlin'), value_colname= 'cases', levels_colname= "county")
-        .mutate(new_colname='year', value=year)
-        .change_dtype({'year': 'str'})
-        .impute(colnames = 'cases', method ='zero')
-        .replace(colname = "county", mapping_dict = map_countynames_germany_eng_de)
-        .replace(colname = "county", mapping_dict = map_countynames_tokens_germany)
-        .rename_cols({"county": 'kz_kreis'}) 
-        .mutate(new_colname = "kz_kreis",       operation = "lambda row: str(row['kz_kreis']).zfill(5)") 
-        )
-
-    yearfile.df['timestamp'] = pd.to_datetime(yearfile.df['year'].astype(str) + yearfile.df['week'].astype(str) + '1', format='%G%V%u').dt.date
+    df       = yearfile.df.rename(columns={"Unnamed: 0": 'week'})
+    counties = [col for col in df.columns if col != 'week']
+    weeks    = df['week'].to_numpy()
+    n_weeks  = len(weeks)
+
+    # pivot_longer: all weeks of the first county, then all weeks of the second county, and so on
+    long_df = pd.DataFrame({
+        'week':     np.tile(weeks, len(counties)),
+        'kz_kreis': np.repeat(np.array([county_token(cc) for cc in counties], dtype=object), n_weeks),
+        'cases':    df[counties].to_numpy().ravel(order='F'),
+    })
+    long_df['year']      = year
+    long_df              = long_df.astype({'kz_kreis': 'str', 'year': 'str'})
+    long_df['cases']     = long_df['cases'].fillna(0)
+    long_df['timestamp'] = np.tile(iso_week_dates(str(year), tuple(weeks.tolist())), len(counties))
+
+    yearfile.df = long_df
+    yearfile.register_step('preprocess_yearfile', {'year': year})
     return yearfile
+
+@lru_cache(maxsize=None)
+def county_token(county_name: str) -> str:
+    """
+    Maps a county name as used by SurvStat (English) onto its five-digit kz_kreis,
+    i.e. name_eng -> name_de -> kreis_token, zero-padded. Names without a match are kept as they are.
+    """
+    name_de = mappings.map_countynames_germany_eng_de.get(county_name, county_name)
+    return str(mappings.map_countynames_tokens_germany.get(name_de, name_de)).zfill(5)
+
+@lru_cache(maxsize=None)
+def iso_week_dates(year: str, weeks: tuple) -> np.ndarray:
+    """
+    Monday (as datetime.date) of each ISO week in weeks of the given ISO year.
+    """
+    isodates = pd.Series([f"{year}{week}1" for week in weeks])
+    return pd.to_datetime(isodates, format='%G%V%u').dt.date.to_numpy()
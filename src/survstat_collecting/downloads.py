@@ -0,0 +1,126 @@
+import threading
+import time
+import zipfile
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+# suffixes browsers use for downloads still in progress
+PARTIAL_SUFFIXES = ('.crdownload', '.part', '.tmp', '.download')
+
+
+def snapshot_downloads(downloads_path: Path) -> Dict[str, Tuple[int, int]]:
+    """
+    Records the survstat .zip files already present in downloads_path, by name with (size, mtime).
+    Pass the snapshot to wait_for_download, such that leftovers from earlier runs are never picked up.
+    """
+    return {ff.name: (ff.stat().st_size, ff.stat().st_mtime_ns)
+            for ff in Path(downloads_path).iterdir() if _is_survstat_zip(ff)}
+
+
+def wait_for_download(downloads_path: Path,
+                      known_files: Optional[Dict[str, Tuple[int, int]]] = None,
+                      expected_name: Optional[str] = None,
+                      timeout: float = 30,
+                      poll_interval: float = 0.25) -> Path:
+    """
+    Waits until a new survstat .zip has been completely downloaded into downloads_path and returns it.
+    A file counts as complete once no partial download (e.g. survstat.zip.crdownload) is left next to it
+    and it is a readable zip, i.e. its central directory has been written.
+
+    Changes in downloads_path are picked up through filesystem events (inotify on Linux) when the watchdog-library
+    is installed; otherwise the directory is polled every poll_interval seconds.
+
+    Parameters
+    ----------
+    downloads_path: Path
+        Directory the download is written into.
+    known_files: Dict[str, Tuple[int, int]], optional
+        Snapshot from snapshot_downloads taken before the download started. Files in here are ignored, unless they changed.
+    expected_name: str, optional
+        Exact name of the expected file. By default any new 'survstat*.zip' is accepted.
+    timeout: float
+        Number of seconds to wait before giving up.
+    poll_interval: float
+        Number of seconds between checks when no filesystem events are available.
+
+    Returns
+    -------
+    Path
+        The downloaded .zip
+
+    Examples
+    --------
+    >>> known = snapshot_downloads(downloads_path)
+    >>> download_button.click()
+    >>> latest_zip = wait_for_download(downloads_path, known_files=known)
+    """
+    downloads_path = Path(downloads_path)
+    known_files    = known_files or {}
+    changed        = threading.Event()
+    observer       = _watch(downloads_path, changed)
+    deadline       = time.monotonic() + timeout
+
+    try:
+        while True:
+            changed.clear()
+            completed = _completed_download(downloads_path, known_files, expected_name)
+            if completed is not None:
+                return completed
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise FileNotFoundError("No survstat ZIP file found after download")
+
+            # with events, wake up on the next change (still re-checking now and then); without, just poll
+            changed.wait(min(remaining, poll_interval if observer is None else 1.0))
+    finally:
+        if observer is not None:
+            observer.stop()
+            observer.join()
+
+
+def _completed_download(downloads_path: Path, known_files: Dict[str, Tuple[int, int]], expected_name: Optional[str]) -> Optional[Path]:
+    """Returns the newest completed download that is not in known_files, if any."""
+    candidates = []
+    for ff in downloads_path.iterdir():
+        if expected_name is not None and ff.name != expected_name:
+            continue
+        if expected_name is None and not _is_survstat_zip(ff):
+            continue
+        try:
+            stat = ff.stat()
+        except FileNotFoundError:
+            continue
+        if known_files.get(ff.name) == (stat.st_size, stat.st_mtime_ns):
+            continue
+        if any((downloads_path / (ff.name + suffix)).exists() for suffix in PARTIAL_SUFFIXES):
+            continue
+        if not zipfile.is_zipfile(ff):
+            continue
+        candidates.append((stat.st_mtime_ns, ff))
+
+    if candidates:
+        return max(candidates)[1]
+    return None
+
+
+def _is_survstat_zip(file: Path) -> bool:
+    return file.is_file() and file.name.lower().startswith("survstat") and file.suffix == ".zip"
+
+
+def _watch(downloads_path: Path, changed: threading.Event):
+    """Starts a watchdog observer that sets changed on every event in downloads_path. Returns None if watchdog is not installed."""
+    try:
+        from watchdog.observers import Observer
+        from watchdog.events import FileSystemEventHandler
+    except ImportError:
+        return None
+
+    class _Handler(FileSystemEventHandler):
+        def on_any_event(self, event):
+            changed.set()
+
+    observer = Observer()
+    observer.schedule(_Handler(), str(downloads_path), recursive=False)
+    observer.start()
+    return observer
@@ -0,0 +1,176 @@
+import json
+import sqlite3
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+# states a job goes through: pending -> running -> done, or -> failed (retried with backoff until max_attempts)
+JOB_STATES = ['pending', 'running', 'done', 'failed']
+
+
+class ScrapeJobQueue:
+    """
+    A small persistent queue of (disease_name_rki, disease_name_alias, year) scrape jobs, stored in a SQLite file.
+    Every job has a state (pending, running, done or failed) and an attempt count. A failed job is retried with
+    exponential backoff until max_attempts, while the other jobs continue. Since the queue lives on disk, an
+    interrupted run resumes with only the unfinished jobs.
+
+    The file is shared by all runs, but a queue works on the jobs it enqueued itself: claim, unfinished and given_up
+    only consider the jobs of its last enqueue call. Jobs of earlier runs that are enqueued again keep their state
+    and attempt count (i.e. they are resumed); the other jobs of earlier runs are left alone.
+
+    Parameters
+    ----------
+    path: Union[str, Path]
+        The SQLite file, e.g. next to log.txt.
+    max_attempts: int
+        Number of attempts after which a failing job is given up.
+    backoff: float
+        Seconds before the first retry of a failed job, doubling with every further attempt.
+
+    Examples
+    --------
+    >>> job_queue = ScrapeJobQueue(directories_dict['project_root'] / 'scrape_jobs.sqlite')
+    >>> job_queue.enqueue([('Keuchhusten', 'pertussis', '2025')])
+    >>> job, wait = job_queue.claim()
+    >>> job_queue.complete(job)
+    """
+    def __init__(self, path: Union[str, Path], max_attempts: int = 3, backoff: float = 30):
+        self.path         = Path(path)
+        self.max_attempts = max_attempts
+        self.backoff      = backoff
+        self.run_id       = None                # set by enqueue
+
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    disease_name_rki   TEXT NOT NULL,
+                    disease_name_alias TEXT NOT NULL,
+                    year               TEXT NOT NULL,
+                    state              TEXT NOT NULL DEFAULT 'pending',
+                    attempts           INTEGER NOT NULL DEFAULT 0,
+                    next_attempt_at    REAL NOT NULL DEFAULT 0,
+                    last_error         TEXT,
+                    updated_at         REAL NOT NULL,
+                    run_id             TEXT,
+                    PRIMARY KEY (disease_name_rki, disease_name_alias, year)
+                )""")
+            # queues written before the jobs were assigned to runs
+            if 'run_id' not in [column[1] for column in conn.execute("PRAGMA table_info(jobs)")]:
+                conn.execute("ALTER TABLE jobs ADD COLUMN run_id TEXT")
+
+    @contextmanager
+    def _connect(self):
+        # one (autocommitting) connection per call, such that the queue can be shared by worker threads
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def enqueue(self, jobs: List[Tuple[str, str, Union[str, List[str]]]]):
+        """
+        Adds jobs to the queue as a new run, which the queue works on from now on (see run_id). Jobs that are already
+        queued keep their state and attempt count (i.e. they are resumed), jobs that were done or given up before are queued again.
+        """
+        now         = time.time()
+        self.run_id = uuid.uuid4().hex
+        with self._connect() as conn:
+            conn.executemany("""
+                INSERT INTO jobs (disease_name_rki, disease_name_alias, year, updated_at, run_id) VALUES (:rki, :alias, :year, :now, :run_id)
+                ON CONFLICT (disease_name_rki, disease_name_alias, year) DO UPDATE
+                SET run_id = excluded.run_id, updated_at = excluded.updated_at,
+                    state           = CASE WHEN state = 'done' OR (state = 'failed' AND attempts >= :max_attempts) THEN 'pending' ELSE state END,
+                    next_attempt_at = CASE WHEN state = 'done' OR (state = 'failed' AND attempts >= :max_attempts) THEN 0 ELSE next_attempt_at END,
+                    last_error      = CASE WHEN state = 'done' OR (state = 'failed' AND attempts >= :max_attempts) THEN NULL ELSE last_error END,
+                    attempts        = CASE WHEN state = 'done' OR (state = 'failed' AND attempts >= :max_attempts) THEN 0 ELSE attempts END""",
+                [{'rki': rki, 'alias': alias, 'year': json.dumps(year), 'now': now, 'run_id': self.run_id, 'max_attempts': self.max_attempts}
+                 for rki, alias, year in jobs])
+
+    def recover(self) -> int:
+        """Puts the jobs of this run left 'running' by an interrupted run back to pending. Returns the number of recovered jobs."""
+        with self._connect() as conn:
+            return conn.execute("UPDATE jobs SET state = 'pending', updated_at = ? WHERE state = 'running' AND run_id = ?",
+                                (time.time(), self.run_id)).rowcount
+
+    def claim(self) -> Tuple[Optional[tuple], Optional[float]]:
+        """
+        Claims the next job that is ready to run and marks it as running.
+
+        Returns
+        -------
+        (job, None) if a job was claimed, (None, seconds) if the remaining jobs are waiting for a retry, or (None, None)
+        if nothing is left to do.
+        """
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute("""
+                    SELECT disease_name_rki, disease_name_alias, year, next_attempt_at FROM jobs
+                    WHERE state IN ('pending', 'failed') AND attempts < ? AND run_id = ?
+                    ORDER BY next_attempt_at, rowid LIMIT 1""", (self.max_attempts, self.run_id)).fetchone()
+                if row is None:
+                    conn.execute("COMMIT")
+                    return None, None
+
+                rki, alias, year, next_attempt_at = row
+                if next_attempt_at > now:
+                    conn.execute("COMMIT")
+                    return None, next_attempt_at - now
+
+                conn.execute("""
+                    UPDATE jobs SET state = 'running', attempts = attempts + 1, updated_at = ?
+                    WHERE disease_name_rki = ? AND disease_name_alias = ? AND year = ?""", (now, rki, alias, year))
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+        return (rki, alias, json.loads(year)), None
+
+    def complete(self, job: tuple):
+        """Marks a job as done."""
+        self._update(job, state='done', last_error=None)
+
+    def fail(self, job: tuple, error: Exception) -> bool:
+        """
+        Marks a job as failed; it is retried after an exponentially growing backoff, until max_attempts.
+        Returns whether the job will be retried.
+        """
+        rki, alias, year = job
+        with self._connect() as conn:
+            attempts = conn.execute("SELECT attempts FROM jobs WHERE disease_name_rki = ? AND disease_name_alias = ? AND year = ?",
+                                    (rki, alias, json.dumps(year))).fetchone()[0]
+        self._update(job, state='failed', last_error=f"{type(error).__name__}: {error}",
+                     next_attempt_at=time.time() + self.backoff * 2 ** (attempts - 1))
+        return attempts < self.max_attempts
+
+    def _update(self, job: tuple, **values):
+        rki, alias, year = job
+        assignments = ", ".join(f"{column} = ?" for column in values)
+        with self._connect() as conn:
+            conn.execute(f"UPDATE jobs SET {assignments}, updated_at = ? WHERE disease_name_rki = ? AND disease_name_alias = ? AND year = ?",
+                         (*values.values(), time.time(), rki, alias, json.dumps(year)))
+
+    def unfinished(self) -> int:
+        """Number of jobs of this run that still have to (or may be retried to) run."""
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM jobs WHERE state IN ('pending', 'running', 'failed') AND attempts < ? AND run_id = ?",
+                                (self.max_attempts, self.run_id)).fetchone()[0]
+
+    def given_up(self) -> List[Tuple[tuple, str]]:
+        """Failed jobs of this run that reached max_attempts, with their last error."""
+        with self._connect() as conn:
+            rows = conn.execute("SELECT disease_name_rki, disease_name_alias, year, last_error FROM jobs WHERE state = 'failed' AND attempts >= ? AND run_id = ?",
+                                (self.max_attempts, self.run_id)).fetchall()
+        return [((rki, alias, json.loads(year)), error) for rki, alias, year, error in rows]
+
+    def summary(self) -> Dict[str, int]:
+        """Number of jobs per state, of all runs."""
+        with self._connect() as conn:
+            counts = dict(conn.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall())
+        return {state: counts.get(state, 0) for state in JOB_STATES}
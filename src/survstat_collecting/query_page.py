@@ -0,0 +1,25 @@
+# Identifiers of the SurvStat query page, shared by the browser and the HTTP backend
+
+QUERY_URL = "https://survstat.rki.de/Content/Query/Create.aspx"
+
+# ids of the controls on the query page
+CONTROL_IDS = {
+    'row_hierarchy': 'ContentPlaceHolderMain_ContentPlaceHolderAltGridFull_DropDownListRowHierarchy',
+    'col_hierarchy': 'ContentPlaceHolderMain_ContentPlaceHolderAltGridFull_DropDownListColHierarchy',
+    'col':           'ContentPlaceHolderMain_ContentPlaceHolderAltGridFull_DropDownListCol',
+    'non_empty':     'ContentPlaceHolderMain_ContentPlaceHolderAltGridFull_CheckBoxNonEmpty',
+    'result_info':   'ContentPlaceHolderMain_ContentPlaceHolderAltGridFull_LabelQueryResultInfo',
+    'download':      'ContentPlaceHolderMain_ContentPlaceHolderAltGridFull_ButtonDownload',
+}
+
+ROW_HIERARCHY = '[ReportingDate].[Week]'
+# year and week as rows, used when several years are queried at once. This hierarchy could not be confirmed against
+# the live page: if it is not offered, or its export cannot be split, MultiYearExportError is raised and the scraper
+# falls back to one query per year (see scrape_worker)
+MULTI_YEAR_ROW_HIERARCHY = '[ReportingDate].[YearWeek]'
+COL_HIERARCHY = '[DeutschlandNodes].[Kreise71Web]'
+COL_LEVEL     = '[DeutschlandNodes].[Kreise71Web].[CountyKey71]'
+
+
+class MultiYearExportError(ValueError):
+    """The query page offers no multi-year export (MULTI_YEAR_ROW_HIERARCHY), or its export cannot be split into years."""
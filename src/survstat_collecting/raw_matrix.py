@@ -0,0 +1,116 @@
+import argparse
+import csv
+import hashlib
+import io
+import os
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+import numpy as np
+
+# Next to every raw yearly export (UTF-16, tab-separated, fully quoted text) a compact binary copy is kept:
+# '{disease}_{year}.npz' with the cases as a dense int32 (week x county) matrix, the week numbers and the county names
+# of the header, and the size, modification time and sha256 of the text file it was converted from. The text file
+# stays the source of truth.
+MATRIX_SUFFIX = ".npz"
+
+
+def matrix_path(raw_file: Union[str, Path]) -> Path:
+    """Path of the binary copy of a raw yearly file."""
+    return Path(raw_file).with_suffix(MATRIX_SUFFIX)
+
+
+def convert_raw_file(raw_file: Union[str, Path]) -> Path:
+    """
+    Converts a raw yearly export into its binary copy (see matrix_path) and returns the path of the copy.
+    Empty cells are stored as 0, as preprocess_yearfile imputes them with zero anyway.
+
+    Examples
+    --------
+    >>> convert_raw_file(directories_dict['dir_data_raw'] / 'measles' / 'measles_2024.csv')
+    """
+    raw_file = Path(raw_file)
+    stat     = raw_file.stat()       # before reading, such that a change while reading makes the copy look outdated
+    content  = raw_file.read_bytes()
+    rows     = list(csv.reader(io.StringIO(content.decode('utf-16')), delimiter='\t'))
+    counties = rows[1][1:]
+    weeks    = [row for row in rows[2:] if row and row[0].strip().isdigit()]
+
+    cases = np.zeros((len(weeks), len(counties)), dtype=np.int32)
+    for ii, row in enumerate(weeks):
+        cases[ii] = [int(cell) if cell else 0 for cell in row[1:len(counties) + 1]]
+
+    return _write_matrix(matrix_path(raw_file),
+                         cases=cases,
+                         weeks=np.array([int(row[0]) for row in weeks], dtype=np.int64),
+                         counties=np.array(counties, dtype=str),
+                         source_sha256=np.array(hashlib.sha256(content).hexdigest()),
+                         source_size=np.array(stat.st_size, dtype=np.int64),
+                         source_mtime_ns=np.array(stat.st_mtime_ns, dtype=np.int64))
+
+
+def read_raw_matrix(raw_file: Union[str, Path]) -> Optional[Dict[str, np.ndarray]]:
+    """
+    Reads the binary copy of a raw yearly file: a dict with 'cases' (week x county), 'weeks' and 'counties'.
+    Returns None if there is no copy, or if it is outdated, i.e. not converted from the current text file.
+    The copy is up to date if the text file still has the size and modification time it was converted from; only
+    if these differ (e.g. after a checkout, or for copies written before they were stored) the text file is hashed,
+    and if its hash still matches, the copy is updated to the new size and modification time.
+    """
+    raw_file = Path(raw_file)
+    path     = matrix_path(raw_file)
+    if not path.exists() or not raw_file.exists():
+        return None
+
+    stat = raw_file.stat()
+    with np.load(path) as npz:
+        arrays = {key: npz[key] for key in ['cases', 'weeks', 'counties', 'source_sha256']}
+        unchanged = ('source_mtime_ns' in npz.files and int(npz['source_size']) == stat.st_size
+                     and int(npz['source_mtime_ns']) == stat.st_mtime_ns)
+    if not unchanged:
+        if str(arrays['source_sha256']) != hashlib.sha256(raw_file.read_bytes()).hexdigest():
+            return None
+        # touched, but not changed: store the new stamp, such that the next read need not hash the file again
+        try:
+            _write_matrix(path, **arrays, source_size=np.array(stat.st_size, dtype=np.int64),
+                          source_mtime_ns=np.array(stat.st_mtime_ns, dtype=np.int64))
+        except OSError:
+            pass            # e.g. a read-only copy of the data: still up to date, only hashed again next time
+    return {key: arrays[key] for key in ['cases', 'weeks', 'counties']}
+
+
+def convert_raw_directory(raw_data_dir: Union[str, Path], overwrite: bool = False) -> List[Path]:
+    """
+    Backfills the binary copies of all raw yearly files in raw_data_dir (one folder per disease).
+    Files that already have an up-to-date copy are skipped, unless overwrite.
+    """
+    converted = []
+    for raw_file in sorted(Path(raw_data_dir).glob("*/*.csv")):
+        if overwrite or read_raw_matrix(raw_file) is None:
+            converted.append(convert_raw_file(raw_file))
+    return converted
+
+
+# Helpers
+def _write_matrix(output_path: Path, **arrays: np.ndarray) -> Path:
+    """Writes a binary copy atomically, such that a reader never sees a partly written file."""
+    fd, temp_path = tempfile.mkstemp(dir=output_path.parent, prefix=f".{output_path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            np.savez_compressed(f, **arrays)
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, output_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return output_path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Converts the raw yearly SurvStat exports into compact .npz matrices")
+    parser.add_argument("raw_data_dir", type=Path, help="directory with the raw data, one folder per disease")
+    parser.add_argument("--overwrite", action="store_true", help="also convert files that already have an up-to-date copy")
+    args = parser.parse_args()
+    converted = convert_raw_directory(args.raw_data_dir, overwrite=args.overwrite)
+    print(f"✅ {len(converted)} raw file(s) converted")
@@ -0,0 +1,198 @@
+import csv
+import hashlib
+import io
+import json
+import os
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+# When is a raw yearly file expected to have changed on SurvStat?
+#   max_age_hours:         files of years that are not settled yet are re-scraped once they are older than this
+#   settle_weeks:          a year is settled this many weeks after it ended; late notifications are expected until then
+#   final_after_unchanged: a year that is not settled yet counts as final after this many re-scrapes without any change
+DEFAULT_FRESHNESS_POLICY = {
+    'max_age_hours': 20,
+    'settle_weeks': 12,
+    'final_after_unchanged': 3,
+}
+
+MANIFEST_FILENAME = "scrape_manifest.json"
+
+
+def inspect_raw_file(path: Union[str, Path], record: Optional[Dict] = None) -> Optional[Dict]:
+    """
+    Inspects a raw yearly file: its modification time, size, sha256 content hash and the last week with any reported
+    cases. Returns None if the file does not exist.
+    If record (its entry in the manifest) has the size and modification time the file still has, its hash and last
+    week are taken from there instead of reading the file.
+    """
+    path = Path(path)
+    if not path.exists():
+        return None
+
+    stat = path.stat()       # before reading, such that a change while reading makes the record look outdated
+    if record and record.get('size') == stat.st_size and record.get('mtime_ns') == stat.st_mtime_ns:
+        return {key: record[key] for key in ['mtime', 'size', 'mtime_ns', 'sha256', 'last_week']}
+
+    content = path.read_bytes()
+    return {
+        'mtime': stat.st_mtime,
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'sha256': hashlib.sha256(content).hexdigest(),
+        'last_week': _last_reported_week(content),
+    }
+
+
+def plan_scrape_jobs(disease_names: Dict[str, str],
+                     years: Union[List[str], range],
+                     raw_data_dir: Union[str, Path],
+                     policy: Optional[Dict] = None,
+                     now: Optional[datetime] = None) -> List[Dict]:
+    """
+    Plans which (disease, year) combinations need to be scraped, by inspecting what is already in raw_data_dir.
+    A raw file is (re)scraped when it is:
+        - 'missing':   there is no file yet
+        - 'stale':     its year is not settled yet (see DEFAULT_FRESHNESS_POLICY) and the file is older than max_age_hours
+        - 'unsettled': the file was scraped before its year settled, so late notifications are missing from it
+    Files of settled years that were scraped after settling, and files that stopped changing, are skipped.
+    Only files whose size or modification time differ from their entry in the manifest are hashed; their entry is
+    then updated to the file as it is (see inspect_raw_file), so they are not hashed again in the next run.
+
+    Parameters
+    ----------
+    disease_names: Dict[str, str]
+        Dictionary of [disease_name_rki : disease_name_alias], as for scrape_survstat_data.
+    years: Union[List[str], range]
+        Years to consider.
+    raw_data_dir: Union[str, Path]
+        Directory containing the raw data, with one folder per disease alias.
+    policy: Dict, optional
+        Overrides for DEFAULT_FRESHNESS_POLICY.
+    now: datetime, optional
+        Reference time. By default the current time.
+
+    Returns
+    -------
+    List[Dict]
+        One dict per job with disease_name_rki, disease_name_alias, year, reason and the inspected file info.
+
+    Examples
+    --------
+    >>> jobs = plan_scrape_jobs(diseases_dict, all_years, directories_dict['dir_data_raw'])
+    >>> print_plan(jobs)
+    >>> run_scrape_jobs(plan_to_jobs(jobs), ...)
+    """
+    policy   = {**DEFAULT_FRESHNESS_POLICY, **(policy or {})}
+    now      = now or datetime.now()
+    manifest = read_manifest(raw_data_dir)
+
+    jobs, updated = [], False
+    for bug_name_rki, bug_name_alias in disease_names.items():
+        for yy in [str(yy) for yy in years]:
+            record = manifest.get(bug_name_alias, {}).get(yy, {})
+            info   = inspect_raw_file(raw_file_path(raw_data_dir, bug_name_alias, yy), record)
+            if info is not None and any(record.get(key) != value for key, value in info.items()):
+                # touched but unchanged: keep the count of unchanged re-scrapes; otherwise the file on disk is new
+                unchanged = record.get('unchanged', 0) if record.get('sha256') == info['sha256'] else 0
+                record    = manifest.setdefault(bug_name_alias, {})[yy] = {**info, 'unchanged': unchanged}
+                updated   = True
+            reason = _scrape_reason(int(yy), info, record, policy, now)
+            if reason is not None:
+                jobs.append({'disease_name_rki': bug_name_rki, 'disease_name_alias': bug_name_alias,
+                             'year': yy, 'reason': reason, 'file': info})
+
+    if updated:
+        write_manifest(manifest, raw_data_dir)
+    return jobs
+
+
+def plan_to_jobs(plan: List[Dict]) -> List[tuple]:
+    """Converts a plan into the (disease_name_rki, disease_name_alias, year) jobs of run_scrape_jobs."""
+    return [(job['disease_name_rki'], job['disease_name_alias'], job['year']) for job in plan]
+
+
+def print_plan(plan: List[Dict]):
+    """Prints the planned jobs, e.g. for a dry run."""
+    if not plan:
+        print("✅ all raw data is up to date, nothing to scrape")
+        return
+
+    print(f"{len(plan)} scrape job(s) planned:")
+    for job in plan:
+        info = job['file']
+        if info is None:
+            details = "no file"
+        else:
+            scraped = datetime.fromtimestamp(info['mtime']).strftime("%Y-%m-%d %H:%M")
+            details = f"scraped {scraped}, last reported week {info['last_week']}"
+        print(f"- {job['disease_name_alias']} {job['year']}: {job['reason']} ({details})")
+
+
+def record_scrape_results(plan: List[Dict], raw_data_dir: Union[str, Path]):
+    """
+    Updates the manifest in raw_data_dir after the planned jobs have been scraped: the content hash of each new file
+    and the number of consecutive re-scrapes in which it did not change.
+    """
+    manifest = read_manifest(raw_data_dir)
+    for job in plan:
+        record = manifest.setdefault(job['disease_name_alias'], {}).get(job['year'], {})
+        info   = inspect_raw_file(raw_file_path(raw_data_dir, job['disease_name_alias'], job['year']), record)
+        if info is None:
+            continue
+        unchanged = record.get('unchanged', -1) + 1 if record.get('sha256') == info['sha256'] else 0
+        manifest[job['disease_name_alias']][job['year']] = {**info, 'unchanged': unchanged}
+
+    write_manifest(manifest, raw_data_dir)
+
+
+def raw_file_path(raw_data_dir: Union[str, Path], disease_name_alias: str, year: str) -> Path:
+    disease_folder_name = disease_name_alias.lower().replace(' ', '_')
+    return Path(raw_data_dir) / disease_folder_name / f"{disease_folder_name}_{year}.csv"
+
+
+def read_manifest(raw_data_dir: Union[str, Path]) -> Dict:
+    path = Path(raw_data_dir) / MANIFEST_FILENAME
+    if not path.exists():
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def write_manifest(manifest: Dict, raw_data_dir: Union[str, Path]):
+    path = Path(raw_data_dir) / MANIFEST_FILENAME
+    temp_path = path.with_suffix(".json.tmp")
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(temp_path, path)
+
+
+# Helpers
+def _scrape_reason(year: int, info: Optional[Dict], record: Dict, policy: Dict, now: datetime) -> Optional[str]:
+    if info is None:
+        return 'missing'
+
+    settled_on = datetime.combine(date(year + 1, 1, 1), datetime.min.time()) + timedelta(weeks=policy['settle_weeks'])
+    scraped_on = datetime.fromtimestamp(info['mtime'])
+    if scraped_on >= settled_on:
+        return None
+
+    # scraped before the year settled: expected to change, unless re-scraping stopped changing it
+    if record.get('sha256') == info['sha256'] and record.get('unchanged', 0) >= policy['final_after_unchanged']:
+        return None
+    if now >= settled_on:
+        return 'unsettled'
+    if now - scraped_on > timedelta(hours=policy['max_age_hours']):
+        return 'stale'
+    return None
+
+
+def _last_reported_week(content: bytes) -> Optional[int]:
+    """Last week (row) in a raw SurvStat export with any non-zero number of cases."""
+    rows = list(csv.reader(io.StringIO(content.decode('utf-16')), delimiter='\t'))[2:]
+    last_week = None
+    for row in rows:
+        if row and row[0].strip().isdigit() and any(cell not in ('', '0') for cell in row[1:]):
+            last_week = int(row[0])
+    return last_week
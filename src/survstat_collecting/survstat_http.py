@@ -0,0 +1,277 @@
+import os
+from html.parser import HTMLParser
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from .query_page import QUERY_URL, CONTROL_IDS, ROW_HIERARCHY, MULTI_YEAR_ROW_HIERARCHY, COL_HIERARCHY, COL_LEVEL, MultiYearExportError
+
+
+class _FormParser(HTMLParser):
+    """Collects the inputs and selects (with their options) of a html page."""
+    def __init__(self):
+        super().__init__()
+        self.inputs  = []
+        self.selects = []
+        self._select = None
+        self._option = None
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == 'input':
+            self.inputs.append(attrs)
+        elif tag == 'select':
+            self._select = {**attrs, 'options': []}
+            self.selects.append(self._select)
+        elif tag == 'option' and self._select is not None:
+            self._option = {'value': attrs.get('value'), 'selected': 'selected' in attrs, 'text': ''}
+            self._select['options'].append(self._option)
+
+    def handle_endtag(self, tag):
+        if tag == 'select':
+            self._select = None
+        if tag in ('option', 'select'):
+            self._option = None
+
+    def handle_data(self, data):
+        if self._option is not None:
+            self._option['text'] += data
+
+    def close(self):
+        super().close()
+        for option in (oo for ss in self.selects for oo in ss['options']):
+            option['text'] = option['text'].strip()
+            if option['value'] is None:
+                option['value'] = option['text']
+
+
+class SurvstatHttpClient:
+    """
+    Runs SurvStat queries without a browser, by replaying the postbacks of the query page over a pooled HTTP session
+    and streaming the exported .zip to disk. It has the same interface as SurvstatSession, so both can be used as
+    a backend for scrape_survstat_data.
+
+    The query page is an ASP.NET form: every filter added on the page is a server-side postback, so a query takes
+    a handful of small requests (add filter, choose disease, add filter, choose year, set rows/columns, download)
+    instead of driving a browser with fixed waits.
+
+    Parameters
+    ----------
+    downloads_path: Path
+        Directory into which the exported .zip is written.
+    base_url: str
+        Url of the query page. Point it to a local server to run against a test double.
+    timeout: float
+        Timeout in seconds for each request.
+    pool_size: int
+        Number of pooled connections kept open to the server.
+    retries: int
+        Number of retries for failed connections and 5xx-responses.
+
+    Examples
+    --------
+    >>> with SurvstatHttpClient(downloads_path) as client:
+    >>>     zip = client.query('Keuchhusten', '2024')
+    """
+    def __init__(self, downloads_path: Path, base_url: str = QUERY_URL, timeout: float = 60, pool_size: int = 4, retries: int = 3):
+        self.downloads_path = Path(downloads_path)
+        self.base_url       = base_url
+        self.timeout        = timeout
+        self.pool_size      = pool_size
+        self.retries        = retries
+        self.http           = None
+        self.n_queries      = 0
+        self._page          = None
+        self.form           = {}
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def start(self):
+        """Opens the pooled HTTP session, if not open already."""
+        if self.http is None:
+            retry   = Retry(total=self.retries, backoff_factor=0.5, status_forcelist=[500, 502, 503, 504], allowed_methods=None)
+            adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size, max_retries=retry)
+            self.http = requests.Session()
+            self.http.mount('http://', adapter)
+            self.http.mount('https://', adapter)
+        return self
+
+    def close(self):
+        """Closes the HTTP session."""
+        if self.http is not None:
+            self.http.close()
+            self.http = None
+
+    def reset(self):
+        """Resets the query form by fetching a fresh query page."""
+        self.start()
+        response = self.http.get(self.base_url, timeout=self.timeout)
+        response.raise_for_status()
+        self._parse(response.text)
+
+    def query(self, disease: str, year: Union[str, List[str]]) -> Path:
+        """
+        Runs a single query for a given disease and year and downloads the result.
+        If a list of years is given, all of them are selected in one query, with year and week as rows;
+        MultiYearExportError is raised if the page does not offer those rows.
+
+        Returns
+        -------
+        Path
+            The downloaded survstat .zip
+        """
+        self.reset()
+        self.n_queries += 1
+        years = [str(year)] if isinstance(year, (str, int)) else [str(yy) for yy in year]
+
+        # filter on disease
+        self._postback(self._button('Add'))
+        self._choose(self._empty_select_with('Disease/ Pathogen'), 'Disease/ Pathogen')
+        self._choose(self._select(title='Reporting category by disease name'), disease, exact=False)
+
+        # filter on year
+        self._postback(self._button('Add'))
+        self._choose(self._empty_select_with('Year of notification'), 'Year of notification')
+        self._choose_many(self._empty_select_with(years[0]), years)
+
+        # weeks (or years and weeks) as rows, counties as columns, including zero values
+        rows = self._select(id=CONTROL_IDS['row_hierarchy'])
+        if len(years) > 1 and MULTI_YEAR_ROW_HIERARCHY not in [oo['value'] for oo in rows['options']]:
+            raise MultiYearExportError(f"'{MULTI_YEAR_ROW_HIERARCHY}' is not offered as row hierarchy")
+        self._set(rows, ROW_HIERARCHY if len(years) == 1 else MULTI_YEAR_ROW_HIERARCHY)
+        self._set(self._select(id=CONTROL_IDS['col_hierarchy']), COL_HIERARCHY)
+        self._set(self._select(id=CONTROL_IDS['col']), COL_LEVEL)
+        self.form[self._input(id=CONTROL_IDS['non_empty'])['name']] = 'on'
+
+        return self._download(self._input(id=CONTROL_IDS['download']))
+
+# Helpers - form state
+    def _parse(self, html: str):
+        """Parses the page into the current form values, as a browser would submit them."""
+        parser = _FormParser()
+        parser.feed(html)
+        parser.close()
+        self._page = parser
+
+        self.form = {}
+        for field in parser.inputs:
+            name, kind = field.get('name'), field.get('type', 'text').lower()
+            if name is None or kind in ('submit', 'button', 'image'):
+                continue
+            if kind in ('checkbox', 'radio') and 'checked' not in field:
+                continue
+            self.form[name] = field.get('value', 'on' if kind == 'checkbox' else '')
+
+        for select in parser.selects:
+            if select.get('name') is None:
+                continue
+            selected = [oo['value'] for oo in select['options'] if oo['selected']]
+            if 'multiple' in select:
+                self.form[select['name']] = selected
+            elif selected:
+                self.form[select['name']] = selected[-1]
+            elif select['options']:
+                self.form[select['name']] = select['options'][0]['value']
+
+    def _postback(self, button: Optional[Dict] = None, target: str = ''):
+        """Submits the form, either by pressing button or as an __doPostBack by target, and parses the new page."""
+        data = {**self.form, '__EVENTTARGET': target, '__EVENTARGUMENT': ''}
+        if button is not None:
+            data[button['name']] = button.get('value', '')
+
+        response = self.http.post(self.base_url, data=data, timeout=self.timeout)
+        response.raise_for_status()
+        self._parse(response.text)
+
+    def _set(self, select: Dict, value: str):
+        """Sets the value of a select and posts back its change event."""
+        if value not in [oo['value'] for oo in select['options']]:
+            raise ValueError(f"'{value}' is not an option of {select.get('id', select['name'])}")
+        self.form[select['name']] = value
+        self._postback(target=select['name'])
+
+    def _choose(self, select: Dict, text: str, exact: bool = True):
+        """Sets a select to the option whose text matches text."""
+        for option in select['options']:
+            if option['text'] == text or (not exact and text in option['text']):
+                return self._set(select, option['value'])
+        raise ValueError(f"Could not find option '{text}' in {select.get('title', select['name'])}")
+
+    def _choose_many(self, select: Dict, texts: List[str]):
+        """Sets a multiple select to the options whose texts are in texts."""
+        values = [oo['value'] for oo in select['options'] if oo['text'] in texts]
+        if len(values) != len(set(texts)):
+            missing = set(texts) - {oo['text'] for oo in select['options']}
+            raise ValueError(f"Could not find options {sorted(missing)} in {select.get('title', select['name'])}")
+        self.form[select['name']] = values
+        self._postback(target=select['name'])
+
+    def _select(self, **attrs) -> Dict:
+        for select in self._page.selects:
+            if all(select.get(key) == value for key, value in attrs.items()):
+                return select
+        raise ValueError(f"Could not find select with {attrs}")
+
+    def _empty_select_with(self, text: str) -> Dict:
+        """Finds the select that still has no value chosen and offers an option with text, i.e. the newly added filter."""
+        for select in self._page.selects:
+            if self.form.get(select.get('name')):
+                continue
+            if any(oo['text'] == text for oo in select['options']):
+                return select
+        raise ValueError(f"Could not find an empty filter offering '{text}'")
+
+    def _input(self, **attrs) -> Dict:
+        for field in self._page.inputs:
+            if all(field.get(key) == value for key, value in attrs.items()):
+                return field
+        raise ValueError(f"Could not find input with {attrs}")
+
+    def _button(self, title: str) -> Dict:
+        """Finds the last button with title, i.e. the one belonging to the newest filter row."""
+        buttons = [ff for ff in self._page.inputs if ff.get('title') == title]
+        if not buttons:
+            raise ValueError(f"Could not find button '{title}'")
+        return buttons[-1]
+
+    def _download(self, button: Dict) -> Path:
+        """Presses the download button and streams the .zip into downloads_path."""
+        data = {**self.form, '__EVENTTARGET': '', '__EVENTARGUMENT': '', button['name']: button.get('value', '')}
+
+        with self.http.post(self.base_url, data=data, timeout=self.timeout, stream=True) as response:
+            response.raise_for_status()
+            chunks = response.iter_content(chunk_size=1 << 16)
+            first  = next(chunks, b'')
+            if not first.startswith(b'PK'):
+                raise FileNotFoundError("No survstat ZIP file found after download")
+
+            self.downloads_path.mkdir(parents=True, exist_ok=True)
+            zip_path  = self.downloads_path / "survstat.zip"
+            temp_path = zip_path.with_suffix(".zip.part")
+            with open(temp_path, 'wb') as f:
+                f.write(first)
+                for chunk in chunks:
+                    f.write(chunk)
+            os.replace(temp_path, zip_path)
+
+        return zip_path
+
+
+def http_scraper(disease: str,
+                 year: Union[str, List[str]],
+                 downloads_path: Path,
+                 session: Optional[SurvstatHttpClient] = None) -> Path:
+    """
+    Scrapes survstat data for a given disease and year over plain HTTP. Drop-in replacement of scraper.
+    If no session is given, a new SurvstatHttpClient is opened for this query only.
+    """
+    if session is None:
+        with SurvstatHttpClient(downloads_path) as session:
+            return session.query(disease, year)
+
+    return session.query(disease, year)
@@ -1,16 +1,22 @@
+import csv
+import io
 import os
+import re
 import zipfile
 import shutil
+import tempfile
 import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from webdriver_manager.chrome import ChromeDriverManager
-from selenium.webdriver.chrome.service import Service
-from typing import Optional, Union, List, Dict
+from typing import TYPE_CHECKING, BinaryIO, Optional, Union, List, Dict, Tuple
 from tqdm import tqdm
+from .job_queue import ScrapeJobQueue
+from .query_page import MultiYearExportError
+from .raw_matrix import convert_raw_file
+
+# selenium is only imported once a browser session is opened (see open_session)
+if TYPE_CHECKING:
+    from .survstat_session import SurvstatSession
 
 def remove_downloads_folder(downloads_path: Path):
     """
@@ -26,260 +32,219 @@ def remove_downloads_folder(downloads_path: Path):
                 pass
     
 def scraper(disease: str,
-            year: str,
-            downloads_path: Path) -> Path:
+            year: Union[str, List[str]],
+            downloads_path: Path,
+            session: Optional['SurvstatSession'] = None) -> Path:
     
     """
-    Scrapes survstat data for a given disease and year.
+    Scrapes survstat data for a given disease and year (or list of years, in one query).
+    If no session is given, a browser is started for this query only and quit afterwards.
     """
+    if session is None:
+        from .survstat_session import SurvstatSession
+        with SurvstatSession(downloads_path) as session:
+            return session.query(disease, year)
 
-    # Initializing a Chrome tab
-    chrome_options = webdriver.ChromeOptions()
-
-    # Your existing preferences
-    prefs = {
-        "download.default_directory": str(downloads_path.absolute()),
-        "download.prompt_for_download": False,
-        "download.directory_upgrade": True,
-        "safebrowsing.enabled": True
-    }
-    chrome_options.add_experimental_option("prefs", prefs)
-
-    # Add these lines to suppress logs
-    chrome_options.add_argument("--log-level=3")  # Only errors, no info or warnings
-    chrome_options.add_experimental_option('excludeSwitches', ['enable-logging'])
-        
-    driver = webdriver.Chrome(
-        service=Service(ChromeDriverManager().install()),
-        options=chrome_options
-    )
-
-    # Open website
-    driver.get("https://survstat.rki.de/Content/Query/Create.aspx")
-    time.sleep(2)
-    
-    # Add new filter dropdown - FIRST ADD BUTTON
-    add_button = WebDriverWait(driver, 10).until(
-        EC.element_to_be_clickable((By.XPATH, "//input[@title='Add']")))
-    add_button.click()
-    time.sleep(1)
-
-    # Press the newly added dropdown box - find fresh each time
-    clicked = False
-    for attempt in range(3):
-        try:
-            select_elements = driver.find_elements(By.XPATH, "//*[contains(text(), 'Select an option')]")
-            for element in select_elements:
-                try:
-                    if element.is_displayed():
-                        element.click()
-                        clicked = True
-                        break
-                except:
-                    continue
-            if clicked:
-                break
-            time.sleep(1)
-        except:
-            time.sleep(1)
-            continue
-    
-    if not clicked:
-        raise Exception("Could not click 'Select an option' dropdown")
-    
-    time.sleep(1)
+    return session.query(disease, year)
 
-    # Add as selection feature disease to be specified
-    disease_button = WebDriverWait(driver, 10).until(
-        EC.element_to_be_clickable((By.XPATH, "//li[contains(text(), 'Disease/ Pathogen')]")))
-    disease_button.click()        
-    
-    # Press box to select disease
-    chosen_container = WebDriverWait(driver, 10).until(
-        EC.element_to_be_clickable((By.XPATH, "//select[@title='Reporting category by disease name']/following-sibling::div[contains(@class, 'chosen-container')]")))
-    chosen_container.click()            
-
-    # Select actual disease
-    disease_option = WebDriverWait(driver, 10).until(
-        EC.element_to_be_clickable((By.XPATH,  f"//li[contains(text(), '{disease}')]")))
-    disease_option.click()       
-
-    # Add another filter dropdown - FIND ADD BUTTON FRESH WITH RETRY
-    add_button_clicked = False
-    for attempt in range(3):
-        try:
-            add_button_second = WebDriverWait(driver, 10).until(
-                EC.element_to_be_clickable((By.XPATH, "//input[@title='Add']")))
-            add_button_second.click()
-            add_button_clicked = True
-            break
-        except:
-            time.sleep(1)
-            continue
-    
-    if not add_button_clicked:
-        raise Exception("Could not click second Add button")
-    
-    time.sleep(1)
-    
-    # Press the newly added dropdown box - find fresh each time
-    clicked = False
-    for attempt in range(3):
-        try:
-            select_elements = driver.find_elements(By.XPATH, "//*[contains(text(), 'Select an option')]")
-            for element in select_elements:
-                try:
-                    if element.is_displayed():
-                        element.click()
-                        clicked = True
-                        break
-                except:
-                    continue
-            if clicked:
-                break
-            time.sleep(1)
-        except:
-            time.sleep(1)
-            continue
-    
-    if not clicked:
-        raise Exception("Could not click second 'Select an option' dropdown")
-    
-    time.sleep(1)
-
-    # Add as selection feature year to be specified
-    year_option = WebDriverWait(driver, 10).until(
-        EC.element_to_be_clickable((By.XPATH, "//li[contains(text(), 'Year of notification')]")))
-    year_option.click()
-
-    # Clicking the year box
-    year_chosen_container = WebDriverWait(driver, 10).until(
-        EC.element_to_be_clickable((By.XPATH, "//span[text()='Year of notification']/../..//div[contains(@class, 'chosen-container')]")))
-    year_chosen_container.click()        
-
-    # Selecting the actual year
-    year_option = WebDriverWait(driver, 10).until(
-        EC.element_to_be_clickable((By.XPATH, f"//li[text()='{year}']")))
-    year_option.click()        
-
-    # Selecting weeknumber as rowvalue
-    js_script_rows = """
-    var rowsSelect = document.getElementById('ContentPlaceHolderMain_ContentPlaceHolderAltGridFull_DropDownListRowHierarchy');
-    rowsSelect.value = '[ReportingDate].[Week]';
-    rowsSelect.dispatchEvent(new Event('change'));
-    
-    if (typeof $ !== 'undefined' && $(rowsSelect).data('chosen')) {
-        $(rowsSelect).trigger('chosen:updated');
-    }
-    """
-    driver.execute_script(js_script_rows)
-    time.sleep(1)
-    
-    # Selecting spatial unit as columns
-    js_script_columns = """
-    var columnsSelect = document.getElementById('ContentPlaceHolderMain_ContentPlaceHolderAltGridFull_DropDownListColHierarchy');
-    columnsSelect.value = '[DeutschlandNodes].[Kreise71Web]';
-    columnsSelect.dispatchEvent(new Event('change'));
-    
-    if (typeof $ !== 'undefined' && $(columnsSelect).data('chosen')) {
-        $(columnsSelect).trigger('chosen:updated');
-    }
+def open_session(backend: str, downloads_path: Path, headless: bool = False):
     """
-    driver.execute_script(js_script_columns)
-    time.sleep(1)
-
-    # More specifically, selecting County (Kreise) as columnvalue
-    js_script_county = """
-    var colSelect = document.getElementById('ContentPlaceHolderMain_ContentPlaceHolderAltGridFull_DropDownListCol');
-    colSelect.value = '[DeutschlandNodes].[Kreise71Web].[CountyKey71]';
-    colSelect.dispatchEvent(new Event('change'));
-    
-    if (typeof $ !== 'undefined' && $(colSelect).data('chosen')) {
-        $(colSelect).trigger('chosen:updated');
-    }
+    Opens a query session for the given backend: 'selenium' drives a browser (SurvstatSession),
+    'http' replays the query over plain HTTP (SurvstatHttpClient). Both download into downloads_path.
     """
-    driver.execute_script(js_script_county)
-    time.sleep(1)
-    
-    # Add zero values (so that there's no missing observations, i.e. empty rows/columns)
-    zero_values_checkbox = driver.find_element(By.ID, "ContentPlaceHolderMain_ContentPlaceHolderAltGridFull_CheckBoxNonEmpty")
-    if not zero_values_checkbox.is_selected():
-        zero_values_checkbox.click()
-        time.sleep(1)
-    
-    # Waiting for the query result to appear
-    WebDriverWait(driver, 30).until(
-        EC.presence_of_element_located((By.ID, "ContentPlaceHolderMain_ContentPlaceHolderAltGridFull_LabelQueryResultInfo")))
-
-    # Wait for download button and click it        
-    download_button = WebDriverWait(driver, 10).until(
-        EC.element_to_be_clickable((By.ID, "ContentPlaceHolderMain_ContentPlaceHolderAltGridFull_ButtonDownload")))
-    
-    # download data
-    download_button.click()
-    max_wait_time = 30
-    wait_interval = 2
-    elapsed_time = 0
-        
-    latest_zip = None
-    while elapsed_time < max_wait_time:
-        time.sleep(wait_interval)
-        elapsed_time += wait_interval
-
-        survstat_zips = [f for f in downloads_path.iterdir() 
-                        if f.is_file() and f.name.lower().startswith("survstat") and f.suffix == ".zip"]
-        
-        if survstat_zips:
-            latest_zip = max(survstat_zips, key=lambda x: x.stat().st_mtime)
-            break
-
-    if latest_zip:
-        return latest_zip
-    
+    if backend == 'selenium':
+        from .survstat_session import SurvstatSession
+        return SurvstatSession(downloads_path, headless=headless)
+    elif backend == 'http':
+        from .survstat_http import SurvstatHttpClient
+        return SurvstatHttpClient(downloads_path)
     else:
-        raise FileNotFoundError("No survstat ZIP file found after download")
+        raise ValueError(f"Invalid value for 'backend': {backend}. Please choose from ['selenium', 'http'].")
 
 def move_zip(downloads_path: Path,
              latest_zip: Path,
              disease_name_alias: str,
              output_directory: Path,
-             year: str):
+             year: str) -> Path:
     """
-    Extracts data from the .zip file into the new output_directory.
+    Streams Data.csv from the .zip file straight into the output_directory, i.e.
+    'output_directory / {disease_name_alias} / {disease_name_alias}_{year}.csv'.
+    The file is written to a temporary file next to its destination and renamed into place,
+    so a half-written file is never left behind and no shared scratch directory is needed.
+    A compact binary copy for preprocessing is written next to it (see convert_to_matrix).
+    downloads_path is kept for backwards compatibility.
     """
+    disease_folder_name = disease_name_alias.lower().replace(' ', '_')
+    disease_directory   = Path(output_directory) / disease_folder_name
+    output_path         = disease_directory / f"{disease_folder_name}_{year}.csv"
 
-    temp_extract_path = downloads_path / "temp_extract"
-    temp_extract_path.mkdir(exist_ok=True)
-    
     with zipfile.ZipFile(latest_zip, 'r') as zip_ref:
-        zip_ref.extractall(temp_extract_path)
-    
-    # Find Data.csv and copy it with the new name
-    data_csv_path = temp_extract_path / "Data.csv"
-    if data_csv_path.exists():
-        # Create disease-specific directory
-        disease_folder_name = disease_name_alias.lower().replace(' ', '_')
-        disease_directory = os.path.join(output_directory, disease_folder_name)
-        os.makedirs(disease_directory, exist_ok=True)
-        
-        # Create filename and full path
-        output_filename = f"{disease_name_alias.lower().replace(' ', '_')}_{year}.csv"
-        output_path = os.path.join(disease_directory, output_filename)
-        
-        # Simply copy the file as-is
-        shutil.copy2(data_csv_path, output_path)
-        
-        # Clean up - remove the downloaded ZIP and temp folder
-        latest_zip.unlink()
-        shutil.rmtree(temp_extract_path)
-    
-    else:
-        raise FileNotFoundError("Data.csv not found in downloaded ZIP file")
+        if "Data.csv" not in zip_ref.namelist():
+            raise FileNotFoundError("Data.csv not found in downloaded ZIP file")
+
+        disease_directory.mkdir(parents=True, exist_ok=True)
+        with zip_ref.open("Data.csv") as data_csv:
+            write_atomic(data_csv, output_path)
+
+    convert_to_matrix(output_path)
+
+    # Clean up - remove the downloaded ZIP
+    latest_zip.unlink()
+    return output_path
+
+def split_multiyear_zip(latest_zip: Path,
+                       disease_name_alias: str,
+                       output_directory: Path,
+                       years: List[str]) -> List[Path]:
+    """
+    Splits the Data.csv of a multi-year export (year and week as rows) into the yearly files that move_zip
+    would have written, i.e. 'output_directory / {disease_name_alias} / {disease_name_alias}_{year}.csv'.
+    The yearly files have the exact layout of a single-year export: UTF-16, tab-separated and fully quoted,
+    with the week number as row label. If the row labels are not (year, week) or a year is missing,
+    MultiYearExportError is raised before any file is written.
+    """
+    disease_folder_name = disease_name_alias.lower().replace(' ', '_')
+    disease_directory   = Path(output_directory) / disease_folder_name
+    years               = [str(yy) for yy in years]
+
+    with zipfile.ZipFile(latest_zip, 'r') as zip_ref:
+        if "Data.csv" not in zip_ref.namelist():
+            raise FileNotFoundError("Data.csv not found in downloaded ZIP file")
+
+        with zip_ref.open("Data.csv") as data_csv:
+            reader = csv.reader(io.TextIOWrapper(data_csv, encoding='utf-16', newline=''), delimiter='\t')
+            header, colnames = next(reader), next(reader)
+            rows_per_year = {yy: [] for yy in years}
+            for row in reader:
+                match = re.match(r"^\s*(\d{4})\D+(\d{1,2})\s*$", row[0]) if row else None
+                if match is None:
+                    continue    # e.g. totals
+                yy, week = match.groups()
+                if yy in rows_per_year:
+                    rows_per_year[yy].append([week.zfill(2)] + row[1:])
+
+    missing = [yy for yy, rows in rows_per_year.items() if not rows]
+    if missing:
+        raise MultiYearExportError(f"No rows for year(s) {missing} found in multi-year export of {disease_name_alias}")
+    for yy, rows in rows_per_year.items():
+        weeks = [row[0] for row in rows]
+        if len(set(weeks)) != len(weeks) or not all('01' <= week <= '53' for week in weeks):
+            raise MultiYearExportError(f"Invalid weeks for {yy} in multi-year export of {disease_name_alias}: {weeks}")
+
+    disease_directory.mkdir(parents=True, exist_ok=True)
+    output_paths = []
+    for yy, rows in rows_per_year.items():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, delimiter='\t', quoting=csv.QUOTE_ALL, lineterminator='\r\n')
+        writer.writerow(["Week of notification"] + header[1:])
+        writer.writerows([colnames] + rows)
+
+        output_path = disease_directory / f"{disease_folder_name}_{yy}.csv"
+        write_atomic(io.BytesIO(buffer.getvalue().encode('utf-16')), output_path)
+        convert_to_matrix(output_path)
+        output_paths.append(output_path)
+
+    latest_zip.unlink()
+    return output_paths
+
+def convert_to_matrix(raw_file: Path):
+    """
+    Writes the compact (week x county) matrix of a raw yearly file, which preprocessing reads instead of the text file.
+    Failing to do so does not fail the scrape: preprocessing then falls back to the text file.
+    """
+    try:
+        convert_raw_file(raw_file)
+    except Exception as e:
+        print(f"⚠️ could not convert {raw_file.name} into a matrix, it will be preprocessed from text: {e}")
+
+def write_atomic(source: BinaryIO, output_path: Path):
+    """
+    Copies the stream source into output_path via a temporary file in the same directory, which is renamed into place.
+    """
+    output_path = Path(output_path)
+    fd, temp_path = tempfile.mkstemp(dir=output_path.parent, prefix=f".{output_path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as temp_file:
+            shutil.copyfileobj(source, temp_file, length=1 << 20)
+            temp_file.flush()
+            os.fsync(temp_file.fileno())
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, output_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
+
+def scrape_worker(worker_id: int,
+                  job_queue: ScrapeJobQueue,
+                  downloads_directory: Path,
+                  output_directory: Path,
+                  headless: bool = False,
+                  progress: Optional[tqdm] = None,
+                  backend: str = 'selenium',
+                  step_timings: Optional[List[Dict]] = None):
+    """
+    Works through the (disease_name_rki, disease_name_alias, year) jobs in the job_queue using its own
+    session (see open_session), e.g. one browser that is reused for all of its queries.
+    Each worker downloads into its own subdirectory of downloads_directory, such that move_zip
+    never picks up the survstat.zip of another worker. The step timings of the session are appended to step_timings.
+    A failing job is handed back to the job_queue, which schedules its retry; meanwhile the worker continues with other jobs.
+    If a job of several years cannot be exported in one query (MultiYearExportError), its years, and those of all
+    further jobs of the worker, are queried one at a time, each selecting a single year of notification.
+    """
+    worker_downloads = downloads_directory / "survstat_workers" / f"worker_{worker_id}"
+    worker_downloads.mkdir(parents=True, exist_ok=True)
+    remove_downloads_folder(worker_downloads)
+
+    multi_year = True       # until the page turns out not to offer the multi-year export
+    with open_session(backend, worker_downloads, headless=headless) as session:
+        while True:
+            job, wait = job_queue.claim()
+            if job is None:
+                if wait is None:
+                    break
+                time.sleep(min(wait, 5))    # only jobs waiting for a retry are left
+                continue
+
+            bug_name_rki, bug_name_alias, yy = job
+            try:
+                if isinstance(yy, list) and multi_year:
+                    try:
+                        zip = scraper(bug_name_rki, yy, worker_downloads, session=session)
+                        split_multiyear_zip(zip, bug_name_alias, output_directory, yy)
+                    except MultiYearExportError as e:
+                        print(f"⚠️ no multi-year export for {bug_name_alias}, querying one year at a time: {e}")
+                        remove_downloads_folder(worker_downloads)
+                        multi_year = False
+                if isinstance(yy, list) and not multi_year:
+                    for year in yy:
+                        move_zip(worker_downloads, scraper(bug_name_rki, year, worker_downloads, session=session), bug_name_alias, output_directory, year)
+                elif not isinstance(yy, list):
+                    move_zip(worker_downloads, scraper(bug_name_rki, yy, worker_downloads, session=session), bug_name_alias, output_directory, yy)
+            except Exception as e:
+                remove_downloads_folder(worker_downloads)
+                if not job_queue.fail(job, e) and progress is not None:
+                    progress.update(1)
+            else:
+                job_queue.complete(job)
+                if progress is not None:
+                    progress.update(1)
+
+        if step_timings is not None:
+            step_timings.extend(getattr(session, 'step_timings', []))
+
+    shutil.rmtree(worker_downloads, ignore_errors=True)
 
 def scrape_survstat_data(disease_names: Union[Dict, List, str], 
                          years:  Union[str, List[str], range, int], 
                          downloads_directory: Union[str, Path],
                          output_directory: Union[str, Path],
+                         n_workers: int = 1,
+                         headless: bool = False,
+                         backend: str = 'selenium',
+                         timings_path: Optional[Union[str, Path]] = None,
+                         years_per_query: int = 1,
+                         job_queue_path: Optional[Union[str, Path]] = None,
                          ):
     """
     Scrapes data from SurvStat for a specific disease and year.
@@ -301,18 +266,42 @@ def scrape_survstat_data(disease_names: Union[Dict, List, str],
         download-directory where .zip folders are introduced to the system.
     output_directory: Union[str, Path]
         Directory to save the data
+    n_workers: int
+        Number of browsers scraping in parallel. Each worker keeps its own browser and its own
+        download directory (downloads_directory / survstat_workers / worker_{i}).
+    headless: bool
+        Whether to run the browsers without a visible window.
+    backend: str
+        'selenium' (default) drives the SurvStat website in Chrome, 'http' sends the same query directly
+        over HTTP without a browser (requires the requests-library).
+    timings_path: Union[str, Path], optional
+        If given, the time spent in each query step (see SurvstatSession.step_timings) is written to this .csv-file.
+    years_per_query: int
+        Number of years selected in a single query. With more than one year, the export has year and week as rows
+        and is split into the usual yearly files (see split_multiyear_zip). A full backfill then takes one query
+        per disease instead of one per disease and year. If SurvStat offers no such export, the years are
+        queried one at a time instead.
+    job_queue_path: Union[str, Path], optional
+        SQLite file in which the jobs are kept (see ScrapeJobQueue), such that an interrupted run can be resumed.
     Examples:
     --------
     >>> scrape_survstat_data(disease_names=diseases_dict, 
     >>>                      years=str(current_year), 
     >>>                      output_directory=directories_dict['dir_data_raw'], 
-    >>>                      downloads_directory=directories_dict['dir_downloads'])
+    >>>                      downloads_directory=directories_dict['dir_downloads'],
+    >>>                      n_workers=4,
+    >>>                      headless=True)
 
     See also:
     ---------
+    run_scrape_jobs
+    scrape_worker
     remove_downloads_folder
     scraper
+    SurvstatSession
+    SurvstatHttpClient
     move_zip
+    split_multiyear_zip
     """
     # input validation
     if isinstance(years, int):
@@ -330,28 +319,107 @@ def scrape_survstat_data(disease_names: Union[Dict, List, str],
     if isinstance(disease_names, List):
         disease_names = {dd:dd for dd in disease_names}
 
-    # Handle downloads_path
-    if isinstance(downloads_directory, str):
-        downloads_directory = Path(downloads_directory)
-
-    if isinstance(output_directory, str):
-        output_directory = Path(output_directory)        
+    if years_per_query < 1:
+        raise ValueError(f"years_per_query should be at least 1, got {years_per_query}")
 
-    # Clearing up all survstat zip folders in the downloads folder
-    remove_downloads_folder(downloads_directory)    
+    # One job per (disease, year), or per (disease, chunk of years)
+    if years_per_query == 1:
+        year_chunks = years
+    else:
+        year_chunks = [years[ii:ii + years_per_query] for ii in range(0, len(years), years_per_query)]
+
+    jobs = [(bug_name_rki, bug_name_alias, yy) for bug_name_rki, bug_name_alias in disease_names.items() for yy in year_chunks]
+
+    run_scrape_jobs(jobs, downloads_directory, output_directory, n_workers=n_workers, headless=headless,
+                    backend=backend, timings_path=timings_path, job_queue_path=job_queue_path)
+
+def run_scrape_jobs(jobs: List[Tuple[str, str, Union[str, List[str]]]],
+                    downloads_directory: Union[str, Path],
+                    output_directory: Union[str, Path],
+                    n_workers: int = 1,
+                    headless: bool = False,
+                    backend: str = 'selenium',
+                    timings_path: Optional[Union[str, Path]] = None,
+                    job_queue_path: Optional[Union[str, Path]] = None,
+                    max_attempts: int = 3,
+                    retry_backoff: float = 30,
+                    ):
+    """
+    Scrapes a list of (disease_name_rki, disease_name_alias, year) jobs with a pool of n_workers workers.
+    The year of a job may also be a list of years, which are then scraped in one query.
+    See scrape_survstat_data for the other parameters.
 
-    # Decide whether to use tqdm for disease_names
-    bug_iter = tqdm(disease_names.items(), desc="Diseases") if len(disease_names) > 1 else disease_names.items()
-    # Inside the loop:
+    The jobs are kept in a ScrapeJobQueue. Failing jobs are retried with exponential backoff (starting at
+    retry_backoff seconds) up to max_attempts, without blocking the other jobs. If job_queue_path is given,
+    the queue is kept in that SQLite file: the jobs of a run that was interrupted are then resumed by the next
+    call that is given them again, with the attempts they already took. Only the given jobs are run, and only
+    those of them that were given up fail the call; other jobs in the file, of earlier runs, are left alone.
 
-    for bug_name_rki, bug_name_alias in bug_iter:
+    Examples:
+    --------
+    >>> run_scrape_jobs([('Keuchhusten', 'pertussis', '2025'), ('Masern', 'measles', '2024')],
+    >>>                 output_directory=directories_dict['dir_data_raw'],
+    >>>                 downloads_directory=directories_dict['dir_downloads'])
+    """
+    if backend not in ['selenium', 'http']:
+        raise ValueError(f"Invalid value for 'backend': {backend}. Please choose from ['selenium', 'http'].")
 
-        # Decide whether to use tqdm for years
-        year_iter = tqdm(years, desc=f"Years for {bug_name_alias}") if len(years) > 1 else years
-        for yy in year_iter:
-            # Downloading the data
-            zip = scraper(bug_name_rki, yy, downloads_directory)
+    if n_workers < 1:
+        raise ValueError(f"n_workers should be at least 1, got {n_workers}")
 
-            move_zip(downloads_directory, zip, bug_name_alias, output_directory, yy)
+    # Handle downloads_path
+    downloads_directory = Path(downloads_directory)
+    output_directory    = Path(output_directory)
+
+    # shared by all workers; without a path only for the duration of this run
+    temp_dir = None
+    if job_queue_path is None:
+        temp_dir = tempfile.TemporaryDirectory()
+        job_queue_path = Path(temp_dir.name) / "scrape_jobs.sqlite"
+
+    try:
+        job_queue = ScrapeJobQueue(job_queue_path, max_attempts=max_attempts, backoff=retry_backoff)
+        job_queue.enqueue(jobs)
+        n_recovered = job_queue.recover()
+        if n_recovered:
+            print(f"🔄 resuming {n_recovered} job(s) of an interrupted run")
+
+        n_jobs = job_queue.unfinished()
+        if n_jobs == 0:
+            print('✅ nothing to scrape')
+            return
+
+        # Clearing up all survstat zip folders in the downloads folder
+        remove_downloads_folder(downloads_directory)
+
+        n_workers = min(n_workers, n_jobs)
+        progress = tqdm(total=n_jobs, desc="Scraping") if n_jobs > 1 else None
+        step_timings = []
+
+        with ThreadPoolExecutor(max_workers=n_workers) as executor:
+            futures = [executor.submit(scrape_worker, ww, job_queue, downloads_directory, output_directory, headless, progress, backend, step_timings)
+                       for ww in range(n_workers)]
+            for future in futures:
+                future.result()
+
+        if progress is not None:
+            progress.close()
+
+        failed = job_queue.given_up()
+    finally:
+        if temp_dir is not None:
+            temp_dir.cleanup()
+
+    if step_timings:
+        from .survstat_session import summarize_step_timings, export_step_timings
+        slowest_step, slowest = next(iter(summarize_step_timings(step_timings).items()))
+        print(f"⏱️ slowest query step: {slowest_step} ({slowest['mean']:.1f}s on average, {slowest['retries']} retries)")
+        if timings_path is not None:
+            export_step_timings(step_timings, timings_path)
+
+    if failed:
+        failed_jobs = ", ".join(f"{alias} {yy if isinstance(yy, str) else yy[0] + '–' + yy[-1]} ({error})"
+                                for (_, alias, yy), error in failed)
+        raise RuntimeError(f"{len(failed)} of {n_jobs} scrape jobs failed: {failed_jobs}")
 
     print('✅ all data has been scraped')
\ No newline at end of file
@@ -0,0 +1,322 @@
+import csv
+import time
+import threading
+from functools import lru_cache
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Union
+from selenium import webdriver
+from selenium.common.exceptions import WebDriverException
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+from webdriver_manager.chrome import ChromeDriverManager
+from selenium.webdriver.chrome.service import Service
+from .downloads import snapshot_downloads, wait_for_download
+from .query_page import QUERY_URL, CONTROL_IDS, ROW_HIERARCHY, MULTI_YEAR_ROW_HIERARCHY, COL_HIERARCHY, COL_LEVEL, MultiYearExportError
+
+QUERY_STEPS = ['add_disease_filter', 'choose_disease', 'add_year_filter', 'choose_year',
+               'set_rows', 'set_cols', 'toggle_non_empty', 'download']
+
+# Selecting a value in a (chosen.js) select, the way the page itself does
+SET_SELECT_SCRIPT = """
+var select = document.getElementById(arguments[0]);
+select.value = arguments[1];
+select.dispatchEvent(new Event('change'));
+
+if (typeof $ !== 'undefined' && $(select).data('chosen')) {
+    $(select).trigger('chosen:updated');
+}
+"""
+
+# True once the page is loaded and no ASP.NET (UpdatePanel) or jQuery request is running
+PAGE_IDLE_SCRIPT = """
+if (document.readyState !== 'complete') { return false; }
+if (typeof Sys !== 'undefined' && Sys.WebForms && Sys.WebForms.PageRequestManager &&
+    Sys.WebForms.PageRequestManager.getInstance().get_isInAsyncPostBack()) { return false; }
+if (typeof jQuery !== 'undefined' && jQuery.active > 0) { return false; }
+return true;
+"""
+
+_chromedriver_lock = threading.Lock()
+
+@lru_cache(maxsize=None)
+def _install_chromedriver() -> str:
+    return ChromeDriverManager().install()
+
+def chromedriver_path() -> str:
+    """
+    Installs (or finds the cached) chromedriver once per run, also when called from several workers at once.
+    """
+    with _chromedriver_lock:
+        return _install_chromedriver()
+
+def init_driver(downloads_path: Path, headless: bool = False) -> webdriver.Chrome:
+    """
+    Initializes a Chrome browser that downloads into downloads_path.
+
+    Parameters:
+    ----------
+    downloads_path: Path
+        Directory into which the browser saves its downloads.
+    headless: bool
+        Whether to run Chrome without a visible window.
+    """
+    chrome_options = webdriver.ChromeOptions()
+
+    # Your existing preferences
+    prefs = {
+        "download.default_directory": str(downloads_path.absolute()),
+        "download.prompt_for_download": False,
+        "download.directory_upgrade": True,
+        "safebrowsing.enabled": True
+    }
+    chrome_options.add_experimental_option("prefs", prefs)
+
+    # Add these lines to suppress logs
+    chrome_options.add_argument("--log-level=3")  # Only errors, no info or warnings
+    chrome_options.add_experimental_option('excludeSwitches', ['enable-logging'])
+
+    if headless:
+        chrome_options.add_argument("--headless=new")
+        chrome_options.add_argument("--window-size=1920,1080")
+
+    return webdriver.Chrome(
+        service=Service(chromedriver_path()),
+        options=chrome_options
+    )
+
+class SurvstatSession:
+    """
+    A long-lived browser session on SurvStat that runs many queries in a row.
+    The browser is started once; between queries the query form is reset by reloading the
+    query page, instead of restarting Chrome. Use it as a context manager, such that the
+    browser is always torn down.
+
+    Parameters
+    ----------
+    downloads_path: Path
+        Directory into which the browser saves its downloads.
+    headless: bool
+        Whether to run Chrome without a visible window.
+    restart_every: int, optional
+        Restart the browser after this many queries, keeping memory flat during long backfills.
+        By default the browser is never restarted.
+    step_timeout: float
+        Maximum number of seconds each query step waits for the page to become ready.
+    retries: int
+        Number of attempts per query step.
+    backoff: float
+        Seconds to wait before the first retry of a step, doubling with every further retry.
+
+    Attributes
+    ----------
+    step_timings: List[Dict]
+        One record per executed query step: disease, year, step, seconds, attempts and ok.
+        See summarize_step_timings and export_step_timings.
+
+    Examples
+    --------
+    >>> with SurvstatSession(downloads_path) as session:
+    >>>     for yy in years:
+    >>>         zip = session.query('Keuchhusten', yy)
+    """
+    def __init__(self, downloads_path: Path, headless: bool = False, restart_every: Optional[int] = None,
+                 step_timeout: float = 10, retries: int = 3, backoff: float = 0.5):
+        self.downloads_path = Path(downloads_path)
+        self.headless       = headless
+        self.restart_every  = restart_every
+        self.step_timeout   = step_timeout
+        self.retries        = retries
+        self.backoff        = backoff
+        self.driver         = None
+        self.n_queries      = 0
+        self.step_timings   = []
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def start(self):
+        """Starts the browser, if not running already."""
+        if self.driver is None:
+            self.driver = init_driver(self.downloads_path, headless=self.headless)
+        return self
+
+    def close(self):
+        """Quits the browser."""
+        if self.driver is not None:
+            try:
+                self.driver.quit()
+            finally:
+                self.driver = None
+
+    def reset(self):
+        """Resets the query form by reloading the query page."""
+        if self.restart_every and self.n_queries and self.n_queries % self.restart_every == 0:
+            self.close()
+        self.start()
+        self.driver.get(QUERY_URL)
+
+    def query(self, disease: str, year: Union[str, List[str]]) -> Path:
+        """
+        Runs a single query for a given disease and year and downloads the result.
+        The query is run as a sequence of steps (see QUERY_STEPS). Each step waits for its own readiness
+        condition instead of a fixed sleep, is retried with exponential backoff, and is timed in step_timings.
+
+        If a list of years is given, all of them are selected in one query, with year and week as rows.
+        Such an export can be split into the yearly files with split_multiyear_zip. MultiYearExportError is raised
+        if the page does not offer those rows.
+
+        Returns
+        -------
+        Path
+            The downloaded survstat .zip
+        """
+        self.reset()
+        self.n_queries += 1
+        years = [str(year)] if isinstance(year, (str, int)) else [str(yy) for yy in year]
+        query = {'disease': disease, 'year': ",".join(years)}
+        row_hierarchy = ROW_HIERARCHY if len(years) == 1 else MULTI_YEAR_ROW_HIERARCHY
+
+        self._run_step('add_disease_filter', query, lambda: self._add_filter('Disease/ Pathogen'))
+        self._run_step('choose_disease',     query, lambda: self._choose_option(
+            "//select[@title='Reporting category by disease name']/following-sibling::div[contains(@class, 'chosen-container')]",
+            f"//li[contains(text(), '{disease}')]"))
+        self._run_step('add_year_filter',    query, lambda: self._add_filter('Year of notification'))
+        self._run_step('choose_year',        query, lambda: self._choose_years(years))
+        self._run_step('set_rows',           query, lambda: self._set_rows(row_hierarchy))
+        self._run_step('set_cols',           query, lambda: (self._set_select(CONTROL_IDS['col_hierarchy'], COL_HIERARCHY),
+                                                             self._set_select(CONTROL_IDS['col'], COL_LEVEL)))
+        self._run_step('toggle_non_empty',   query, self._toggle_non_empty)
+        return self._run_step('download',    query, self._download, retries=1)
+
+    def _run_step(self, step: str, query: Dict[str, str], action: Callable, retries: Optional[int] = None):
+        """
+        Runs action as step of the query, retrying with exponential backoff, and records how long it took.
+        """
+        retries = retries or self.retries
+        start   = time.perf_counter()
+        for attempt in range(1, retries + 1):
+            try:
+                result = action()
+                break
+            except WebDriverException as e:
+                if attempt == retries:
+                    self._record_step(step, query, start, attempt, ok=False)
+                    raise RuntimeError(f"Step '{step}' failed after {attempt} attempt(s) for {query}") from e
+                time.sleep(self.backoff * 2 ** (attempt - 1))
+
+        self._record_step(step, query, start, attempt, ok=True)
+        return result
+
+    def _record_step(self, step: str, query: Dict[str, str], start: float, attempts: int, ok: bool):
+        self.step_timings.append({**query, 'step': step, 'seconds': round(time.perf_counter() - start, 3),
+                                  'attempts': attempts, 'ok': ok})
+
+# Helpers - query steps
+    def _wait(self, condition: Callable, timeout: Optional[float] = None):
+        return WebDriverWait(self.driver, timeout or self.step_timeout, poll_frequency=0.1).until(condition)
+
+    def _wait_until_idle(self):
+        """Waits until the page is loaded and no (ASP.NET or jQuery) postback is running."""
+        self._wait(lambda driver: driver.execute_script(PAGE_IDLE_SCRIPT))
+
+    def _add_filter(self, feature: str):
+        """Adds a new filter row and sets it to filter on feature."""
+        self._wait_until_idle()
+
+        # a new filter row shows up as a 'Select an option' placeholder; when retrying, reuse the row added before
+        if not self._visible_placeholders():
+            self._wait(EC.element_to_be_clickable((By.XPATH, "//input[@title='Add']"))).click()
+
+        placeholder = self._wait(lambda driver: self._visible_placeholders() and self._visible_placeholders()[-1])
+        placeholder.click()
+        self._wait(EC.element_to_be_clickable((By.XPATH, f"//li[contains(text(), '{feature}')]"))).click()
+        self._wait_until_idle()
+
+    def _visible_placeholders(self) -> list:
+        return [element for element in self.driver.find_elements(By.XPATH, "//*[contains(text(), 'Select an option')]")
+                if element.is_displayed()]
+
+    def _choose_option(self, container_xpath: str, option_xpath: str):
+        """Opens a chosen.js dropdown and clicks one of its options."""
+        self._wait(EC.element_to_be_clickable((By.XPATH, container_xpath))).click()
+        self._wait(EC.element_to_be_clickable((By.XPATH, option_xpath))).click()
+        self._wait_until_idle()
+
+    def _choose_years(self, years: List[str]):
+        """Selects one or more years in the year filter, skipping the ones already chosen (e.g. when retrying)."""
+        container_xpath = "//span[text()='Year of notification']/../..//div[contains(@class, 'chosen-container')]"
+        for yy in years:
+            chosen = self.driver.find_elements(By.XPATH, f"{container_xpath}//li[contains(@class, 'search-choice')]/span[text()='{yy}']")
+            if not chosen:
+                self._choose_option(container_xpath, f"//li[text()='{yy}']")
+
+    def _set_select(self, element_id: str, value: str):
+        """Sets a (chosen.js) select to value and waits until the page has processed the change."""
+        self._wait(EC.presence_of_element_located((By.ID, element_id)))
+        self.driver.execute_script(SET_SELECT_SCRIPT, element_id, value)
+        self._wait(lambda driver: driver.execute_script(
+            "var el = document.getElementById(arguments[0]); return el !== null && el.value === arguments[1];", element_id, value))
+        self._wait_until_idle()
+
+    def _set_rows(self, row_hierarchy: str):
+        """Sets the row hierarchy, after checking that the page offers it (which is not retried)."""
+        self._wait(EC.presence_of_element_located((By.ID, CONTROL_IDS['row_hierarchy'])))
+        offered = self.driver.execute_script(
+            "return Array.from(document.getElementById(arguments[0]).options, function (option) { return option.value; });",
+            CONTROL_IDS['row_hierarchy'])
+        if row_hierarchy == MULTI_YEAR_ROW_HIERARCHY and row_hierarchy not in offered:
+            raise MultiYearExportError(f"'{row_hierarchy}' is not offered as row hierarchy")
+        self._set_select(CONTROL_IDS['row_hierarchy'], row_hierarchy)
+
+    def _toggle_non_empty(self):
+        """Includes zero values, so that there's no missing observations, i.e. empty rows/columns."""
+        self._wait_until_idle()
+        checkbox = self._wait(EC.element_to_be_clickable((By.ID, CONTROL_IDS['non_empty'])))
+        if not checkbox.is_selected():
+            checkbox.click()
+            self._wait(EC.element_located_to_be_selected((By.ID, CONTROL_IDS['non_empty'])))
+            self._wait_until_idle()
+
+    def _download(self) -> Path:
+        """Waits for the query result, clicks download and waits for the completed .zip."""
+        self._wait(EC.presence_of_element_located((By.ID, CONTROL_IDS['result_info'])), timeout=30)
+        download_button = self._wait(EC.element_to_be_clickable((By.ID, CONTROL_IDS['download'])))
+
+        # ignoring any survstat .zip that was already there
+        known_files = snapshot_downloads(self.downloads_path)
+        download_button.click()
+
+        return wait_for_download(self.downloads_path, known_files=known_files, timeout=30)
+
+
+def summarize_step_timings(step_timings: List[Dict]) -> Dict[str, Dict[str, float]]:
+    """
+    Summarizes step timings per step: number of runs, total, mean and max seconds, and total retries.
+    Steps are ordered by total time, so the first one is the step that dominates.
+    """
+    summary = {}
+    for timing in step_timings:
+        step = summary.setdefault(timing['step'], {'n': 0, 'total': 0.0, 'max': 0.0, 'retries': 0})
+        step['n']       += 1
+        step['total']   += timing['seconds']
+        step['max']      = max(step['max'], timing['seconds'])
+        step['retries'] += timing['attempts'] - 1
+
+    for step in summary.values():
+        step['mean'] = step['total'] / step['n']
+
+    return dict(sorted(summary.items(), key=lambda item: item[1]['total'], reverse=True))
+
+
+def export_step_timings(step_timings: List[Dict], path: Union[str, Path]):
+    """
+    Writes step timings to a .csv-file with columns disease, year, step, seconds, attempts and ok.
+    """
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=['disease', 'year', 'step', 'seconds', 'attempts', 'ok'])
+        writer.writeheader()
+        writer.writerows(step_timings)
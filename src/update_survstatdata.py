@@ -1,19 +1,24 @@
-from utils import *
-from survstat_collecting.survstat_scraper import scrape_survstat_data
-from survstat_collecting.casedata_processing import preprocess_survstat_data
+from utils import directories_dict, scraping_dict, processing_dict, read_log, log_script_run
+from survstat_collecting.scrape_planner import plan_scrape_jobs, plan_to_jobs, print_plan, record_scrape_results
 from datetime import datetime
+import argparse
 
-def main():
+def main(dry_run: bool = False):
     """
     This function calls all necessary functions to do the actual legwork.
-    By default, the data for current year is downloaded, and the already
-    existing disease data csv's are updated with this new file.
+    By default, only the raw yearly files that are missing or expected to
+    have changed are downloaded (see scrape_planner.plan_scrape_jobs), e.g.
+    the current year, and the already existing disease data csv's are
+    updated with these new files. Finally, the memory-mapped store with
+    all diseases is rebuilt.
 
     The diseases for which data is downloaded and processed are, by default,
     extracted from log.txt. Given the shear number of diseases in here, you
     can adjust the diseases by changing the variables here, or by adjusting
     log.txt. Do note that by default log.txt is updated depending on the
     diseases listed.
+
+    With dry_run, the planned scrape jobs are only listed.
     """
 
     current_year = datetime.now().year
@@ -24,20 +29,50 @@ def main():
 
     all_years = range(2001, current_year + 1)
 
-    scrape_survstat_data(disease_names=diseases_dict, 
-                         years=str(current_year), 
-                         output_directory=directories_dict['dir_data_raw'], 
-                         downloads_directory=directories_dict['dir_downloads'])
+    plan = plan_scrape_jobs(disease_names=diseases_dict,
+                            years=all_years,
+                            raw_data_dir=directories_dict['dir_data_raw'],
+                            policy=scraping_dict['freshness'])
+    print_plan(plan)
+
+    if dry_run:
+        return
+
+    # the scraping and processing libraries (selenium, pandas, ...) are only imported for an actual run
+    from survstat_collecting.survstat_scraper import run_scrape_jobs
+    from survstat_collecting.casedata_processing import preprocess_survstat_data
+    from survstat_collecting.case_store import CaseStore
+
+    run_scrape_jobs(plan_to_jobs(plan),
+                    output_directory=directories_dict['dir_data_raw'], 
+                    downloads_directory=directories_dict['dir_downloads'],
+                    n_workers=scraping_dict['n_workers'],
+                    headless=scraping_dict['headless'],
+                    backend=scraping_dict['backend'],
+                    job_queue_path=directories_dict['project_root'] / "scrape_jobs.sqlite")
+    record_scrape_results(plan, directories_dict['dir_data_raw'])
+
+    years_per_bug = {}
+    for job in plan:
+        years_per_bug.setdefault(job['disease_name_alias'], set()).add(job['year'])
 
-    preprocess_survstat_data(bugs=list(diseases_dict.values()), 
-                             years = str(current_year),
+    # all (bug, year) files in one pool of workers, rather than one pool per bug
+    preprocess_survstat_data(bugs=list(years_per_bug),
+                             years = {bug: sorted(years) for bug, years in years_per_bug.items()},
                              raw_data_dir=directories_dict['dir_data_raw'], 
                              processed_data_dir=directories_dict['dir_data_preprocessed'],
-                             how='update')
+                             how='update',
+                             n_workers=processing_dict['n_workers'])
 
-    
+    # one memory-mapped store with all diseases, for fast loading (see survstat_collecting/case_store.py)
+    CaseStore.build(directories_dict['dir_data_preprocessed'] / "case_store",
+                    bugs=list(diseases_dict.values()),
+                    processed_data_dir=directories_dict['dir_data_preprocessed'])
 
     log_script_run(diseases_dict, all_years)
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Scrapes and preprocesses the SurvStat data of the diseases in log.txt")
+    parser.add_argument("--dry-run", action="store_true", help="only list the (disease, year) combinations that would be scraped")
+    args = parser.parse_args()
+    main(dry_run=args.dry_run)
@@ -1,5 +1,18 @@
-from .dirs import directories_dict
-from .libs import *
-from .mappings import *
+from .dirs import directories_dict, scraping_dict, processing_dict
 from .logger import log_script_run, read_log
- 
\ No newline at end of file
+
+# The harmonization lookups (germany_harm.py, mappings.py) are only imported on first use. The plotting and data
+# libraries are no longer imported with utils; import them where they are used, or all at once with `from utils.libs import *`.
+MAPPING_NAMES = ['map_countynames_germany_de_eng', 'map_countynames_germany_eng_de', 'map_tokens_countynames_germany',
+                 'map_countynames_tokens_germany', 'map_tokens_bundeslaender_germany']
+__all__ = ['directories_dict', 'scraping_dict', 'processing_dict', 'log_script_run', 'read_log', 'germany_lookup', *MAPPING_NAMES]
+
+
+def __getattr__(name: str):
+    if name == 'germany_lookup':
+        from .germany_harm import germany_lookup
+        return germany_lookup
+    if name in MAPPING_NAMES:
+        from . import mappings
+        return getattr(mappings, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
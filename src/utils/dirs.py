@@ -45,4 +45,17 @@ directories_dict = {
     'dir_data_raw': get_path('raw_data_dir', project_root / 'data' / 'raw'),
     'dir_data_preprocessed': get_path('preprocessed_data_dir', project_root / 'data' / 'preprocessed'),
     'dir_data_harmonization': get_path('harmonization_dir', project_root / 'data' / 'harmonization'),
-}
\ No newline at end of file
+    'dir_cache': get_path('cache_dir', project_root / 'data' / 'cache'),
+}
+
+scraping_dict = {
+    'n_workers': int(config.get('scrape_workers', 1)),
+    'headless': bool(config.get('scrape_headless', False)),
+    'backend': config.get('scrape_backend', 'selenium'),
+    'freshness': config.get('scrape_freshness') or {},
+}
+
+processing_dict = {
+    'n_workers': int(config['preprocess_workers']) if config.get('preprocess_workers') else None,
+    'cache_max_bytes': int(float(config.get('cache_max_gb', 2)) * 1024**3),
+}
@@ -1,8 +1,96 @@
-from dataprocessor import DataProcessingOrchestrator
+import csv
+import hashlib
+from functools import lru_cache
+import numpy as np
 from .dirs import directories_dict
 
+# The German counties (Kreise) and Bundeslaender of harmfile_germany.tsv, as arrays in the row order of the file.
+# Reading the file through DataProcessingOrchestrator would import pandas and geopandas, so the columns are parsed
+# with csv and kept as a compiled copy next to the file (harmfile_germany.npz), keyed by the sha256 of the tsv:
+# a changed tsv is parsed again on first use. Nothing is read at import time, only by germany_lookup().
+HARMFILE_GERMANY = "harmfile_germany.tsv"
+HARM_COLUMNS     = ['kreis_token', 'kreis_name_de', 'kreis_name_eng', 'bundesland_name_de', 'bundesland_token']
 
-harmfile_germany_geography = DataProcessingOrchestrator(name='german_harmfile').import_data(
-    filename="harmfile_germany.tsv", separator = "\t",
-    directory=directories_dict['dir_data_harmonization']
-)
\ No newline at end of file
+
+class GermanyLookup:
+    """
+    The columns of harmfile_germany.tsv as arrays of str (see HARM_COLUMNS), tokens zero-padded as in the file, and
+    the lookups along name_eng -> name_de -> kreis_token -> bundesland_token.
+
+    Examples
+    --------
+    >>> lookup = germany_lookup()
+    >>> lookup.kreis_tokens(['City of Flensburg', 'City of München'])
+    array(['01001', '09162'], dtype='<U5')
+    >>> lookup.bundesland_tokens(['01001', '09162'])
+    array(['01', '09'], dtype='<U2')
+    """
+    def __init__(self, columns: dict):
+        self.kreis_token        = columns['kreis_token']
+        self.kreis_name_de      = columns['kreis_name_de']
+        self.kreis_name_eng     = columns['kreis_name_eng']
+        self.bundesland_name_de = columns['bundesland_name_de']
+        self.bundesland_token   = columns['bundesland_token']
+
+    def __repr__(self):
+        return f'GermanyLookup: {len(self.kreis_token)} Kreise in {len(np.unique(self.bundesland_token))} Bundeslaender'
+
+    def kreis_tokens(self, names_eng, default=None) -> np.ndarray:
+        """
+        The kreis_token of county names as used by SurvStat (English), i.e. name_eng -> name_de -> kreis_token.
+        Names without a match become default (by default the name itself).
+        """
+        names_de = self._lookup(names_eng, self.kreis_name_eng, self.kreis_name_de, None)
+        return self._lookup(names_de, self.kreis_name_de, self.kreis_token, default)
+
+    def bundesland_tokens(self, kreis_tokens, default=None) -> np.ndarray:
+        """The bundesland_token of kreis_tokens (zero-padded); tokens without a match become default (by default the token itself)."""
+        return self._lookup(kreis_tokens, self.kreis_token, self.bundesland_token, default)
+
+# Helpers - self
+    @staticmethod
+    def _lookup(values, keys: np.ndarray, targets: np.ndarray, default) -> np.ndarray:
+        values       = np.asarray(values, dtype=str)
+        # the last row of a key wins, as in dict(zip(keys, targets))
+        keys, last   = np.unique(keys[::-1], return_index=True)
+        targets      = targets[::-1][last]
+        positions    = np.clip(np.searchsorted(keys, values), 0, len(keys) - 1)
+        found        = keys[positions] == values
+        return np.where(found, targets[positions], values if default is None else default).astype(str)
+
+
+@lru_cache(maxsize=None)
+def germany_lookup() -> GermanyLookup:
+    """The harmfile as a GermanyLookup, from the compiled copy if it was compiled from the current tsv (see module comment)."""
+    tsv_path   = directories_dict['dir_data_harmonization'] / HARMFILE_GERMANY
+    cache_path = tsv_path.with_suffix('.npz')
+    with open(tsv_path, 'rb') as f:
+        source_hash = hashlib.sha256(f.read()).hexdigest()
+
+    try:
+        with np.load(cache_path, allow_pickle=False) as compiled:
+            if str(compiled['source_hash']) == source_hash:
+                return GermanyLookup({col: compiled[col] for col in HARM_COLUMNS})
+    except (OSError, KeyError, ValueError):
+        pass
+
+    with open(tsv_path, 'r', encoding='utf-8', newline='') as f:
+        rows = list(csv.DictReader(f, delimiter='\t'))
+    columns = {col: np.array([row[col] for row in rows], dtype=str) for col in HARM_COLUMNS}
+    try:
+        np.savez(cache_path, source_hash=np.array(source_hash), **columns)
+    except OSError:
+        pass        # e.g. a read-only checkout: parse the tsv every time
+    return GermanyLookup(columns)
+
+
+def __getattr__(name: str):
+    # the harmfile as a DataProcessingOrchestrator, read on first use only
+    if name == 'harmfile_germany_geography':
+        from dataprocessor import DataProcessingOrchestrator
+        globals()[name] = DataProcessingOrchestrator(name='german_harmfile').import_data(
+            filename=HARMFILE_GERMANY, separator = "\t",
+            directory=directories_dict['dir_data_harmonization']
+        )
+        return globals()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,84 @@
+import argparse
+import os
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+# Import time of the entry points, measured with `python -X importtime` in a fresh interpreter, and the heavy
+# libraries each of them should only import on demand. Cron runs and every worker process pay the import time
+# before any work starts, so a library that sneaks back into an import chain shows up here, e.g.
+#   python -m utils.importtime                          (from src; exits with 1 if a check fails)
+#   python -m utils.importtime update_survstatdata --budget-ms 300 --top 10
+SRC_DIR        = Path(__file__).parent.parent
+HEAVY_MODULES  = ['selenium', 'webdriver_manager', 'geopandas', 'shapely', 'matplotlib', 'pandas', 'pyarrow', 'tqdm', 'requests']
+# entry point: the libraries of HEAVY_MODULES it may import
+ALLOWED_IMPORTS = {
+    'utils':                                   [],
+    'update_survstatdata':                     [],
+    'survstat_collecting.scrape_planner':      [],
+    'survstat_collecting.survstat_scraper':    ['tqdm'],
+    'survstat_collecting.casedata_processing': ['pandas', 'pyarrow', 'tqdm'],
+    'survstat_collecting.case_store':          ['pandas', 'pyarrow'],
+    'dataprocessor':                           ['pandas', 'pyarrow'],
+}
+
+
+def measure_import(module: str) -> Tuple[float, Dict[str, float]]:
+    """
+    Imports module in a fresh interpreter with -X importtime, from the project root as the scripts are run.
+
+    Returns
+    -------
+    Tuple[float, Dict[str, float]]
+        The total import time of module in ms, and the cumulative import time in ms of every module imported with it.
+    """
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [str(SRC_DIR), os.environ.get('PYTHONPATH')])))
+    run = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'], cwd=SRC_DIR.parent, env=env,
+                         capture_output=True, text=True)
+    if run.returncode != 0:
+        raise RuntimeError(f'importing {module} failed:\n{run.stderr.strip().splitlines()[-1]}')
+
+    # the modules imported by a top-level import are listed (indented) before it; skip those of the interpreter startup
+    imported = {}
+    for line in run.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line.split('|')
+        imported[name.strip()] = int(cumulative) / 1000
+        if name[:2] != '  ':
+            if name.strip() == module:
+                return imported[module], imported
+            imported = {}
+    return 0.0, imported
+
+
+def check_import(module: str, budget_ms: Optional[float] = None, top: int = 0) -> List[str]:
+    """Measures the import of module and prints it. Returns the failed checks: heavy libraries it should not import, and exceeding budget_ms."""
+    try:
+        total, imported = measure_import(module)
+    except RuntimeError as e:
+        print(f"⚠️ {e}")
+        return [f'{module} cannot be imported']
+    heavy    = sorted({name.split('.')[0] for name in imported} & set(HEAVY_MODULES))
+    failures = [f'{module} imports {lib}' for lib in heavy if lib not in ALLOWED_IMPORTS.get(module, HEAVY_MODULES)]
+    if budget_ms is not None and total > budget_ms:
+        failures.append(f'{module} takes {total:.0f} ms to import (budget: {budget_ms:.0f} ms)')
+
+    print(f"{'✅' if not failures else '⚠️'} {module}: {total:.0f} ms{', imports ' + ', '.join(heavy) if heavy else ''}")
+    for name, ms in sorted(imported.items(), key=lambda item: item[1], reverse=True)[1:top + 1]:
+        print(f"    {ms:8.1f} ms  {name}")
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measures the import time of the entry points and checks that heavy libraries are only imported on demand")
+    parser.add_argument("modules", nargs="*", default=list(ALLOWED_IMPORTS), help="modules to import (default: all entry points)")
+    parser.add_argument("--budget-ms", type=float, default=None, help="maximum import time per module, in ms")
+    parser.add_argument("--top", type=int, default=0, help="also list the modules that take longest to import")
+    args = parser.parse_args()
+
+    failures = [failure for module in args.modules for failure in check_import(module, args.budget_ms, args.top)]
+    for failure in failures:
+        print(f"⚠️ {failure}")
+    sys.exit(1 if failures else 0)
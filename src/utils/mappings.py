@@ -1,9 +1,24 @@
-from .germany_harm import harmfile_germany_geography
+from .germany_harm import germany_lookup
 
-map_countynames_germany_de_eng = dict(zip(harmfile_germany_geography.df["kreis_name_de"], harmfile_germany_geography.df["kreis_name_eng"]))
+# The mappings of harmfile_germany.tsv as dicts, each built on first use (see germany_harm.germany_lookup).
+# As before, kreis_token are ints here; to map whole columns, use the arrays of germany_lookup() instead.
+MAPPINGS = {
+    'map_countynames_germany_de_eng':   ('kreis_name_de', 'kreis_name_eng'),
+    'map_countynames_germany_eng_de':   ('kreis_name_eng', 'kreis_name_de'),
+    'map_tokens_countynames_germany':   ('kreis_token', 'kreis_name_eng'),
+    'map_countynames_tokens_germany':   ('kreis_name_de', 'kreis_token'),
+    'map_tokens_bundeslaender_germany': ('kreis_token', 'bundesland_name_de'),
+}
+__all__ = list(MAPPINGS)
 
-map_countynames_germany_eng_de = dict(zip(harmfile_germany_geography.df["kreis_name_eng"], harmfile_germany_geography.df["kreis_name_de"]))
 
-map_tokens_countynames_germany = dict(zip(harmfile_germany_geography.df["kreis_token"], harmfile_germany_geography.df["kreis_name_eng"]))
-
-map_countynames_tokens_germany = dict(zip(harmfile_germany_geography.df["kreis_name_de"], harmfile_germany_geography.df["kreis_token"]))
\ No newline at end of file
+def __getattr__(name: str):
+    if name not in MAPPINGS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    from_column, to_column = MAPPINGS[name]
+    lookup = germany_lookup()
+    keys   = getattr(lookup, from_column)
+    values = getattr(lookup, to_column)
+    globals()[name] = dict(zip(keys.astype(int).tolist() if from_column == 'kreis_token' else keys.tolist(),
+                               values.astype(int).tolist() if to_column == 'kreis_token' else values.tolist()))
+    return globals()[name]
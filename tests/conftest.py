@@ -0,0 +1,20 @@
+import sys
+from pathlib import Path
+
+# the packages live in src and are imported from there, as by the scripts; run pytest from the project root,
+# where the paths of config.yaml are relative to
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+import pytest
+
+
+@pytest.fixture
+def fixture_session(monkeypatch):
+    """Makes the scrape workers query the SurvstatFixture given to the returned function, over HTTP."""
+    from survstat_collecting import survstat_scraper
+    from survstat_collecting.survstat_http import SurvstatHttpClient
+
+    def use(fixture):
+        monkeypatch.setattr(survstat_scraper, 'open_session',
+                            lambda backend, downloads_path, headless=False: SurvstatHttpClient(downloads_path, base_url=fixture.url))
+    return use
@@ -0,0 +1,160 @@
+import html
+import io
+import threading
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs
+from survstat_collecting.query_page import CONTROL_IDS, ROW_HIERARCHY, MULTI_YEAR_ROW_HIERARCHY, COL_HIERARCHY, COL_LEVEL
+
+# A local stand-in for the SurvStat query page (Create.aspx), to run the HTTP backend against. Like the ASP.NET page,
+# it keeps no state of its own: every postback re-renders the page from the submitted form, 'Add' appends a filter
+# row, choosing a filter category fills in the select of its values, and the download button returns the export
+# as survstat.zip with Data.csv, or an error page if the query is not complete.
+FIXTURE_DIR = Path(__file__).parent / "fixtures" / "survstat"
+CATEGORIES  = {'Disease': 'Disease/ Pathogen', 'Year': 'Year of notification'}
+SELECTED    = ' selected="selected"'
+NAMES       = {key: f"ctl00$ContentPlaceHolderMain${key}" for key in ['row_hierarchy', 'col_hierarchy', 'col', 'non_empty', 'download']}
+
+
+class SurvstatFixture:
+    """
+    Serves the query page on a free local port, with the exports in exports: (disease, (year, ...)): Data.csv as bytes.
+    With multi_year=False, MULTI_YEAR_ROW_HIERARCHY is not offered as row hierarchy.
+
+    Examples
+    --------
+    >>> with SurvstatFixture({('Campylobacteriosis', ('2001',)): data_csv}) as fixture:
+    >>>     http_scraper('Campylobacteriosis', '2001', downloads_path, session=SurvstatHttpClient(downloads_path, base_url=fixture.url))
+    """
+    def __init__(self, exports: Dict[Tuple[str, Tuple[str, ...]], bytes], diseases: Optional[List[str]] = None,
+                 years: Optional[List[str]] = None, multi_year: bool = True):
+        self.exports    = exports
+        self.diseases   = diseases or sorted({disease for disease, _ in exports} | {'Campylobacter jejuni', 'Measles'})
+        self.years      = years or [str(yy) for yy in range(2001, 2026)]
+        self.multi_year = multi_year
+        self.requests   = []            # (method, pressed button or event target)
+        self.downloads  = []            # (disease, years, row hierarchy) of every download
+        self.server     = None
+
+    def __enter__(self):
+        handler     = type('Handler', (_Handler,), {'fixture': self})
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.server.shutdown()
+        self.server.server_close()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_address[1]}/Content/Query/Create.aspx"
+
+    def page(self, form: Dict[str, List[str]]) -> str:
+        """The query page for the submitted form."""
+        n_filters = int(_value(form, '__VIEWSTATE') or 0)
+        rows      = []
+        for ii in range(n_filters):
+            category = _value(form, f'FilterCategory{ii}')
+            rows.append(_select(f'FilterCategory{ii}', [('', '')] + list(CATEGORIES.items()), [category]))
+            if category == 'Disease':
+                rows.append(_select(f'FilterValue{ii}', [('', '')] + [(dd, dd) for dd in self.diseases], form.get(f'FilterValue{ii}', []),
+                                    title='Reporting category by disease name'))
+            elif category == 'Year':
+                rows.append(_select(f'FilterValues{ii}', [(f'[ReportingDate].[Year].&[{yy}]', yy) for yy in self.years],
+                                    form.get(f'FilterValues{ii}', []), multiple=True))
+            rows.append(f'<input type="submit" name="ButtonAdd{ii + 1}" value="+" title="Add" />')
+        if not rows:
+            rows.append('<input type="submit" name="ButtonAdd0" value="+" title="Add" />')
+
+        row_options = ['[ReportingDate].[Year]', ROW_HIERARCHY] + ([MULTI_YEAR_ROW_HIERARCHY] if self.multi_year else [])
+        col_options = ['[AlterPerson80].[AgeGroupName8]', COL_HIERARCHY]
+        col_levels  = [COL_LEVEL] if _value(form, NAMES['col_hierarchy']) == COL_HIERARCHY else ['[AlterPerson80].[AgeGroupName8].[AgeGroupName8]']
+        non_empty   = ' checked="checked"' if _value(form, NAMES['non_empty']) == 'on' else ''
+        return "\n".join([
+            '<html><body><form method="post" action="./Create.aspx">',
+            f'<input type="hidden" name="__VIEWSTATE" value="{n_filters}" />',
+            *rows,
+            _select(NAMES['row_hierarchy'], [(oo, oo) for oo in row_options], form.get(NAMES['row_hierarchy'], []), id=CONTROL_IDS['row_hierarchy']),
+            _select(NAMES['col_hierarchy'], [(oo, oo) for oo in col_options], form.get(NAMES['col_hierarchy'], []), id=CONTROL_IDS['col_hierarchy']),
+            _select(NAMES['col'], [(oo, oo) for oo in col_levels], form.get(NAMES['col'], []), id=CONTROL_IDS['col']),
+            f'<input type="checkbox" name="{NAMES["non_empty"]}" id="{CONTROL_IDS["non_empty"]}"{non_empty} />',
+            f'<span id="{CONTROL_IDS["result_info"]}"></span>',
+            f'<input type="submit" name="{NAMES["download"]}" value="Download" id="{CONTROL_IDS["download"]}" />',
+            '</form></body></html>',
+        ])
+
+    def export(self, form: Dict[str, List[str]]) -> Optional[bytes]:
+        """survstat.zip of the query in the submitted form, or None if the query is not complete."""
+        n_filters = int(_value(form, '__VIEWSTATE') or 0)
+        disease, years = None, []
+        for ii in range(n_filters):
+            if _value(form, f'FilterCategory{ii}') == 'Disease':
+                disease = _value(form, f'FilterValue{ii}')
+            elif _value(form, f'FilterCategory{ii}') == 'Year':
+                years = [value.rsplit('[', 1)[1].rstrip(']') for value in form.get(f'FilterValues{ii}', [])]
+
+        row_hierarchy = _value(form, NAMES['row_hierarchy'])
+        expected_rows = ROW_HIERARCHY if len(years) == 1 else MULTI_YEAR_ROW_HIERARCHY
+        if (row_hierarchy != expected_rows or _value(form, NAMES['col_hierarchy']) != COL_HIERARCHY
+                or _value(form, NAMES['col']) != COL_LEVEL or _value(form, NAMES['non_empty']) != 'on'):
+            return None
+        data_csv = self.exports.get((disease, tuple(years)))
+        if data_csv is None:
+            return None
+
+        self.downloads.append((disease, tuple(years), row_hierarchy))
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
+            zip_file.writestr("Data.csv", data_csv)
+            zip_file.writestr("Info.txt", "SurvStat@RKI 2.0 (fixture)")
+        return buffer.getvalue()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    fixture = None
+
+    def do_GET(self):
+        self.fixture.requests.append(('GET', None))
+        self._respond(self.fixture.page({}).encode('utf-8'), 'text/html; charset=utf-8')
+
+    def do_POST(self):
+        form = parse_qs(self.rfile.read(int(self.headers['Content-Length'])).decode('utf-8'), keep_blank_values=True)
+        if NAMES['download'] in form:
+            self.fixture.requests.append(('POST', NAMES['download']))
+            content = self.fixture.export(form)
+            if content is None:
+                return self._respond(b'<html><body>Error: the query could not be exported.</body></html>', 'text/html; charset=utf-8')
+            return self._respond(content, 'application/zip')
+
+        pressed = [name for name in form if name.startswith('ButtonAdd')]
+        self.fixture.requests.append(('POST', pressed[0] if pressed else _value(form, '__EVENTTARGET')))
+        if pressed:
+            form['__VIEWSTATE'] = [str(int(_value(form, '__VIEWSTATE') or 0) + 1)]
+        self._respond(self.fixture.page(form).encode('utf-8'), 'text/html; charset=utf-8')
+
+    def _respond(self, content: bytes, content_type: str):
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        pass
+
+
+# Helpers
+def _value(form: Dict[str, List[str]], name: str) -> Optional[str]:
+    values = form.get(name)
+    return values[-1] if values else None
+
+
+def _select(name: str, options: List[Tuple[str, str]], selected: List[str], title: Optional[str] = None, id: Optional[str] = None,
+            multiple: bool = False) -> str:
+    attrs = f' name="{name}"' + (f' id="{id}"' if id else '') + (f' title="{html.escape(title)}"' if title else '') + (' multiple="multiple"' if multiple else '')
+    items = "".join(f'<option value="{html.escape(value)}"{SELECTED if value in selected else ""}>{html.escape(text)}</option>'
+                    for value, text in options)
+    return f'<select{attrs}>{items}</select>'
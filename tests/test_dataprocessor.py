@@ -0,0 +1,180 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from dataprocessor import DataProcessingOrchestrator, PipelineCache
+from dataprocessor.filtering import apply_condition
+from dataprocessor.partitioned_store import read_partitions
+from dataprocessor.query_plan import optimize_plan
+from dataprocessor.secondary_index import read_indexed
+
+COUNTIES = [f"{kz:05d}" for kz in range(9161, 9221)]
+DTYPES   = {'kz_kreis': 'str', 'year': 'str'}
+
+# The lazy plans (query_plan.py), the pushdown into import_data, streaming (streaming.py), the secondary index
+# (secondary_index.py) and the cache (cache.py) only change how a pipeline is run, never its result: each is
+# compared with the eager pipeline here.
+
+
+@pytest.fixture(scope='module')
+def data_dir(tmp_path_factory):
+    directory = tmp_path_factory.mktemp("data")
+    rng       = np.random.default_rng(1)
+    years     = ['2001', '2002', '2003']
+    df = pd.DataFrame({'week':     np.tile(np.repeat(np.arange(1, 53), len(COUNTIES)), len(years)),
+                       'kz_kreis': np.tile(COUNTIES, 52 * len(years)),
+                       'cases':    rng.poisson(2, 52 * len(COUNTIES) * len(years)).astype('int32'),
+                       'year':     np.repeat(years, 52 * len(COUNTIES))})
+    df.to_csv(directory / "cases.csv", index=False)
+    (DataProcessingOrchestrator(df.astype({'kz_kreis': 'category'}), name = 'cases')
+     .save_data(filename = "cases.parquet", directory = str(directory), partition_by = 'year', index_by = ['kz_kreis', 'year']))
+    return directory
+
+
+def _import(processor, data_dir, extension, **kwargs):
+    if extension == 'csv':
+        return processor.import_data(filename = "cases.csv", directory = str(data_dir), dtype_dict = DTYPES, **kwargs)
+    return processor.import_data(filename = "cases.parquet", directory = str(data_dir), **kwargs)
+
+
+PIPELINES = {
+    'filter_select': lambda processor: (processor.filter(conditions = [('year', '2002', '==')])
+                                        .select(colnames = ['week', 'cases'])),
+    'rename_filter': lambda processor: (processor.rename_cols({'cases': 'n'})
+                                        .filter(conditions = [('kz_kreis', COUNTIES[:3], 'in'), ('n', 2, '>')])),
+    'replace_filter': lambda processor: (processor.change_dtype({'kz_kreis': 'str'})
+                                         .replace('kz_kreis', {COUNTIES[0]: 'Eichstätt'})
+                                         .filter(conditions = [('kz_kreis', 'Eichstätt', '=='), ('week', 50, '>=')], logic = 'or')),
+    'mutate_filter': lambda processor: (processor.mutate('weekly', value = 'cases', operation = 'x * 7')
+                                        .filter(conditions = [('weekly', 14, '<'), ('year', '2003', '!=')])),
+    'groupby': lambda processor: (processor.filter(conditions = [('week', 10, '<=')])
+                                  .groupby(groupby_columns = ['year', 'kz_kreis'], aggregations = {'cases': 'sum'})),
+}
+
+
+def _run(data_dir, extension, pipeline, **kwargs) -> pd.DataFrame:
+    processor = PIPELINES[pipeline](_import(DataProcessingOrchestrator(name = 'cases', **kwargs), data_dir, extension))
+    return processor.collect().df
+
+
+def _as_eager(df: pd.DataFrame) -> pd.DataFrame:
+    # a categorical kz_kreis read from parquet keeps its categories, whether or not all of them are left
+    return df.apply(lambda col: col.astype(str) if isinstance(col.dtype, pd.CategoricalDtype) else col)
+
+
+@pytest.mark.parametrize('extension', ['csv', 'parquet'])
+@pytest.mark.parametrize('pipeline', list(PIPELINES))
+def test_lazy_equals_eager(data_dir, extension, pipeline):
+    eager = _run(data_dir, extension, pipeline)
+    lazy  = _run(data_dir, extension, pipeline, lazy = True)
+    pd.testing.assert_frame_equal(_as_eager(lazy), _as_eager(eager))
+
+
+@pytest.mark.parametrize('extension', ['csv', 'parquet'])
+@pytest.mark.parametrize('pipeline', list(PIPELINES))
+@pytest.mark.parametrize('chunksize', [1000, 100000])
+def test_streaming_equals_eager(data_dir, extension, pipeline, chunksize):
+    eager    = _run(data_dir, extension, pipeline)
+    streamed = _run(data_dir, extension, pipeline, chunksize = chunksize)
+    pd.testing.assert_frame_equal(_as_eager(streamed), _as_eager(eager), check_categorical = False)
+
+
+@pytest.mark.parametrize('extension', ['csv', 'parquet'])
+@pytest.mark.parametrize('filters', [[('year', '2002', '==')], [('kz_kreis', COUNTIES[5], '=='), ('cases', 3, '>=')],
+                                     [('kz_kreis', COUNTIES[:2], 'in'), ('year', '2001', '!=')], [('cases', 0, '==')],
+                                     [('cases', 'none', '==')]])
+def test_pushed_down_filters_equal_post_filters(data_dir, extension, filters):
+    pushed = _import(DataProcessingOrchestrator(name = 'cases'), data_dir, extension, filters = filters)
+    post   = _import(DataProcessingOrchestrator(name = 'cases'), data_dir, extension).filter(conditions = filters)
+    pd.testing.assert_frame_equal(_as_eager(pushed.df), _as_eager(post.df))
+
+    lazy = _import(DataProcessingOrchestrator(name = 'cases', lazy = True), data_dir, extension).filter(conditions = filters)
+    plan = optimize_plan(lazy._pending_steps())
+    assert [next(iter(step)) for step in plan] == ['import_data']
+    assert plan[0]['import_data']['filters'] == filters
+
+
+@pytest.mark.parametrize('extension', ['csv', 'parquet'])
+def test_filters_are_applied_once(data_dir, extension, monkeypatch):
+    from dataprocessor import dataprocessor, partitioned_store
+    calls = []
+    for module in [dataprocessor, partitioned_store]:
+        monkeypatch.setattr(module, 'apply_condition', lambda df, conditions, *args, apply = module.apply_condition, **kwargs:
+                            calls.append(conditions) or apply(df, conditions, *args, **kwargs))
+
+    filters = [('kz_kreis', COUNTIES[:30], 'in'), ('year', '2001', '!='), ('cases', 2, '>')]
+    df = _import(DataProcessingOrchestrator(name = 'cases'), data_dir, extension, filters = filters).df
+    assert len(df) > 0
+    # a csv is filtered per chunk (one chunk here); the scan of a parquet leaves '!=' to pandas
+    assert calls == [filters] if extension == 'csv' else calls == [[('year', '2001', '!=')]]
+
+
+@pytest.mark.parametrize('filters', [[('kz_kreis', COUNTIES[7], '==')], [('kz_kreis', COUNTIES[:3], 'in'), ('year', '2002', '>=')],
+                                     [('year', '2003', '=='), ('kz_kreis', COUNTIES[10:12], 'in')]])
+@pytest.mark.parametrize('columns', [None, ['week', 'cases']])
+def test_index_lookup_equals_full_scan(data_dir, filters, columns):
+    path    = str(data_dir / "cases.parquet")
+    indexed = read_indexed(path, filters, columns = None)
+    assert indexed is not None
+    scanned = read_partitions(path)
+    indexed = indexed[apply_condition(indexed, filters)].reset_index(drop = True)
+    scanned = scanned[apply_condition(scanned, filters)].reset_index(drop = True)
+    pd.testing.assert_frame_equal(_as_eager(indexed), _as_eager(scanned))
+
+    imported = DataProcessingOrchestrator(name = 'cases').import_data(filename = "cases.parquet", directory = str(data_dir),
+                                                                       columns = columns, filters = filters).df
+    expected = scanned if columns is None else scanned[columns]
+    pd.testing.assert_frame_equal(_as_eager(imported), _as_eager(expected))
+
+
+@pytest.mark.parametrize('pipeline', ['rename_filter', 'groupby'])
+def test_cache_hit_equals_miss(data_dir, tmp_path, pipeline):
+    cache = PipelineCache(tmp_path / "cache")
+    miss  = _run(data_dir, 'parquet', pipeline, cache = cache)
+    assert len(cache.entries()) == 1
+
+    def fail(*args, **kwargs):
+        raise AssertionError("the pipeline was run instead of loaded")
+    hit_processor = PIPELINES[pipeline](_import(DataProcessingOrchestrator(name = 'cases', cache = cache), data_dir, 'parquet'))
+    hit_processor.import_data = fail
+    hit = hit_processor.collect().df
+    pd.testing.assert_frame_equal(hit, miss)
+    pd.testing.assert_frame_equal(_as_eager(hit), _as_eager(_run(data_dir, 'parquet', pipeline)))
+
+
+def test_cache_misses_for_changed_input(data_dir, tmp_path):
+    directory = tmp_path / "data"
+    directory.mkdir()
+    (directory / "cases.csv").write_bytes((data_dir / "cases.csv").read_bytes())
+    cache  = PipelineCache(tmp_path / "cache")
+    before = _run(directory, 'csv', 'groupby', cache = cache)
+
+    df = pd.read_csv(directory / "cases.csv", dtype = DTYPES)
+    df.loc[0, 'cases'] += 100
+    df.to_csv(directory / "cases.csv", index = False)
+    os.utime(directory / "cases.csv", ns = (0, os.stat(directory / "cases.csv").st_mtime_ns + 10**9))
+    after = _run(directory, 'csv', 'groupby', cache = cache)
+    assert after['cases'].sum() == before['cases'].sum() + 100
+    assert len(cache.entries()) == 2
+
+
+@pytest.mark.parametrize('step', [{'mutate': {'colname': 'weekly', 'value': 'cases', 'operation': lambda x: x * 7}},
+                                  # pandas shortens the repr of long categoricals, so two that differ in the middle would look the same
+                                  {'filter': {'conditions': [('kz_kreis', pd.Categorical(COUNTIES * 10), 'in')]}}])
+def test_cache_skips_arguments_without_canonical_form(data_dir, tmp_path, step):
+    cache = PipelineCache(tmp_path / "cache")
+    assert cache.key([{'import_data': {'filename': "cases.csv", 'directory': str(data_dir)}}]) is not None
+    assert cache.key([{'import_data': {'filename': "cases.csv", 'directory': str(data_dir)}}, step]) is None
+
+
+def test_cache_hashes_contents(data_dir, tmp_path):
+    directory = tmp_path / "data"
+    directory.mkdir()
+    (directory / "cases.csv").write_bytes((data_dir / "cases.csv").read_bytes())
+    steps   = [{'import_data': {'filename': "cases.csv", 'directory': str(directory)}}]
+    hashing = PipelineCache(tmp_path / "cache", hash_contents = True)
+    before  = [hashing.key(steps), PipelineCache(tmp_path / "cache").key(steps)]
+
+    os.utime(directory / "cases.csv", ns = (0, os.stat(directory / "cases.csv").st_mtime_ns + 10**9))
+    after = [hashing.key(steps), PipelineCache(tmp_path / "cache").key(steps)]
+    assert after[0] == before[0] and after[1] != before[1]
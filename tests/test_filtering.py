@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+import pytest
+from dataprocessor.filtering import CompiledFilter, apply_condition, compile_conditions
+
+
+@pytest.fixture
+def df():
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({'week': rng.integers(1, 53, 5000), 'kz_kreis': pd.Categorical(rng.choice(['09162', '11000', '05315'], 5000)),
+                         'cases': rng.integers(0, 10, 5000)})
+
+
+def test_values_with_the_same_repr_are_told_apart(df):
+    first, second = np.arange(2000), np.arange(2000)
+    second[5]     = -1          # first and second share their (abbreviated) repr
+    assert repr(first) == repr(second)
+    assert compile_conditions([('week', first, 'in')]) is not compile_conditions([('week', second, 'in')])
+    assert apply_condition(df, [('week', first, 'in')]).all()
+    pd.testing.assert_series_equal(apply_condition(df, [('week', second, 'in')]), df['week'] != 5, check_names=False)
+
+
+def test_compiled_filter_is_cached_and_not_changed(df):
+    values   = ['09162', '11000']
+    compiled = compile_conditions([('kz_kreis', values, 'in'), ('cases', 5, '>')])
+    assert compile_conditions([('kz_kreis', ['09162', '11000'], 'in'), ('cases', 5, '>')]) is compiled
+    assert compile_conditions([('kz_kreis', ('09162', '11000'), 'in'), ('cases', 5, '>')]) is not compiled
+
+    values.append('05315')          # the compiled filter keeps the values it was compiled with
+    expected = df['kz_kreis'].isin(['09162', '11000']) & (df['cases'] > 5)
+    pass_rates = compiled.initial_pass_rates()
+    for _ in range(2):
+        pd.testing.assert_series_equal(compiled(df, pass_rates), expected, check_names=False)
+    assert pass_rates == pytest.approx([expected.sum() / (df['cases'] > 5).sum(), (df['cases'] > 5).mean()])
+    assert compiled.initial_pass_rates() == [0.3, 0.5]
+
+
+def test_values_without_a_key_are_not_cached(df):
+    value = object()
+    assert compile_conditions([('cases', value, '==')]) is not compile_conditions([('cases', value, '==')])
+    assert apply_condition(df, [('cases', value, '==')]).sum() == 0
+
+
+@pytest.mark.parametrize('logic', ['and', 'or'])
+def test_compiled_filter_equals_one_mask_per_condition(df, logic):
+    conditions = [('week', 10, '<='), ('kz_kreis', '11000', '!='), ('cases', [0, 1, 2], 'in'), ('kz_kreis', '16', 'contains')]
+    masks      = [df['week'] <= 10, df['kz_kreis'] != '11000', df['cases'].isin([0, 1, 2]), df['kz_kreis'].str.contains('16')]
+    expected   = np.logical_and.reduce(masks) if logic == 'and' else np.logical_or.reduce(masks)
+    np.testing.assert_array_equal(CompiledFilter(conditions, logic)(df).to_numpy(), np.asarray(expected))
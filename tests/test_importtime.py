@@ -0,0 +1,7 @@
+import pytest
+from utils.importtime import ALLOWED_IMPORTS, check_import
+
+
+@pytest.mark.parametrize('module', list(ALLOWED_IMPORTS))
+def test_entry_point_imports_no_heavy_libraries(module):
+    assert check_import(module) == []
@@ -0,0 +1,59 @@
+import pytest
+from survstat_collecting.job_queue import ScrapeJobQueue
+from survstat_collecting.survstat_scraper import run_scrape_jobs
+from survstat_fixture import FIXTURE_DIR, SurvstatFixture
+
+DISEASE = 'Campylobacteriosis'
+ALIAS   = 'campylobacter'
+
+
+def test_queue_works_on_its_own_run(tmp_path):
+    path = tmp_path / "scrape_jobs.sqlite"
+    earlier = ScrapeJobQueue(path, max_attempts=1)
+    earlier.enqueue([('A', 'a', '2020'), ('C', 'c', '2022')])
+    job, _ = earlier.claim()
+    earlier.fail(job, ValueError('no such disease'))
+    assert earlier.given_up() == [(('A', 'a', '2020'), 'ValueError: no such disease')]
+    # ('C', 'c', '2022') is left pending, as by an interrupted run
+
+    queue = ScrapeJobQueue(path, max_attempts=1)
+    queue.enqueue([('B', 'b', '2021')])
+    assert queue.unfinished() == 1
+    job, _ = queue.claim()
+    assert job == ('B', 'b', '2021')
+    queue.complete(job)
+    assert queue.claim() == (None, None)
+    assert queue.given_up() == []
+    assert queue.summary() == {'pending': 1, 'running': 0, 'done': 1, 'failed': 1}
+
+
+def test_interrupted_job_is_resumed_when_queued_again(tmp_path):
+    path = tmp_path / "scrape_jobs.sqlite"
+    earlier = ScrapeJobQueue(path, max_attempts=3)
+    earlier.enqueue([('A', 'a', '2020'), ('B', 'b', ['2020', '2021'])])
+    earlier.claim()                     # and interrupted while running
+
+    queue = ScrapeJobQueue(path, max_attempts=3)
+    queue.enqueue([('A', 'a', '2020')])
+    assert queue.recover() == 1
+    job, _ = queue.claim()
+    assert job == ('A', 'a', '2020')
+    assert queue.fail(job, RuntimeError('timeout'))       # its second of three attempts
+    assert queue.claim()[0] is None     # waiting for its retry, and B is not part of this run
+    assert queue.unfinished() == 1
+
+
+def test_earlier_failures_do_not_fail_a_run(tmp_path, fixture_session):
+    exports = {(DISEASE, ('2001',)): (FIXTURE_DIR / f"{ALIAS}_2001.csv").read_bytes()}
+    path    = tmp_path / "scrape_jobs.sqlite"
+    (tmp_path / "downloads").mkdir()
+    with SurvstatFixture(exports) as fixture:
+        fixture_session(fixture)
+        with pytest.raises(RuntimeError, match="1 of 1 scrape jobs failed: pest 2001"):
+            run_scrape_jobs([('Pest', 'pest', '2001')], tmp_path / "downloads", tmp_path / "raw", backend='http',
+                            job_queue_path=path, max_attempts=1)
+        run_scrape_jobs([(DISEASE, ALIAS, '2001')], tmp_path / "downloads", tmp_path / "raw", backend='http',
+                        job_queue_path=path, max_attempts=1)
+
+    assert fixture.downloads == [(DISEASE, ('2001',), '[ReportingDate].[Week]')]
+    assert (tmp_path / "raw" / ALIAS / f"{ALIAS}_2001.csv").exists()
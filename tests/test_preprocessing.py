@@ -0,0 +1,37 @@
+import pandas as pd
+import pytest
+from survstat_collecting import casedata_processing
+from survstat_collecting.casedata_processing import import_preprocessed_data, preprocess_survstat_data
+from survstat_fixture import FIXTURE_DIR
+
+YEARS_PER_BUG = {'campylobacter': ['2001', '2002'], 'campylobacter_jejuni': ['2002']}
+
+
+@pytest.fixture
+def raw_dir(tmp_path):
+    for bug, years in YEARS_PER_BUG.items():
+        (tmp_path / "raw" / bug).mkdir(parents=True)
+        for yy in years:
+            (tmp_path / "raw" / bug / f"{bug}_{yy}.csv").write_bytes((FIXTURE_DIR / f"campylobacter_{yy}.csv").read_bytes())
+    return tmp_path / "raw"
+
+
+def test_years_per_bug_run_in_one_pool(tmp_path, raw_dir, monkeypatch):
+    pools = []
+    class CountingPool(casedata_processing.ProcessPoolExecutor):
+        def __init__(self, *args, **kwargs):
+            pools.append(kwargs.get('max_workers'))
+            super().__init__(*args, **kwargs)
+    monkeypatch.setattr(casedata_processing, 'ProcessPoolExecutor', CountingPool)
+
+    preprocess_survstat_data(bugs=list(YEARS_PER_BUG), years=YEARS_PER_BUG, raw_data_dir=raw_dir,
+                             processed_data_dir=tmp_path / "pooled", how='reconstruct', n_workers=3)
+    assert pools == [3]
+
+    for bug, years in YEARS_PER_BUG.items():
+        preprocess_survstat_data(bugs=bug, years=years, raw_data_dir=raw_dir, processed_data_dir=tmp_path / "single",
+                                 how='reconstruct', n_workers=1)
+        pooled = import_preprocessed_data(bug, tmp_path / "pooled").df
+        single = import_preprocessed_data(bug, tmp_path / "single").df
+        assert sorted(pooled['year'].unique()) == years
+        pd.testing.assert_frame_equal(pooled, single)
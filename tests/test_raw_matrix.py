@@ -0,0 +1,58 @@
+import hashlib
+import os
+import numpy as np
+import pytest
+from survstat_collecting import raw_matrix
+from survstat_collecting.raw_matrix import convert_raw_file, matrix_path, read_raw_matrix
+from survstat_fixture import FIXTURE_DIR
+
+
+@pytest.fixture
+def raw_file(tmp_path):
+    raw_file = tmp_path / "campylobacter_2001.csv"
+    raw_file.write_bytes((FIXTURE_DIR / "campylobacter_2001.csv").read_bytes())
+    convert_raw_file(raw_file)
+    return raw_file
+
+
+@pytest.fixture
+def hashed(monkeypatch):
+    """The files hashed by read_raw_matrix."""
+    hashed, original = [], hashlib.sha256
+    def sha256(content):
+        hashed.append(len(content))
+        return original(content)
+    monkeypatch.setattr(raw_matrix.hashlib, 'sha256', sha256)
+    return hashed
+
+
+def test_unchanged_file_is_not_hashed(raw_file, hashed):
+    matrix = read_raw_matrix(raw_file)
+    assert matrix['cases'].shape == (52, 30)
+    assert hashed == []
+
+
+def test_touched_file_is_hashed_once(raw_file, hashed):
+    os.utime(raw_file, ns=(raw_file.stat().st_atime_ns, raw_file.stat().st_mtime_ns + 10**9))
+    assert read_raw_matrix(raw_file) is not None
+    assert hashed == [raw_file.stat().st_size]
+    with np.load(matrix_path(raw_file)) as npz:
+        assert int(npz['source_mtime_ns']) == raw_file.stat().st_mtime_ns
+    assert read_raw_matrix(raw_file)['cases'].shape == (52, 30)
+    assert hashed == [raw_file.stat().st_size]
+
+
+def test_changed_file_is_outdated(raw_file, hashed):
+    content = raw_file.read_bytes()
+    raw_file.write_bytes(content.replace('"1"'.encode('utf-16-le'), '"2"'.encode('utf-16-le'), 1))
+    assert read_raw_matrix(raw_file) is None
+    assert len(hashed) == 1
+
+
+def test_copy_without_stat_is_hashed(raw_file, hashed):
+    with np.load(matrix_path(raw_file)) as npz:
+        arrays = {key: npz[key] for key in ['cases', 'weeks', 'counties', 'source_sha256']}
+    np.savez_compressed(matrix_path(raw_file), **arrays)
+    assert read_raw_matrix(raw_file) is not None
+    assert read_raw_matrix(raw_file) is not None
+    assert len(hashed) == 1
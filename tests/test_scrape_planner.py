@@ -0,0 +1,77 @@
+import os
+from datetime import datetime
+import pytest
+from survstat_collecting import scrape_planner
+from survstat_collecting.scrape_planner import plan_scrape_jobs, raw_file_path, read_manifest, record_scrape_results
+from survstat_fixture import FIXTURE_DIR
+
+DISEASES = {'Campylobacteriosis': 'campylobacter'}
+YEARS    = ['2001', '2002']
+NOW      = datetime(2003, 1, 1)       # 2002 is not settled yet
+
+
+@pytest.fixture
+def raw_dir(tmp_path):
+    for yy in YEARS:
+        path = raw_file_path(tmp_path, 'campylobacter', yy)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes((FIXTURE_DIR / f"campylobacter_{yy}.csv").read_bytes())
+        os.utime(path, (NOW.timestamp(), NOW.timestamp()))
+    return tmp_path
+
+
+@pytest.fixture
+def hashed(monkeypatch):
+    """The files hashed by inspect_raw_file."""
+    hashed, original = [], scrape_planner.hashlib.sha256
+    def sha256(content):
+        hashed.append(len(content))
+        return original(content)
+    monkeypatch.setattr(scrape_planner.hashlib, 'sha256', sha256)
+    return hashed
+
+
+def test_unchanged_files_are_hashed_once(raw_dir, hashed):
+    first = plan_scrape_jobs(DISEASES, YEARS, raw_dir, now=NOW)
+    assert len(hashed) == len(YEARS)
+    second = plan_scrape_jobs(DISEASES, YEARS, raw_dir, now=NOW)
+    assert len(hashed) == len(YEARS)
+    assert second == first
+
+
+def test_touched_file_is_hashed_once(raw_dir, hashed):
+    plan_scrape_jobs(DISEASES, YEARS, raw_dir, now=NOW)
+    path = raw_file_path(raw_dir, 'campylobacter', '2002')
+    os.utime(path, ns=(path.stat().st_atime_ns, path.stat().st_mtime_ns + 10**9))
+    hashed.clear()
+
+    plan_scrape_jobs(DISEASES, YEARS, raw_dir, now=NOW)
+    assert hashed == [path.stat().st_size]
+    assert read_manifest(raw_dir)['campylobacter']['2002']['mtime_ns'] == path.stat().st_mtime_ns
+    plan_scrape_jobs(DISEASES, YEARS, raw_dir, now=NOW)
+    assert hashed == [path.stat().st_size]
+
+
+def test_touched_file_keeps_its_unchanged_count(raw_dir):
+    plan = plan_scrape_jobs(DISEASES, YEARS, raw_dir, policy={'max_age_hours': 0}, now=NOW.replace(hour=1))
+    assert [job['year'] for job in plan] == ['2002']
+    record_scrape_results(plan, raw_dir)        # as if re-scraping gave the same file
+    assert read_manifest(raw_dir)['campylobacter']['2002']['unchanged'] == 1
+
+    path = raw_file_path(raw_dir, 'campylobacter', '2002')
+    os.utime(path, ns=(path.stat().st_atime_ns, path.stat().st_mtime_ns + 10**9))
+    plan_scrape_jobs(DISEASES, YEARS, raw_dir, now=NOW)
+    assert read_manifest(raw_dir)['campylobacter']['2002']['unchanged'] == 1
+
+
+def test_changed_file_is_inspected(raw_dir):
+    plan_scrape_jobs(DISEASES, YEARS, raw_dir, now=NOW)
+    path    = raw_file_path(raw_dir, 'campylobacter', '2002')
+    mtime   = path.stat().st_mtime_ns
+    path.write_bytes(path.read_bytes().replace('"1"'.encode('utf-16-le'), '"2"'.encode('utf-16-le'), 1))
+    os.utime(path, ns=(mtime, mtime + 1))       # same size, but a newer modification time
+
+    plan_scrape_jobs(DISEASES, YEARS, raw_dir, now=NOW)
+    record = read_manifest(raw_dir)['campylobacter']['2002']
+    assert record['sha256'] == scrape_planner.hashlib.sha256(path.read_bytes()).hexdigest()
+    assert record['unchanged'] == 0
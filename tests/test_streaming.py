@@ -0,0 +1,32 @@
+import numpy as np
+import pandas as pd
+import pytest
+from dataprocessor import DataProcessingOrchestrator
+from dataprocessor.query_plan import optimize_plan
+
+
+@pytest.fixture
+def datafile(tmp_path):
+    pd.DataFrame({'week': np.arange(100) % 52 + 1, 'kz_kreis': [f"{kz:05d}" for kz in np.arange(100) % 7 + 9161],
+                  'cases': np.arange(100) % 5}).to_csv(tmp_path / "cases.csv", index=False)
+    return tmp_path
+
+
+def _pipeline(directory, **kwargs) -> DataProcessingOrchestrator:
+    # the filter is on a replaced column, so it cannot be pushed into import_data and runs on every chunk
+    return (DataProcessingOrchestrator(**kwargs).import_data(filename = "cases.csv", directory = directory, dtype_dict = {'kz_kreis': 'str'})
+            .replace('kz_kreis', {'09161': 'Ingolstadt'})
+            .filter(conditions = [('kz_kreis', 'Ingolstadt', '!='), ('cases', 0, '>')]))
+
+
+def test_filter_is_not_pushed_down(datafile):
+    plan = optimize_plan(_pipeline(datafile, lazy = True)._pending_steps())
+    assert [next(iter(step)) for step in plan] == ['import_data', 'replace', 'filter']
+
+
+@pytest.mark.parametrize('chunksize', [1, 7, 100, 1000])
+def test_streaming_equals_eager(datafile, chunksize):
+    eager    = _pipeline(datafile).df
+    streamed = _pipeline(datafile, chunksize = chunksize).collect().df
+    assert streamed.index.is_unique
+    pd.testing.assert_frame_equal(streamed, eager)
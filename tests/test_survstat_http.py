@@ -0,0 +1,83 @@
+import zipfile
+import pandas as pd
+import pytest
+from survstat_collecting.casedata_processing import preprocess_raw_yearfile
+from survstat_collecting.raw_matrix import matrix_path
+from survstat_collecting.survstat_http import SurvstatHttpClient, http_scraper
+from survstat_collecting.survstat_scraper import move_zip
+from survstat_fixture import FIXTURE_DIR, SurvstatFixture
+
+DISEASE = 'Campylobacteriosis'
+ALIAS   = 'campylobacter'
+
+
+@pytest.fixture
+def exports():
+    return {(DISEASE, (yy,)): (FIXTURE_DIR / f"{ALIAS}_{yy}.csv").read_bytes() for yy in ['2001', '2002']}
+
+
+def test_http_scraper_downloads_the_export(tmp_path, exports):
+    with SurvstatFixture(exports) as fixture:
+        with SurvstatHttpClient(tmp_path / "downloads", base_url=fixture.url) as client:
+            zip_path = http_scraper(DISEASE, '2001', tmp_path / "downloads", session=client)
+
+    assert zip_path == tmp_path / "downloads" / "survstat.zip"
+    with zipfile.ZipFile(zip_path) as zip_file:
+        assert zip_file.read("Data.csv") == exports[(DISEASE, ('2001',))]
+    assert fixture.downloads == [(DISEASE, ('2001',), '[ReportingDate].[Week]')]
+    # two filters added, disease and year chosen, rows, columns and level set, then the download
+    assert [method for method, _ in fixture.requests] == ['GET'] + ['POST'] * 10
+
+
+def test_raw_file_matches_the_selenium_layout(tmp_path, exports):
+    """move_zip writes the export of the HTTP backend where, and as, it writes that of the browser: Data.csv as is."""
+    raw_dir = tmp_path / "raw"
+    with SurvstatFixture(exports) as fixture:
+        with SurvstatHttpClient(tmp_path / "downloads", base_url=fixture.url) as client:
+            for yy in ['2001', '2002']:
+                move_zip(tmp_path / "downloads", http_scraper(DISEASE, yy, tmp_path / "downloads", session=client), ALIAS, raw_dir, yy)
+
+    for yy in ['2001', '2002']:
+        raw_file = raw_dir / ALIAS / f"{ALIAS}_{yy}.csv"
+        assert raw_file.read_bytes() == exports[(DISEASE, (yy,))]
+        assert matrix_path(raw_file).exists()
+    assert not (tmp_path / "downloads" / "survstat.zip").exists()
+
+    # the matrix and the text file preprocess to the same cases (stored as int32 either way)
+    from_matrix = preprocess_raw_yearfile(raw_dir, ALIAS, '2001')
+    matrix_path(raw_dir / ALIAS / f"{ALIAS}_2001.csv").unlink()
+    from_text   = preprocess_raw_yearfile(raw_dir, ALIAS, '2001')
+    pd.testing.assert_frame_equal(from_matrix, from_text, check_dtype=False)
+    assert from_text['cases'].sum() > 0
+
+
+def test_one_client_runs_several_queries(tmp_path, exports):
+    with SurvstatFixture(exports) as fixture:
+        with SurvstatHttpClient(tmp_path, base_url=fixture.url) as client:
+            for yy in ['2001', '2002', '2001']:
+                client.query(DISEASE, yy)
+    assert client.n_queries == 3
+    assert [years for _, years, _ in fixture.downloads] == [('2001',), ('2002',), ('2001',)]
+
+
+def test_unknown_disease(tmp_path, exports):
+    with SurvstatFixture(exports) as fixture:
+        with SurvstatHttpClient(tmp_path, base_url=fixture.url) as client:
+            with pytest.raises(ValueError, match="Could not find option 'Pest'"):
+                client.query('Pest', '2001')
+
+
+def test_unknown_year(tmp_path, exports):
+    with SurvstatFixture(exports, years=['2001', '2002']) as fixture:
+        with SurvstatHttpClient(tmp_path, base_url=fixture.url) as client:
+            with pytest.raises(ValueError, match=r"Could not find an empty filter offering '1999'"):
+                client.query(DISEASE, '1999')
+
+
+def test_error_page_instead_of_zip(tmp_path, exports):
+    """Without an export for the query, the page answers with html, which is not taken for a download."""
+    with SurvstatFixture(exports) as fixture:
+        with SurvstatHttpClient(tmp_path, base_url=fixture.url) as client:
+            with pytest.raises(FileNotFoundError, match="No survstat ZIP file"):
+                client.query(DISEASE, '2003')
+    assert not list(tmp_path.glob("survstat.zip*"))
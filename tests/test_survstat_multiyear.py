@@ -0,0 +1,76 @@
+import zipfile
+import pandas as pd
+import pytest
+from survstat_collecting.casedata_processing import preprocess_raw_yearfile
+from survstat_collecting.query_page import MultiYearExportError
+from survstat_collecting.survstat_http import SurvstatHttpClient
+from survstat_collecting.survstat_scraper import run_scrape_jobs, split_multiyear_zip
+from survstat_fixture import FIXTURE_DIR, SurvstatFixture
+
+DISEASE = 'Campylobacteriosis'
+ALIAS   = 'campylobacter'
+YEARS   = ['2001', '2002']
+
+
+@pytest.fixture
+def exports():
+    # campylobacter_2001_2002.csv is the multi-year export of both single-year exports, with rows labelled '2001-01', ...
+    exports = {(DISEASE, (yy,)): (FIXTURE_DIR / f"{ALIAS}_{yy}.csv").read_bytes() for yy in YEARS}
+    exports[(DISEASE, tuple(YEARS))] = (FIXTURE_DIR / f"{ALIAS}_{'_'.join(YEARS)}.csv").read_bytes()
+    return exports
+
+
+def _zip(path, data_csv: bytes):
+    with zipfile.ZipFile(path, 'w') as zip_file:
+        zip_file.writestr("Data.csv", data_csv)
+    return path
+
+
+def test_split_matches_the_single_year_exports(tmp_path, exports):
+    raw_dir = tmp_path / "raw"
+    paths   = split_multiyear_zip(_zip(tmp_path / "survstat.zip", exports[(DISEASE, tuple(YEARS))]), ALIAS, raw_dir, YEARS)
+
+    assert paths == [raw_dir / ALIAS / f"{ALIAS}_{yy}.csv" for yy in YEARS]
+    for yy, path in zip(YEARS, paths):
+        assert path.read_bytes() == exports[(DISEASE, (yy,))]
+
+    # and preprocesses as the single-year export
+    single_dir = tmp_path / "single"
+    (single_dir / ALIAS).mkdir(parents=True)
+    for yy in YEARS:
+        (single_dir / ALIAS / f"{ALIAS}_{yy}.csv").write_bytes(exports[(DISEASE, (yy,))])
+        pd.testing.assert_frame_equal(preprocess_raw_yearfile(raw_dir, ALIAS, yy), preprocess_raw_yearfile(single_dir, ALIAS, yy),
+                                      check_dtype=False)
+
+
+@pytest.mark.parametrize('years', [['2001', '2003'], ['2001']])
+def test_split_rejects_an_incomplete_export(tmp_path, exports, years):
+    export = exports[(DISEASE, tuple(YEARS))] if len(years) > 1 else exports[(DISEASE, ('2001',))]      # rows of weeks only
+    with pytest.raises(MultiYearExportError):
+        split_multiyear_zip(_zip(tmp_path / "survstat.zip", export), ALIAS, tmp_path / "raw", years)
+    assert not (tmp_path / "raw").exists()
+
+
+def test_multiyear_job_is_one_query(tmp_path, exports, fixture_session):
+    (tmp_path / "downloads").mkdir()
+    with SurvstatFixture(exports) as fixture:
+        fixture_session(fixture)
+        run_scrape_jobs([(DISEASE, ALIAS, YEARS)], tmp_path / "downloads", tmp_path / "raw", backend='http')
+
+    assert [years for _, years, _ in fixture.downloads] == [tuple(YEARS)]
+    for yy in YEARS:
+        assert (tmp_path / "raw" / ALIAS / f"{ALIAS}_{yy}.csv").read_bytes() == exports[(DISEASE, (yy,))]
+
+
+def test_multiyear_job_falls_back_to_one_query_per_year(tmp_path, exports, fixture_session):
+    (tmp_path / "downloads").mkdir()
+    with SurvstatFixture(exports, multi_year=False) as fixture:
+        fixture_session(fixture)
+        with SurvstatHttpClient(tmp_path, base_url=fixture.url) as client:
+            with pytest.raises(MultiYearExportError):
+                client.query(DISEASE, YEARS)
+        run_scrape_jobs([(DISEASE, ALIAS, YEARS)], tmp_path / "downloads", tmp_path / "raw", backend='http')
+
+    assert [years for _, years, _ in fixture.downloads] == [(yy,) for yy in YEARS]
+    for yy in YEARS:
+        assert (tmp_path / "raw" / ALIAS / f"{ALIAS}_{yy}.csv").read_bytes() == exports[(DISEASE, (yy,))]